@@ -4,11 +4,12 @@ import os
 import logging
 from flask import Flask, render_template
 from flask_sqlalchemy import SQLAlchemy
-from flasgger import Swagger
 from dotenv import load_dotenv
 from logging.handlers import RotatingFileHandler
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
+# La sesión envía las lecturas a una réplica cuando las hay (app/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def create_app():
     # Cargar variables de entorno desde .env
@@ -21,14 +22,24 @@ def create_app():
 
     # Inicializar extensiones
     db.init_app(app)
-    swagger = Swagger(app, config=app.config['SWAGGER'], template=app.config['SWAGGER_TEMPLATE'])
+    from app.replicas import init_replicas
+    init_replicas(app, db)
+
+    # Documentación Swagger: flasgger se importa sólo si está habilitada y la
+    # especificación se construye en la primera petición a /apispec.json
+    if app.config['SWAGGER_ENABLED']:
+        from app.docs import init_swagger
+        init_swagger(app)
 
     # Importar modelos para que SQLAlchemy los registre
     from app import models
 
-    # Crear las tablas si no existen
-    with app.app_context():
-        db.create_all()
+    # Crear las tablas al arrancar sólo si se pide explícitamente; lo normal es
+    # ejecutar 'flask init-db' una vez (crear el esquema consulta la base de
+    # datos en cada proceso y ralentiza el arranque)
+    if app.config['AUTO_CREATE_TABLES']:
+        with app.app_context():
+            db.create_all()
 
     # Registrar blueprints
     from app.routes.airlines import airlines_bp
@@ -39,6 +50,24 @@ def create_app():
     app.register_blueprint(airports_bp, url_prefix='/api/airports')
     app.register_blueprint(flights_bp, url_prefix='/api/flights')
 
+    # Serialización JSON con orjson si está instalado
+    from app.encoding import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    # Instrumentación: Server-Timing y métricas en /metrics
+    if app.config['METRICS_ENABLED']:
+        from app.metrics import init_metrics
+        init_metrics(app)
+
+    # Límites de concurrencia y de tasa de las rutas pesadas (después de las
+    # métricas para que los rechazos también se registren)
+    from app.admission import init_admission
+    init_admission(app)
+
+    # Comandos de gestión (flask <comando>)
+    from app.commands import register_commands
+    register_commands(app)
+
     # Ruta principal
     @app.route('/')
     def index():
@@ -52,8 +81,7 @@ def create_app():
         return render_template('index.html')
 
     # Configurar logging
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
+    os.makedirs('logs', exist_ok=True)
     file_handler = RotatingFileHandler('logs/app.log', maxBytes=10240, backupCount=10)
     file_handler.setFormatter(logging.Formatter(
         '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
@@ -65,3 +93,26 @@ def create_app():
     app.logger.info('Aplicación iniciada')
 
     return app
+
+
+def warm_up(app, connections=None):
+    """Prepara un worker recién creado para atender peticiones.
+
+    Descarta las conexiones heredadas del proceso padre (con preload_app el
+    padre ya se conectó a la base de datos) y abre ``connections`` conexiones
+    del pool para que las primeras peticiones no paguen el coste de conectar.
+    """
+    if connections is None:
+        connections = app.config['DB_WARMUP_CONNECTIONS']
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+        opened = []
+        try:
+            for _ in range(connections):
+                conn = db.engine.connect()
+                conn.exec_driver_sql('SELECT 1')
+                opened.append(conn)
+        finally:
+            for conn in opened:
+                conn.close()
@@ -0,0 +1,227 @@
+# app/admission.py
+
+import math
+import threading
+import time
+from flask import g, jsonify, request
+from app.encoding import wants_ndjson
+
+
+# Grupos fuera del tope ADMISSION_MAX_HEAVY: las conexiones del feed esperan
+# sin trabajo y tienen hilos propios (gunicorn.conf.py)
+UNGATED_GROUPS = ('feed',)
+
+# Filtros con índice que hacen barata una página de GET /api/flights
+SELECTIVE_FILTERS = ('airline', 'origin_airport', 'destination_airport', 'year', 'date_from', 'date_to')
+
+
+def parse_rate_limits(raw):
+    """Lee 'grupo=tasa/ráfaga,...' (peticiones por segundo y tamaño del cubo)."""
+    limits = {}
+    for item in raw.split(','):
+        if not item.strip():
+            continue
+        try:
+            group, spec = item.split('=')
+            rate, burst = spec.split('/')
+            limits[group.strip()] = (float(rate), int(burst))
+        except ValueError:
+            raise ValueError(f"Límite de tasa inválido '{item}': se espera grupo=tasa/ráfaga")
+    return limits
+
+
+def admission_group(endpoint, method, args):
+    """Grupo de admisión de una petición del blueprint de vuelos (None = sin límite)."""
+    if endpoint == 'flights.handle_flights':
+        if method != 'GET':
+            return None
+        # El streaming recorre todos los vuelos filtrados, como una descarga.
+        # Se negocia el Accept igual que la vista para que coincidan
+        stream = args.get('stream', '').lower() in ('true', '1', 't', 'yes')
+        if stream or wants_ndjson():
+            return 'export'
+        # Las páginas filtradas por una columna indexada son baratas
+        if any(args.get(name) for name in SELECTIVE_FILTERS):
+            return None
+        return 'list'
+    if endpoint == 'flights.download_flights':
+        return 'export'
+    if endpoint in ('flights.stats_routes', 'flights.stats_aggregate'):
+        return 'analytics'
+    if endpoint == 'flights.bulk_flights':
+        return 'bulk'
+    if endpoint == 'flights.flight_feed':
+        return 'feed'
+    return None
+
+
+class Overloaded(Exception):
+    """No hay hueco para la petición (cola llena o plazo de espera agotado)."""
+
+
+class ConcurrencyLimiter:
+    """Semáforo con cola de espera acotada y plazo máximo de espera."""
+
+    def __init__(self, concurrency, queue, timeout):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, gate):
+        with self._cond:
+            if self.active < self.concurrency and not self.waiting:
+                gate.enter()
+                self.active += 1
+                return
+            if self.waiting >= self.queue:
+                raise Overloaded('cola llena')
+            gate.enter()
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while self.active >= self.concurrency:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        if self.active >= self.concurrency:
+                            gate.leave()
+                            raise Overloaded('plazo de espera agotado')
+            finally:
+                self.waiting -= 1
+            self.active += 1
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+
+class HeavyGate:
+    """Tope de peticiones pesadas (en curso o en cola) del proceso.
+
+    Las esperas ocupan un hilo del worker: con este tope siempre quedan
+    hilos libres para las consultas baratas (aerolíneas, aeropuertos...).
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.count >= self.limit:
+                raise Overloaded('demasiadas peticiones pesadas')
+            self.count += 1
+
+    def leave(self):
+        with self._lock:
+            self.count -= 1
+
+
+class NoGate:
+    """Sustituto de HeavyGate para los grupos que no cuentan como pesados."""
+
+    def enter(self):
+        pass
+
+    def leave(self):
+        pass
+
+
+class TokenBuckets:
+    """Cubos de tokens por cliente: ``rate`` peticiones/s con ráfagas de ``burst``."""
+
+    # Clientes recordados antes de olvidar los cubos llenos
+    MAX_CLIENTS = 10000
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Consume un token; devuelve 0 o los segundos hasta el siguiente."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self._buckets[client] = (tokens - 1, now)
+            if len(self._buckets) > self.MAX_CLIENTS:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        full = self.burst / self.rate
+        for client in [c for c, (_, updated) in self._buckets.items() if now - updated >= full]:
+            del self._buckets[client]
+
+
+def _client_id():
+    # Detrás de un proxy, remote_addr debe venir ya corregido (ProxyFix)
+    return request.remote_addr or 'unknown'
+
+
+def _rejection(status, message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def init_admission(app):
+    """Limita la concurrencia y la tasa de las rutas pesadas del blueprint de vuelos."""
+    if not app.config['ADMISSION_ENABLED']:
+        return
+    timeout = app.config['ADMISSION_QUEUE_TIMEOUT']
+    retry_after = app.config['ADMISSION_RETRY_AFTER']
+    heavy = HeavyGate(app.config['ADMISSION_MAX_HEAVY'])
+    gates = {group: NoGate() if group in UNGATED_GROUPS else heavy
+             for group in app.config['ADMISSION_LIMITS']}
+    limiters = {
+        group: ConcurrencyLimiter(concurrency, queue, timeout)
+        for group, (concurrency, queue) in app.config['ADMISSION_LIMITS'].items()
+    }
+    buckets = {
+        group: TokenBuckets(rate, burst)
+        for group, (rate, burst) in parse_rate_limits(app.config['RATE_LIMITS']).items()
+    }
+
+    @app.before_request
+    def admit():
+        if request.blueprint != 'flights':
+            return None
+        group = admission_group(request.endpoint, request.method, request.args)
+        if group is None:
+            return None
+        bucket = buckets.get(group)
+        if bucket is not None:
+            wait = bucket.take(_client_id())
+            if wait:
+                return _rejection(429, 'Demasiadas peticiones; reintentar más tarde', wait)
+        limiter = limiters.get(group)
+        if limiter is None:
+            return None
+        gate = gates[group]
+        try:
+            limiter.acquire(gate)
+        except Overloaded as e:
+            app.logger.warning(f'Petición rechazada ({group}): {e}')
+            return _rejection(503, 'Servidor ocupado; reintentar más tarde', retry_after)
+        g.admission_slot = (limiter, gate)
+
+    @app.teardown_request
+    def release_slot(exc):
+        # Con respuestas en streaming el contexto se cierra al terminar el envío,
+        # así que el hueco se mantiene durante toda la descarga
+        slot = g.pop('admission_slot', None)
+        if slot is not None:
+            limiter, gate = slot
+            limiter.release()
+            gate.leave()
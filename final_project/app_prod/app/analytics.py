@@ -0,0 +1,235 @@
+# app/analytics.py
+
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import current_app
+from app.export import iter_flight_batches
+from app.jobs import data_version
+
+# Bits reservados para cada componente de la clave de grupo (int64)
+_CODE_BITS = 16
+_MONTH_BITS = 4
+
+
+class CodeEncoder:
+    """Diccionario incremental código IATA -> entero.
+
+    La codificación de cada lote se hace con ``np.unique`` (en C), de modo que
+    el diccionario de Python sólo se consulta una vez por código distinto.
+    """
+
+    def __init__(self, codes=()):
+        self.codes = list(codes)
+        self._ids = {code: i for i, code in enumerate(self.codes)}
+
+    def encode(self, values):
+        uniques, inverse = np.unique(np.array(values, dtype=str), return_inverse=True)
+        ids = np.empty(len(uniques), dtype=np.int64)
+        for i, code in enumerate(uniques):
+            code = str(code)
+            ids[i] = self._ids.get(code, -1)
+            if ids[i] < 0:
+                ids[i] = self._ids[code] = len(self.codes)
+                self.codes.append(code)
+        return ids[inverse.reshape(-1)]
+
+
+def _database_batches(filters, by_airline, by_month, batch_size, airports, airlines):
+    """Columnas de ``route_statistics`` leídas de la base de datos por lotes."""
+    fields = ['origin_airport', 'destination_airport', 'arrival_delay', 'cancelled', 'distance']
+    if by_airline:
+        fields.append('airline')
+    if by_month:
+        fields.append('month')
+    for rows in iter_flight_batches(filters, fields, batch_size):
+        columns = list(zip(*rows))
+        batch = {
+            'origin_airport': airports.encode(columns[0]),
+            'destination_airport': airports.encode(columns[1]),
+            'arrival_delay': np.array(columns[2], dtype=np.float64),  # None -> nan
+            'cancelled': np.array(columns[3], dtype=np.float64),
+            'distance': np.array(columns[4], dtype=np.float64),
+        }
+        if by_airline:
+            batch['airline'] = airlines.encode(columns[5])
+        if by_month:
+            batch['month'] = np.asarray(columns[-1], dtype=np.int64)
+        yield batch
+
+
+def route_statistics(filters, by_airline=False, by_month=False, batch_size=100000, snapshot=None):
+    """Estadísticas por ruta (origen, destino[, aerolínea][, mes]).
+
+    Lee sólo las columnas necesarias en lotes grandes, las convierte a arrays
+    de NumPy y agrega con reducciones vectorizadas (``np.unique`` +
+    ``np.bincount``). Para la mediana se guardan únicamente pares
+    (clave, retraso de llegada) de los vuelos con retraso conocido. Con
+    ``snapshot`` (vista de app/columnar.py) los lotes son sus segmentos y no
+    se consulta la base de datos.
+    """
+    if snapshot is not None:
+        airport_codes = snapshot.dictionaries['airport']
+        airline_codes = snapshot.dictionaries['airline']
+        batches = snapshot.route_batches(filters, by_airline, by_month)
+    else:
+        airports = CodeEncoder()
+        airlines = CodeEncoder()
+        # Las listas de códigos crecen mientras se recorren los lotes
+        airport_codes, airline_codes = airports.codes, airlines.codes
+        batches = _database_batches(filters, by_airline, by_month, batch_size, airports, airlines)
+
+    partials = []
+    delay_keys = []
+    delay_values = []
+
+    for batch in batches:
+        key = (batch['origin_airport'] << _CODE_BITS) | batch['destination_airport']
+        if by_airline:
+            key = (key << _CODE_BITS) | batch['airline']
+        if by_month:
+            key = (key << _MONTH_BITS) | batch['month']
+
+        arrival = batch['arrival_delay']
+        cancelled = batch['cancelled']
+        distance = batch['distance']
+        has_delay = ~np.isnan(arrival)
+        has_distance = ~np.isnan(distance)
+
+        # Agregado parcial del lote
+        ukeys, inverse = np.unique(key, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n = len(ukeys)
+        partials.append((
+            ukeys,
+            np.bincount(inverse, minlength=n),
+            np.bincount(inverse, weights=cancelled, minlength=n),
+            np.bincount(inverse, weights=np.where(has_distance, distance, 0.0), minlength=n),
+            np.bincount(inverse, weights=has_distance, minlength=n),
+            np.bincount(inverse, weights=np.where(has_delay, arrival, 0.0), minlength=n),
+            np.bincount(inverse, weights=has_delay, minlength=n),
+        ))
+        delay_keys.append(key[has_delay])
+        delay_values.append(arrival[has_delay].astype(np.float32))
+
+    if not partials:
+        return []
+
+    # Combinar los agregados parciales de todos los lotes
+    all_keys = np.concatenate([p[0] for p in partials])
+    keys, inverse = np.unique(all_keys, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    n = len(keys)
+    sums = [np.bincount(inverse, weights=np.concatenate([p[i] for p in partials]), minlength=n)
+            for i in range(1, 7)]
+    flights, cancelled_sum, distance_sum, distance_count, delay_sum, delay_count = sums
+
+    medians = _grouped_median(keys, np.concatenate(delay_keys), np.concatenate(delay_values))
+
+    result = []
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_delay = delay_sum / delay_count
+        mean_distance = distance_sum / distance_count
+        cancellation_rate = cancelled_sum / flights
+    for i, key in enumerate(keys.tolist()):
+        item = {}
+        if by_month:
+            item['month'] = key & ((1 << _MONTH_BITS) - 1)
+            key >>= _MONTH_BITS
+        if by_airline:
+            item['airline'] = airline_codes[key & ((1 << _CODE_BITS) - 1)]
+            key >>= _CODE_BITS
+        item['destination_airport'] = airport_codes[key & ((1 << _CODE_BITS) - 1)]
+        item['origin_airport'] = airport_codes[key >> _CODE_BITS]
+        item.update({
+            'flights': int(flights[i]),
+            'mean_arrival_delay': _float(mean_delay[i]),
+            'median_arrival_delay': _float(medians[i]),
+            'cancellation_rate': _float(cancellation_rate[i]),
+            'mean_distance': _float(mean_distance[i]),
+        })
+        result.append(item)
+    result.sort(key=lambda r: -r['flights'])
+    return result
+
+
+def _grouped_median(keys, value_keys, values):
+    """Mediana de ``values`` por grupo, alineada con ``keys`` (ordenadas)."""
+    medians = np.full(len(keys), np.nan)
+    if len(values) == 0:
+        return medians
+    order = np.lexsort((values, value_keys))
+    value_keys = value_keys[order]
+    values = values[order].astype(np.float64)
+    group_keys, starts, counts = np.unique(value_keys, return_index=True, return_counts=True)
+    lower = values[starts + (counts - 1) // 2]
+    upper = values[starts + counts // 2]
+    medians[np.searchsorted(keys, group_keys)] = (lower + upper) / 2.0
+    return medians
+
+
+def _float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+class ResultCache:
+    """Caché LRU en proceso de resultados analíticos.
+
+    Cada entrada guarda la versión de los datos con la que se calculó y deja
+    de ser válida en cuanto se insertan vuelos nuevos.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_init_lock = threading.Lock()
+
+
+def _route_cache():
+    app = current_app._get_current_object()
+    cache = app.extensions.get('route_stats_cache')
+    if cache is None:
+        with _init_lock:
+            cache = app.extensions.setdefault(
+                'route_stats_cache', ResultCache(app.config['ROUTE_STATS_CACHE_ENTRIES']))
+    return cache
+
+
+def get_route_statistics(filters, by_airline=False, by_month=False):
+    """``route_statistics`` con caché por clave de filtros normalizada."""
+    key = json.dumps({
+        'filters': {k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in filters.items()},
+        'by_airline': by_airline,
+        'by_month': by_month,
+    }, sort_keys=True)
+    # Con el snapshot columnar la versión es la del snapshot: un resultado
+    # calculado con datos atrasados no debe quedar guardado como actual
+    from app.columnar import get_snapshot_view
+    snapshot = get_snapshot_view()
+    version = ('columnar',) + snapshot.version if snapshot is not None else data_version()
+    cache = _route_cache()
+    result = cache.get(key, version)
+    if result is None:
+        result = route_statistics(filters, by_airline, by_month,
+                                  current_app.config['ROUTE_STATS_BATCH_SIZE'], snapshot)
+        cache.put(key, version, result)
+    return result
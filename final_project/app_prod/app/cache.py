@@ -0,0 +1,61 @@
+# app/cache.py
+
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from flask import Response, current_app, request
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'created'])
+
+
+class ResponseCache:
+    """Caché en proceso de respuestas ya serializadas (bytes + ETag).
+
+    Pensada para datos de referencia que cambian muy poco: la entrada se
+    construye una vez y se invalida explícitamente cuando un POST confirma
+    cambios. El TTL es sólo una red de seguridad para cuando otro proceso
+    (otro worker) modifica los datos.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, build, ttl=None):
+        entry = self._entries.get(key)
+        if entry is not None and (not ttl or time.monotonic() - entry.created < ttl):
+            return entry
+        with self._lock:
+            # Otro hilo pudo construir la entrada mientras esperábamos
+            entry = self._entries.get(key)
+            if entry is not None and (not ttl or time.monotonic() - entry.created < ttl):
+                return entry
+            body = build()
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            entry = CacheEntry(body, hashlib.sha1(body).hexdigest(), time.monotonic())
+            self._entries[key] = entry
+            return entry
+
+    def invalidate(self, prefix=''):
+        """Elimina las entradas cuya clave empieza por ``prefix`` (todas si está vacío)."""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+
+reference_cache = ResponseCache()
+
+
+def cached_response(key, build, mimetype, headers=None):
+    """Devuelve una respuesta desde la caché de referencia con ETag fuerte.
+
+    Si el cliente envía ``If-None-Match`` con el ETag vigente se responde 304
+    sin tocar la base de datos ni volver a serializar.
+    """
+    entry = reference_cache.get(key, build, current_app.config['REFERENCE_CACHE_TTL'])
+    response = Response(entry.body, mimetype=mimetype, headers=headers)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
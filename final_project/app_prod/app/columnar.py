@@ -0,0 +1,589 @@
+# app/columnar.py
+
+# Snapshot columnar de flights para las agregaciones. Cada columna se guarda
+# como un array de NumPy en segmentos inmutables (COLUMNAR_DIR/sNNNNNN/*.npy)
+# que todos los workers abren con mmap: las páginas se comparten a través de
+# la caché del sistema operativo en lugar de copiarse en cada proceso.
+# manifest.json enumera los segmentos vigentes y los diccionarios de códigos;
+# sólo lo reescribe el proceso que tiene el cerrojo del directorio.
+
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.analytics import CodeEncoder
+from app.partitions import flight_source, flight_tables
+from app.queries import apply_flight_filters, columns_for
+from app.replicas import use_replica
+from app.rollups import CAUSE_DELAYS, MEASURES, measure_columns, stats_item
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso (flask run)
+    fcntl = None
+
+# Columnas numéricas: nombre -> (dtype, admite nulos). Los nulos se guardan
+# como 0 con una máscara de validez aparte ('<columna>.valid'), de modo que
+# las sumas no necesitan tratarlos
+COLUMNS = {
+    'id': ('int64', False),
+    'year': ('int16', False),
+    'month': ('int8', False),
+    'day': ('int8', False),
+    'day_of_week': ('int8', False),
+    'scheduled_departure': ('int32', False),
+    'departure_time': ('int32', False),
+    'departure_delay': ('int32', False),
+    'taxi_out': ('int32', True),
+    'scheduled_time': ('int32', True),
+    'elapsed_time': ('int32', True),
+    'air_time': ('int32', True),
+    'distance': ('float64', True),
+    'taxi_in': ('int32', True),
+    'arrival_delay': ('int32', True),
+    'diverted': ('bool', False),
+    'cancelled': ('bool', False),
+    **{c: ('int32', True) for c in CAUSE_DELAYS},
+}
+# Columnas de códigos IATA: columna -> diccionario (origen y destino comparten
+# el de aeropuertos). Los códigos de 3 letras caben en uint16
+CODE_COLUMNS = {
+    'airline': 'airline',
+    'origin_airport': 'airport',
+    'destination_airport': 'airport',
+}
+DICTIONARIES = ('airline', 'airport')
+FIELDS = list(COLUMNS) + list(CODE_COLUMNS)
+
+# Columnas por las que se puede agrupar y número de valores de cada una
+# (year y los códigos dependen de los datos)
+GROUP_COLUMNS = {
+    'airline': None,
+    'origin_airport': None,
+    'destination_airport': None,
+    'year': None,
+    'month': 13,
+    'day': 32,
+    'day_of_week': 8,
+}
+
+# Columna que se suma para cada medida de rollups.MEASURES (None = contar filas)
+MEASURE_SOURCES = {
+    'flights': None,
+    'cancelled_flights': 'cancelled',
+    'diverted_flights': 'diverted',
+    'departure_delay_total': 'departure_delay',
+    'arrival_delay_total': 'arrival_delay',
+    'arrival_delay_count': 'arrival_delay.valid',
+    **{f'{c}_total': c for c in CAUSE_DELAYS},
+}
+
+# Grupos posibles hasta los que se acumula en arrays densos (np.bincount);
+# por encima se agrupa con np.unique
+_DENSE_GROUPS = 1 << 16
+_MANIFEST = 'manifest.json'
+
+
+def _cast(values, dtype, name):
+    """Convierte a ``dtype`` comprobando que los valores caben."""
+    if np.dtype(dtype).kind in 'iu' and len(values):
+        info = np.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            raise ValueError(f"Valores de '{name}' fuera del rango de {dtype}")
+    return values.astype(dtype)
+
+
+def _encode(rows, encoders):
+    """Convierte un lote de tuplas (en el orden de FIELDS) en arrays por columna."""
+    columns = list(zip(*rows))
+    arrays = {}
+    for i, (name, (dtype, nullable)) in enumerate(COLUMNS.items()):
+        if dtype == 'bool':
+            arrays[name] = np.array(columns[i], dtype=bool)  # None -> False
+        elif nullable:
+            values = np.array(columns[i], dtype=np.float64)  # None -> nan
+            valid = ~np.isnan(values)
+            arrays[name] = _cast(np.where(valid, values, 0), dtype, name)
+            arrays[f'{name}.valid'] = valid
+        else:
+            arrays[name] = _cast(np.array(columns[i], dtype=np.int64), dtype, name)
+    for i, (name, dictionary) in enumerate(CODE_COLUMNS.items(), start=len(COLUMNS)):
+        arrays[name] = _cast(encoders[dictionary].encode(columns[i]), 'uint16', name)
+    return arrays
+
+
+def _empty_manifest():
+    return {
+        'generation': 0,
+        'last_id': 0,
+        'rows': 0,
+        'next_segment': 0,
+        'refreshed_at': 0,
+        'dictionaries': {name: [] for name in DICTIONARIES},
+        'segments': [],
+    }
+
+
+class SnapshotView:
+    """Estado inmutable del snapshot (un manifest y sus segmentos abiertos)."""
+
+    def __init__(self, manifest, segments):
+        self.generation = manifest['generation']
+        self.last_id = manifest['last_id']
+        self.rows = manifest['rows']
+        self.dictionaries = manifest['dictionaries']
+        self._index = {name: {code: i for i, code in enumerate(codes)}
+                       for name, codes in self.dictionaries.items()}
+        self.segments = segments
+        years = [s['years'] for s in manifest['segments']]
+        self.years = (min(y[0] for y in years), max(y[1] for y in years)) if years else (0, 0)
+
+    @property
+    def version(self):
+        return self.generation, self.last_id
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for segment in self.segments for array in segment.values())
+
+    def _mask(self, segment, filters):
+        """Máscara de las filas del segmento que cumplen los filtros (None = todas)."""
+        conditions = []
+        for field, dictionary in CODE_COLUMNS.items():
+            codes = filters.get(field)
+            if codes:
+                index = self._index[dictionary]
+                ids = [index[code] for code in codes if code in index]
+                column = segment[field]
+                if len(ids) == 1:
+                    conditions.append(column == ids[0])
+                else:
+                    conditions.append(np.isin(column, ids))
+        for field in ('year', 'month', 'day', 'cancelled', 'diverted'):
+            if field in filters:
+                conditions.append(segment[field] == filters[field])
+        date_from, date_to = filters.get('date_from'), filters.get('date_to')
+        if date_from or date_to:
+            ymd = (segment['year'].astype(np.int32) * 10000 + segment['month'].astype(np.int32) * 100
+                   + segment['day'])
+            if date_from:
+                conditions.append(ymd >= date_from.year * 10000 + date_from.month * 100 + date_from.day)
+            if date_to:
+                conditions.append(ymd <= date_to.year * 10000 + date_to.month * 100 + date_to.day)
+        if 'min_departure_delay' in filters:
+            conditions.append(segment['departure_delay'] >= filters['min_departure_delay'])
+        if not conditions:
+            return None
+        mask = conditions[0]
+        for condition in conditions[1:]:
+            mask &= condition
+        return mask
+
+    def _dimensions(self, group_by):
+        sizes = []
+        for column in group_by:
+            if column in CODE_COLUMNS:
+                sizes.append(max(1, len(self.dictionaries[CODE_COLUMNS[column]])))
+            elif column == 'year':
+                sizes.append(self.years[1] - self.years[0] + 1)
+            else:
+                sizes.append(GROUP_COLUMNS[column])
+        return tuple(sizes)
+
+    def aggregate(self, filters, group_by):
+        """Medidas de rollups.MEASURES agrupadas por ``group_by`` (lista de GROUP_COLUMNS).
+
+        Cada segmento se filtra con máscaras y se agrupa con ``np.bincount``
+        sobre una clave mixta de las columnas de agrupación; con pocos grupos
+        posibles se acumula directamente en arrays densos.
+        """
+        dims = self._dimensions(group_by)
+        size = int(np.prod(dims, dtype=np.int64))
+        dense = size <= _DENSE_GROUPS
+        totals = np.zeros((len(MEASURES), size)) if dense else None
+        partials = []
+        for segment in self.segments:
+            mask = self._mask(segment, filters)
+
+            def column(name):
+                return segment[name] if mask is None else segment[name][mask]
+
+            if mask is None:
+                rows = len(segment['id'])
+            else:
+                rows = int(np.count_nonzero(mask))
+            if not rows:
+                continue
+            if group_by:
+                components = [column(c) - self.years[0] if c == 'year' else column(c) for c in group_by]
+                keys = np.ravel_multi_index(components, dims)
+            else:
+                keys = np.zeros(rows, dtype=np.intp)
+            if dense:
+                groups, inverse, n = None, keys, size
+            else:
+                groups, inverse = np.unique(keys, return_inverse=True)
+                inverse, n = inverse.reshape(-1), len(groups)
+            sums = np.empty((len(MEASURES), n))
+            for i, measure in enumerate(MEASURES):
+                source = MEASURE_SOURCES[measure]
+                sums[i] = np.bincount(inverse, None if source is None else column(source), minlength=n)
+            if dense:
+                totals += sums
+            else:
+                partials.append((groups, sums))
+
+        if dense:
+            keys = np.flatnonzero(totals[0])
+            totals = totals[:, keys]
+        elif partials:
+            keys, inverse = np.unique(np.concatenate([p[0] for p in partials]), return_inverse=True)
+            inverse = inverse.reshape(-1)
+            stacked = np.concatenate([p[1] for p in partials], axis=1)
+            totals = np.array([np.bincount(inverse, stacked[i], minlength=len(keys))
+                               for i in range(len(MEASURES))])
+        else:
+            return []
+
+        decoded = {}
+        if group_by:
+            for column, values in zip(group_by, np.unravel_index(keys, dims)):
+                if column in CODE_COLUMNS:
+                    codes = self.dictionaries[CODE_COLUMNS[column]]
+                    decoded[column] = [codes[v] for v in values.tolist()]
+                elif column == 'year':
+                    decoded[column] = (values + self.years[0]).tolist()
+                else:
+                    decoded[column] = values.tolist()
+        totals = totals.round().astype(np.int64).tolist()
+        result = []
+        for j in range(len(keys)):
+            item = {column: decoded[column][j] for column in group_by}
+            result.append(stats_item(item, {m: totals[i][j] for i, m in enumerate(MEASURES)}))
+        result.sort(key=lambda item: tuple(item[c] for c in group_by))
+        return result
+
+    def route_batches(self, filters, by_airline=False, by_month=False):
+        """Columnas de ``analytics.route_statistics`` por segmento (códigos ya codificados)."""
+        for segment in self.segments:
+            mask = self._mask(segment, filters)
+            if mask is not None and not mask.any():
+                continue
+
+            def column(name):
+                return segment[name] if mask is None else segment[name][mask]
+
+            arrival = column('arrival_delay').astype(np.float64)
+            arrival[~column('arrival_delay.valid')] = np.nan
+            distance = column('distance').astype(np.float64)
+            distance[~column('distance.valid')] = np.nan
+            batch = {
+                'origin_airport': column('origin_airport').astype(np.int64),
+                'destination_airport': column('destination_airport').astype(np.int64),
+                'arrival_delay': arrival,
+                'cancelled': column('cancelled').astype(np.float64),
+                'distance': distance,
+            }
+            if by_airline:
+                batch['airline'] = column('airline').astype(np.int64)
+            if by_month:
+                batch['month'] = column('month').astype(np.int64)
+            yield batch
+
+
+class ColumnarSnapshot:
+    """Snapshot columnar de flights compartido por los workers del host.
+
+    Las lecturas usan la última vista cargada y nunca esperan a la base de
+    datos. Cada ``refresh_interval`` segundos el worker comprueba si el
+    manifest ha cambiado y, si está caducado, lo refresca en un hilo en
+    segundo plano: el primero que toma el cerrojo del directorio lee los
+    vuelos con id mayor que el último del snapshot y los escribe como un
+    segmento nuevo. Si el número de vuelos con id menor o igual ya no
+    coincide (meses archivados o eliminados, transacciones confirmadas tarde
+    con ids menores) se reconstruye todo.
+    """
+
+    def __init__(self, app, directory, refresh_interval, segment_rows, max_segments, batch_size):
+        self.app = app
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.segment_rows = segment_rows
+        self.max_segments = max_segments
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+        self._checked_at = None
+        # Identidad (inodo, mtime) del manifest cargado
+        self._stamp = None
+        self._manifest = None
+        self._segments = {}
+        self._view = None
+
+    # --- Lectura ---
+
+    def view(self, schedule=True):
+        """Vista actual o ``None`` si el snapshot aún no se ha construido.
+
+        Con ``schedule`` se lanza el refresco en segundo plano si toca.
+        """
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+            with self._lock:
+                if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+                    self._checked_at = now
+                    self._reload()
+                    manifest = self._manifest
+                    if schedule and (manifest is None or
+                                     time.time() - manifest['refreshed_at'] >= self.refresh_interval):
+                        self._schedule()
+        return self._view
+
+    def _path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def _open(self, name):
+        directory = self._path(name)
+        return {
+            filename[:-4]: np.load(os.path.join(directory, filename), mmap_mode='r')
+            for filename in os.listdir(directory) if filename.endswith('.npy')
+        }
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(_MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        """Carga el manifest si ha cambiado; los segmentos ya abiertos se reutilizan."""
+        try:
+            stat = os.stat(self._path(_MANIFEST))
+        except FileNotFoundError:
+            self._stamp = self._manifest = self._view = None
+            self._segments = {}
+            return
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp == self._stamp:
+            return
+        try:
+            manifest = self._read_manifest()
+            segments = {s['name']: self._segments.get(s['name']) or self._open(s['name'])
+                        for s in manifest['segments']}
+        except (OSError, ValueError) as e:
+            # Manifest sustituido mientras se leía: se reintenta en la próxima comprobación
+            self.app.logger.warning(f'No se pudo cargar el snapshot columnar: {e}')
+            return
+        self._stamp, self._manifest, self._segments = stamp, manifest, segments
+        self._view = SnapshotView(manifest, [segments[s['name']] for s in manifest['segments']])
+
+    # --- Escritura ---
+
+    def _schedule(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='columnar', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with self.app.app_context():
+                # Sólo lee vuelos: se hace desde una réplica si la hay
+                use_replica()
+                self.refresh(blocking=False)
+        except Exception as e:
+            self.app.logger.error(f'Error al refrescar el snapshot columnar: {str(e)}')
+
+    @contextmanager
+    def _directory_lock(self, blocking):
+        os.makedirs(self.directory, exist_ok=True)
+        if fcntl is None:
+            acquired = _local_lock.acquire(blocking)
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    _local_lock.release()
+            return
+        with open(self._path('.lock'), 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def refresh(self, blocking=True, rebuild=False):
+        """Añade los vuelos nuevos al snapshot (o lo reconstruye).
+
+        Devuelve las filas añadidas, o ``None`` si otro proceso está
+        refrescando y ``blocking`` es falso.
+        """
+        with self._directory_lock(blocking) as acquired:
+            if not acquired:
+                return None
+            manifest = self._read_manifest()
+            if manifest is not None and (rebuild or not self._consistent(manifest)):
+                if not rebuild:
+                    self.app.logger.warning('El snapshot columnar no coincide con flights: se reconstruye')
+                manifest = dict(_empty_manifest(), generation=manifest['generation'],
+                                next_segment=manifest['next_segment'])
+            elif manifest is None:
+                manifest = _empty_manifest()
+            names = [s['name'] for s in manifest['segments']]
+            added = self._append(manifest)
+            self._compact(manifest)
+            if [s['name'] for s in manifest['segments']] != names:
+                manifest['generation'] += 1
+            manifest['refreshed_at'] = time.time()
+            self._write_manifest(manifest)
+            self._remove_unused(manifest)
+        with self._lock:
+            self._reload()
+        return added
+
+    def _consistent(self, manifest):
+        if not manifest['last_id']:
+            return manifest['rows'] == 0
+        source = flight_source()
+        count = db.session.execute(
+            select(func.count()).select_from(source).where(source.c.id <= manifest['last_id'])
+        ).scalar()
+        return count == manifest['rows']
+
+    def _new_rows(self, after):
+        for table in flight_tables():
+            stmt = select(*columns_for(FIELDS, table)).where(table.c.id > after)
+            result = db.session.execute(stmt.execution_options(yield_per=self.batch_size))
+            try:
+                for partition in result.partitions(self.batch_size):
+                    yield partition
+            finally:
+                result.close()
+
+    def _append(self, manifest):
+        encoders = {name: CodeEncoder(manifest['dictionaries'][name]) for name in DICTIONARIES}
+        parts, pending, added = [], 0, 0
+        for rows in self._new_rows(manifest['last_id']):
+            parts.append(_encode(rows, encoders))
+            pending += len(rows)
+            if pending >= self.segment_rows:
+                self._add_segment(manifest, parts)
+                added += pending
+                parts, pending = [], 0
+        if parts:
+            self._add_segment(manifest, parts)
+            added += pending
+        manifest['dictionaries'] = {name: encoder.codes for name, encoder in encoders.items()}
+        return added
+
+    def _add_segment(self, manifest, parts):
+        arrays = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+        manifest['segments'].append(self._write_segment(manifest, arrays))
+        manifest['rows'] += len(arrays['id'])
+        manifest['last_id'] = max(manifest['last_id'], int(arrays['id'].max()))
+
+    def _write_segment(self, manifest, arrays):
+        name = f"s{manifest['next_segment']:06d}"
+        manifest['next_segment'] += 1
+        tmp = self._path(f'{name}.tmp')
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for column, array in arrays.items():
+            np.save(os.path.join(tmp, f'{column}.npy'), array)
+        os.replace(tmp, self._path(name))
+        years = arrays['year']
+        return {'name': name, 'rows': len(years), 'years': [int(years.min()), int(years.max())]}
+
+    def _compact(self, manifest):
+        """Fusiona los segmentos pequeños (deltas) cuando hay demasiados."""
+        small = [s for s in manifest['segments'] if s['rows'] < self.segment_rows]
+        if len(manifest['segments']) <= self.max_segments or len(small) < 2:
+            return
+        opened = [self._open(s['name']) for s in small]
+        arrays = {name: np.concatenate([o[name] for o in opened]) for name in opened[0]}
+        manifest['segments'] = [s for s in manifest['segments'] if s not in small]
+        manifest['segments'].append(self._write_segment(manifest, arrays))
+
+    def _write_manifest(self, manifest):
+        path = self._path(_MANIFEST)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, path)
+
+    def _remove_unused(self, manifest):
+        # Los workers que aún tengan abiertos segmentos borrados siguen
+        # leyéndolos (mmap) hasta que carguen el manifest nuevo
+        names = {s['name'] for s in manifest['segments']}
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if os.path.isdir(path) and name not in names:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+_init_lock = threading.Lock()
+# Cerrojo de escritura cuando no hay fcntl (un solo proceso)
+_local_lock = threading.Lock()
+
+
+def get_columnar_snapshot():
+    """Snapshot columnar de la aplicación actual (se crea en cada worker)."""
+    app = current_app._get_current_object()
+    snapshot = app.extensions.get('columnar')
+    if snapshot is None:
+        with _init_lock:
+            snapshot = app.extensions.get('columnar')
+            if snapshot is None:
+                snapshot = ColumnarSnapshot(
+                    app,
+                    directory=app.config['COLUMNAR_DIR'],
+                    refresh_interval=app.config['COLUMNAR_REFRESH_INTERVAL'],
+                    segment_rows=app.config['COLUMNAR_SEGMENT_ROWS'],
+                    max_segments=app.config['COLUMNAR_MAX_SEGMENTS'],
+                    batch_size=app.config['COLUMNAR_BATCH_SIZE'],
+                )
+                app.extensions['columnar'] = snapshot
+    return snapshot
+
+
+def get_snapshot_view():
+    """Vista del snapshot o ``None`` (desactivado o todavía sin construir)."""
+    if not current_app.config['COLUMNAR_ENABLED']:
+        return None
+    return get_columnar_snapshot().view()
+
+
+def aggregate_flights(filters, group_by):
+    """Medidas de retraso agrupadas; devuelve ``(filas, origen)``.
+
+    Se calculan sobre el snapshot columnar si está disponible y, si no, con
+    un GROUP BY en la base de datos.
+    """
+    view = get_snapshot_view()
+    if view is not None:
+        return view.aggregate(filters, group_by), 'columnar'
+    source = flight_source(filters)
+    group = [source.c[c] for c in group_by]
+    stmt = apply_flight_filters(select(*group, *measure_columns(source)), filters, source)
+    if group:
+        stmt = stmt.group_by(*group).order_by(*group)
+    result = []
+    for row in db.session.execute(stmt):
+        values = list(row)
+        if not values[len(group)]:
+            continue
+        # MySQL devuelve Decimal en los SUM
+        totals = {m: int(v or 0) for m, v in zip(MEASURES, values[len(group):])}
+        result.append(stats_item(dict(zip(group_by, values)), totals))
+    return result, 'database'
@@ -0,0 +1,204 @@
+# app/commands.py
+
+import click
+from datetime import date
+from sqlalchemy import select
+from app import db
+from app.partitions import (
+    archive_partition, create_partitions, drop_partition, flight_source, init_partitions, layout,
+    list_months, next_month, parse_month, partition_counts, partition_name
+)
+from app.queries import apply_flight_filters, explain_flight_query
+from app.flight_cache import invalidate_flight_cache
+from app.replicas import get_router
+from app.rollups import delete_month_rollups, rebuild_rollups
+
+# Filtros habituales de GET /api/flights que deben resolverse con un índice
+INDEXED_FILTERS = {
+    'airline': {'airline': ['AA']},
+    'airline + fecha': {'airline': ['AA'], 'year': 2015, 'month': 1},
+    'origen + fecha': {'origin_airport': ['ATL'], 'year': 2015, 'month': 1, 'day': 1},
+    'destino': {'destination_airport': ['LAX']},
+    'año/mes': {'year': 2015, 'month': 1},
+}
+
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db():
+        """Crea las tablas e índices que falten."""
+        db.create_all()
+        click.echo('Esquema creado')
+
+    @app.cli.command('export-apispec')
+    @click.argument('path', default='apispec.json')
+    def export_apispec_command(path):
+        """Guarda la especificación Swagger para servirla precompilada (APISPEC_FILE)."""
+        if not app.config['SWAGGER_ENABLED']:
+            raise click.ClickException('Swagger está deshabilitado (SWAGGER_ENABLED)')
+        from app.docs import export_apispec
+        export_apispec(app, path)
+        click.echo(f'Especificación guardada en {path}')
+
+    @app.cli.command('check-indexes')
+    def check_indexes():
+        """Comprueba con EXPLAIN que los filtros habituales usan un índice."""
+        failed = False
+        for name, filters in INDEXED_FILTERS.items():
+            source = flight_source(filters)
+            stmt = apply_flight_filters(select(source.c.id), filters, source).order_by(source.c.id).limit(100)
+            uses_index, plan = explain_flight_query(db.session, stmt)
+            click.echo(f"[{'OK' if uses_index else 'FULL SCAN'}] {name}")
+            for line in plan:
+                click.echo(f"    {line}")
+            failed = failed or not uses_index
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recalcula las tablas de agregados de retrasos desde flights.
+
+        Los agregados de los meses archivados no se tocan.
+        """
+        rebuild_rollups()
+        click.echo('Agregados de retrasos recalculados')
+
+    @app.cli.group('sketches')
+    def sketches():
+        """Sketches de percentiles de retraso (tabla delay_sketches)."""
+
+    @sketches.command('rebuild')
+    @click.option('--batch-size', default=200000, show_default=True, help='Vuelos por lote leído')
+    def sketches_rebuild(batch_size):
+        """Recalcula los sketches desde flights en una sola pasada.
+
+        Los sketches de los meses archivados no se tocan.
+        """
+        from app.sketches import rebuild_sketches
+        click.echo(f'{rebuild_sketches(batch_size)} sketches recalculados')
+
+    @sketches.command('compact')
+    def sketches_compact():
+        """Fusiona los deltas acumulados por las inserciones."""
+        from app.sketches import compact_sketches
+        read, written = compact_sketches()
+        click.echo(f'{read} filas compactadas en {written}')
+
+    @app.cli.group('columnar')
+    def columnar():
+        """Snapshot columnar de flights para las agregaciones (COLUMNAR_DIR)."""
+
+    @columnar.command('build')
+    @click.option('--rebuild', is_flag=True, help='Descartar el snapshot actual y leer todos los vuelos')
+    def columnar_build(rebuild):
+        """Crea el snapshot o le añade los vuelos nuevos."""
+        from app.columnar import get_columnar_snapshot
+        snapshot = get_columnar_snapshot()
+        added = snapshot.refresh(rebuild=rebuild)
+        click.echo(f'{added} vuelos añadidos; {snapshot.view(schedule=False).rows} en el snapshot')
+
+    @columnar.command('status')
+    def columnar_status():
+        """Muestra los segmentos y el tamaño del snapshot."""
+        from app.columnar import get_columnar_snapshot
+        view = get_columnar_snapshot().view(schedule=False)
+        if view is None:
+            click.echo("Sin snapshot: ejecute 'flask columnar build'")
+            return
+        click.echo(f'{view.rows} vuelos hasta el id {view.last_id} en {len(view.segments)} segmentos '
+                   f'({view.nbytes / 1024 / 1024:.1f} MB)')
+
+    @app.cli.command('replicas')
+    def replicas_command():
+        """Comprueba la conexión con cada réplica de lectura."""
+        router = get_router()
+        if router is None:
+            click.echo('Sin réplicas configuradas (DATABASE_REPLICA_URLS)')
+            return
+        for key, engine in router.engines.items():
+            click.echo(f"{key}: {'OK' if router.check(key) else 'CAÍDA'} ({engine.url.render_as_string()})")
+
+    @app.cli.group('partitions')
+    def partitions():
+        """Particiones mensuales de flights (requiere FLIGHTS_PARTITIONED)."""
+
+    def _month(value):
+        try:
+            return parse_month(value)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+
+    def _default_through():
+        # Por defecto se deja preparado el mes siguiente al actual
+        today = date.today()
+        return next_month(today.year, today.month)
+
+    def _selected_months(month, before):
+        if bool(month) == bool(before):
+            raise click.UsageError('Indique un mes (YYYY-MM) o --before YYYY-MM')
+        if month:
+            return [_month(month)]
+        limit = _month(before)
+        return [m for m in list_months() if m < limit]
+
+    @partitions.command('init')
+    @click.option('--through', help='Último mes (YYYY-MM) para el que crear partición')
+    def partitions_init(through):
+        """Convierte flights a la disposición particionada por mes."""
+        try:
+            months = init_partitions(_month(through) if through else _default_through())
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{len(months)} particiones creadas ({layout()})')
+
+    @partitions.command('create')
+    @click.option('--through', help='Último mes (YYYY-MM) para el que crear partición')
+    def partitions_create(through):
+        """Crea por adelantado las particiones de los próximos meses."""
+        try:
+            months = create_partitions(_month(through) if through else _default_through())
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        for year, month in months:
+            click.echo(f'Creada {partition_name(year, month)}')
+
+    @partitions.command('list')
+    def partitions_list():
+        """Muestra las particiones y sus filas."""
+        for (year, month), rows in partition_counts():
+            click.echo(f'{partition_name(year, month)}\t{rows}')
+
+    @partitions.command('archive')
+    @click.argument('month', required=False)
+    @click.option('--before', help='Archivar todos los meses anteriores a YYYY-MM')
+    def partitions_archive(month, before):
+        """Saca meses de flights a tablas flights_archive_pYYYYMM (sin copiar filas).
+
+        Los agregados diarios y los sketches de esos meses se conservan, también
+        al ejecutar después 'flask rebuild-rollups' o 'flask sketches rebuild'.
+        """
+        for year, m in _selected_months(month, before):
+            try:
+                click.echo(f'Archivada en {archive_partition(year, m)}')
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+        # Con el backend compartido (sqlite) se invalidan también los workers
+        invalidate_flight_cache()
+
+    @partitions.command('drop')
+    @click.argument('month', required=False)
+    @click.option('--before', help='Eliminar todos los meses anteriores a YYYY-MM')
+    @click.confirmation_option(prompt='Se borrarán definitivamente los vuelos de esos meses. ¿Continuar?')
+    def partitions_drop(month, before):
+        """Elimina meses completos de flights (DROP PARTITION / DROP TABLE)."""
+        from app.sketches import delete_month_sketches
+        for year, m in _selected_months(month, before):
+            try:
+                drop_partition(year, m)
+                delete_month_rollups(year, m)
+                delete_month_sketches(year, m)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+            click.echo(f'Eliminada {partition_name(year, m)}')
+        invalidate_flight_cache()
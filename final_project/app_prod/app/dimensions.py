@@ -0,0 +1,86 @@
+# app/dimensions.py
+
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import select
+from app import db
+from app.models import Airline, Airport
+
+Dimensions = namedtuple('Dimensions', ['airlines', 'airports'])
+
+# Columnas que se añaden a cada vuelo: nombre -> (columna de código, dimensión, posición)
+ENRICHED_FIELDS = {
+    'airline_name': ('airline', 'airlines', None),
+    'origin_airport_name': ('origin_airport', 'airports', 0),
+    'origin_city': ('origin_airport', 'airports', 1),
+    'destination_airport_name': ('destination_airport', 'airports', 0),
+    'destination_city': ('destination_airport', 'airports', 1),
+}
+
+_lock = threading.Lock()
+_state = {'dimensions': None, 'built_at': 0.0}
+
+
+def _load():
+    airlines = dict(db.session.execute(select(Airline.iata_code, Airline.airline)).all())
+    airports = {code: (name, city) for code, name, city in
+                db.session.execute(select(Airport.iata_code, Airport.airport, Airport.city))}
+    return Dimensions(airlines, airports)
+
+
+def get_dimensions():
+    """Diccionarios en memoria código -> nombre de aerolíneas y aeropuertos.
+
+    Igual que el índice espacial, se reconstruyen tras una escritura en este
+    proceso y, para los cambios de otros workers, al superar REFERENCE_CACHE_TTL.
+    """
+    ttl = current_app.config['REFERENCE_CACHE_TTL']
+    dimensions = _state['dimensions']
+    if dimensions is not None and (not ttl or time.monotonic() - _state['built_at'] < ttl):
+        return dimensions
+    with _lock:
+        dimensions = _state['dimensions']
+        if dimensions is not None and (not ttl or time.monotonic() - _state['built_at'] < ttl):
+            return dimensions
+        dimensions = _load()
+        _state['dimensions'] = dimensions
+        _state['built_at'] = time.monotonic()
+        return dimensions
+
+
+def reload_dimensions(min_age):
+    """Recarga las dimensiones si tienen más de ``min_age`` segundos.
+
+    Para los códigos desconocidos: un cliente que envía una y otra vez un
+    código inexistente provoca como mucho una recarga cada ``min_age``
+    segundos en el proceso.
+    """
+    with _lock:
+        if _state['dimensions'] is not None and time.monotonic() - _state['built_at'] < min_age:
+            return _state['dimensions']
+        _state['dimensions'] = None
+    return get_dimensions()
+
+
+def invalidate_dimensions():
+    with _lock:
+        _state['dimensions'] = None
+
+
+def enrich_flights(flights):
+    """Añade nombres de aerolínea y de aeropuertos/ciudades a los vuelos (dicts).
+
+    Sólo se resuelven los códigos presentes en cada vuelo; un código sin
+    correspondencia da None. No hace ninguna consulta por fila.
+    """
+    dimensions = get_dimensions()
+    present = [(name, spec) for name, spec in ENRICHED_FIELDS.items() if flights and spec[0] in flights[0]]
+    for flight in flights:
+        for name, (code_field, dimension, position) in present:
+            value = getattr(dimensions, dimension).get(flight[code_field])
+            if value is not None and position is not None:
+                value = value[position]
+            flight[name] = value
+    return flights
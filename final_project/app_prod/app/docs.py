@@ -0,0 +1,39 @@
+# app/docs.py
+
+import json
+import os
+
+
+def swag_from(specs):
+    """Adjunta a la vista su especificación Swagger (dict) sin importar flasgger.
+
+    Equivale a ``flasgger.swag_from`` con un dict: flasgger sólo lee el
+    atributo ``specs_dict`` al construir /apispec.json, así que las rutas no
+    necesitan cargar flasgger (ni jsonschema, yaml, mistune) al importarse.
+    """
+    def decorator(function):
+        function.specs_dict = specs
+        return function
+    return decorator
+
+
+def init_swagger(app):
+    """Registra flasgger. La especificación se construye en la primera petición
+    a /apispec.json o se carga de ``APISPEC_FILE`` si existe."""
+    from flasgger import Swagger
+
+    swagger = Swagger(app, config=app.config['SWAGGER'], template=app.config['SWAGGER_TEMPLATE'])
+    spec_file = app.config.get('APISPEC_FILE')
+    if spec_file and os.path.exists(spec_file):
+        with open(spec_file) as f:
+            swagger.apispecs['apispec'] = json.load(f)
+    return swagger
+
+
+def export_apispec(app, path):
+    """Construye la especificación completa y la guarda en ``path``."""
+    with app.test_request_context():
+        spec = app.swag.get_apispecs('apispec')
+    with open(path, 'w') as f:
+        json.dump(spec, f, indent=2, sort_keys=True)
+    return spec
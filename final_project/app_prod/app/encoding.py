@@ -0,0 +1,107 @@
+# app/encoding.py
+
+import json
+from flask import Response, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from app import db
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el codificador estándar
+    orjson = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Conversión de fechas, decimales, etc. igual que el proveedor estándar de Flask
+_default = DefaultJSONProvider.default
+
+
+def dumps_bytes(obj):
+    """Serializa a JSON compacto (bytes) con orjson si está instalado."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(obj, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    """Decodifica JSON (texto o bytes) con orjson si está instalado.
+
+    Los errores son siempre ``ValueError`` (``orjson.JSONDecodeError`` lo es).
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask que usa orjson cuando está disponible.
+
+    Las fechas pasan por el mismo ``default`` que el proveedor estándar, de
+    modo que la salida es equivalente.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'sort_keys', 'indent'}:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_default, option=option).decode('utf-8')
+        except TypeError:
+            # Tipos que orjson no admite (p. ej. enteros de más de 64 bits)
+            return super().dumps(obj, **kwargs)
+
+
+def wants_ndjson():
+    """Indica si el cliente prefiere NDJSON (``Accept: application/x-ndjson``)."""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def json_array_chunks(batches):
+    """Genera un array JSON trozo a trozo; cada lote es una lista de objetos."""
+    yield b'['
+    first = True
+    for items in batches:
+        if not items:
+            continue
+        body = dumps_bytes(items)[1:-1]
+        yield body if first else b',' + body
+        first = False
+    yield b']'
+
+
+def ndjson_chunks(batches):
+    """Genera NDJSON (un objeto por línea), un trozo por lote."""
+    for items in batches:
+        if items:
+            yield b''.join(dumps_bytes(item) + b'\n' for item in items)
+
+
+def row_batches(stmt, batch_size):
+    """Ejecuta ``stmt`` con un cursor del lado del servidor y genera lotes de dicts."""
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        for rows in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in rows]
+    finally:
+        result.close()
+
+
+def stream_json_response(batches, ndjson=None, headers=None):
+    """Respuesta en streaming a partir de lotes de objetos.
+
+    Sólo un lote vive en memoria a la vez y el primer trozo se envía en
+    cuanto llega el primer lote de la base de datos.
+    """
+    if ndjson is None:
+        ndjson = wants_ndjson()
+    chunks = ndjson_chunks(batches) if ndjson else json_array_chunks(batches)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=NDJSON_MIMETYPE if ndjson else 'application/json',
+        headers=headers
+    )
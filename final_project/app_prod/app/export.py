@@ -0,0 +1,164 @@
+# app/export.py
+
+import csv
+import io
+import zlib
+from datetime import datetime
+from sqlalchemy import select
+from app import db
+from app.models import Flight
+from app.partitions import flight_tables
+from app.queries import FLIGHT_CSV_HEADER, FLIGHT_FIELDS, apply_flight_filters, columns_for
+
+_CSV_LABELS = dict(zip(FLIGHT_FIELDS, FLIGHT_CSV_HEADER))
+_DATETIME_FIELDS = {c.name for c in Flight.__table__.columns if c.type.python_type is datetime}
+
+# Formatos de exportación: formato -> (mimetype, extensión del fichero)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def iter_flight_batches(filters, fields, batch_size):
+    """Recorre los vuelos filtrados con un cursor del lado del servidor.
+
+    Devuelve listas de tuplas (sin objetos ORM) de como mucho ``batch_size``
+    filas, de modo que sólo un lote vive en memoria a la vez.
+    """
+    # Con flights particionada se recorre cada mes por separado
+    for table in flight_tables(filters):
+        stmt = apply_flight_filters(select(*columns_for(fields, table)), filters, table)
+        result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+        try:
+            for partition in result.partitions(batch_size):
+                yield partition
+        finally:
+            result.close()
+
+
+def csv_chunks(fields, batches, chunk_bytes):
+    """Convierte los lotes de filas en trozos de CSV de ~``chunk_bytes`` bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([_CSV_LABELS[f] for f in fields])
+
+    # Sólo las columnas de fecha necesitan conversión: csv ya escribe None como ''
+    datetime_indexes = [i for i, f in enumerate(fields) if f in _DATETIME_FIELDS]
+
+    for rows in batches:
+        if datetime_indexes:
+            rows = [_isoformat_row(row, datetime_indexes) for row in rows]
+        writer.writerows(rows)
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _isoformat_row(row, indexes):
+    row = list(row)
+    for i in indexes:
+        if row[i] is not None:
+            row[i] = row[i].isoformat()
+    return row
+
+
+def gzip_chunks(chunks, level=6):
+    """Comprime en streaming (formato gzip) una secuencia de trozos de bytes."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Fichero de sólo escritura en memoria que se vacía tras cada lote.
+
+    Permite usar los escritores de pyarrow (que esperan un fichero) para
+    generar la respuesta en streaming.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(fields):
+    import pyarrow as pa
+
+    types = {int: pa.int32(), float: pa.float64(), bool: pa.bool_(),
+             datetime: pa.timestamp('us'), str: pa.string()}
+    table = Flight.__table__
+    return pa.schema([
+        pa.field(f, pa.int64() if f == 'id' else types[table.c[f].type.python_type],
+                 nullable=table.c[f].nullable or f in ('diverted', 'cancelled'))
+        for f in fields
+    ])
+
+
+def _record_batch(schema, rows):
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def columnar_chunks(fmt, fields, batches):
+    """Genera Parquet (un row group por lote) o Arrow IPC (stream) con columnas tipadas.
+
+    Requiere pyarrow; sólo se mantiene en memoria el lote en curso.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(fields)
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for rows in batches:
+            writer.write_batch(_record_batch(schema, rows))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def columnar_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
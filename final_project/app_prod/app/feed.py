@@ -0,0 +1,232 @@
+# app/feed.py
+
+import threading
+import time
+from collections import deque
+from flask import current_app
+from app import db
+from app.encoding import dumps_bytes
+from app.partitions import max_flight_id, page_statement
+from app.queries import rows_to_dicts
+
+
+class FlightFeed:
+    """Aviso en proceso de vuelos nuevos para el feed de cambios.
+
+    ``latest`` es el mayor id de vuelo confirmado que conoce el proceso. Los
+    commits de este proceso lo actualizan al instante (``notify``); los de
+    otros workers se detectan con una sola consulta de ``max(id)`` cada
+    FEED_POLL_INTERVAL segundos, compartida por todos los clientes en espera
+    y sólo mientras haya alguno.
+
+    Los ids se asignan al insertar pero las transacciones pueden confirmarse
+    en otro orden: un id menor que ``latest`` puede no ser visible todavía.
+    ``settled()`` es el mayor ``latest`` visto hace más de ``gap_grace``
+    segundos; los huecos por debajo de él se dan por definitivos (vuelos
+    revertidos) y el cursor puede saltarlos.
+    """
+
+    def __init__(self, poll_interval, gap_grace):
+        self.poll_interval = poll_interval
+        self.gap_grace = gap_grace
+        self.latest = 0
+        self.waiters = 0
+        self._checked_at = None
+        self._polling = False
+        self._seen = deque()
+        self._cond = threading.Condition()
+
+    def _observe(self, latest):
+        # Llamar con self._cond tomado
+        if latest > self.latest:
+            self.latest = latest
+            self._seen.append((time.monotonic(), latest))
+            return True
+        return False
+
+    def notify(self, latest):
+        with self._cond:
+            self._observe(latest)
+            self._checked_at = time.monotonic()
+            self._cond.notify_all()
+
+    def settled(self):
+        """Mayor id conocido desde hace más de ``gap_grace`` segundos."""
+        limit = time.monotonic() - self.gap_grace
+        with self._cond:
+            while len(self._seen) > 1 and self._seen[1][0] <= limit:
+                self._seen.popleft()
+            if self._seen and self._seen[0][0] <= limit:
+                return self._seen[0][1]
+            return 0
+
+    def mark_stale(self):
+        """Fuerza la consulta de ``max(id)`` en la próxima espera."""
+        self._checked_at = None
+
+    def current(self):
+        """Último id conocido (consultándolo si el dato ha caducado)."""
+        self._poll()
+        return self.latest
+
+    def _poll(self):
+        with self._cond:
+            if self._polling or (self._checked_at is not None and
+                                 time.monotonic() - self._checked_at < self.poll_interval):
+                return
+            self._polling = True
+        latest = 0
+        try:
+            latest = max_flight_id()
+            # Cerrar la transacción: en MySQL una lectura repetible vería
+            # siempre la misma instantánea
+            db.session.rollback()
+        finally:
+            with self._cond:
+                self._polling = False
+                self._checked_at = time.monotonic()
+                if self._observe(latest):
+                    self._cond.notify_all()
+
+    def wait(self, after, timeout):
+        """Espera hasta que haya un id mayor que ``after`` o venza ``timeout``.
+
+        Devuelve el último id conocido.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.waiters += 1
+        try:
+            while True:
+                self._poll()
+                with self._cond:
+                    if self.latest > after:
+                        return self.latest
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self.latest
+                    self._cond.wait(min(remaining, self.poll_interval))
+        finally:
+            with self._cond:
+                self.waiters -= 1
+
+
+_init_lock = threading.Lock()
+
+
+def get_flight_feed():
+    app = current_app._get_current_object()
+    feed = app.extensions.get('flight_feed')
+    if feed is None:
+        with _init_lock:
+            feed = app.extensions.get('flight_feed')
+            if feed is None:
+                feed = FlightFeed(app.config['FEED_POLL_INTERVAL'], app.config['FEED_GAP_GRACE'])
+                app.extensions['flight_feed'] = feed
+    return feed
+
+
+def notify_new_flights():
+    """Despierta a los clientes del feed tras confirmar inserciones de vuelos.
+
+    Sólo consulta el nuevo id máximo si hay clientes esperando en el proceso;
+    si no, el siguiente que llegue lo consultará. No lanza excepciones: la
+    inserción ya está confirmada y los clientes la verán en su siguiente
+    consulta.
+    """
+    feed = current_app.extensions.get('flight_feed')
+    if feed is None:
+        return
+    try:
+        if feed.waiters:
+            feed.notify(max_flight_id())
+            return
+    except Exception as e:
+        current_app.logger.error(f"Error al notificar el feed de vuelos: {str(e)}")
+    feed.mark_stale()
+
+
+def read_delta(fields, filters, after, limit, settled):
+    """Vuelos con id mayor que ``after`` y el cursor siguiente.
+
+    El cursor sólo avanza hasta el último id seguro: todos los ids entre
+    ``after`` y él son visibles o quedan por debajo de ``settled`` (huecos
+    definitivos). Un id no visible por encima de ``settled`` puede ser de una
+    transacción aún sin confirmar, así que los vuelos posteriores esperan a
+    que aparezca o a que venza el margen. Dentro del tramo seguro el cursor
+    salta los vuelos que no pasan los filtros.
+    """
+    safe = max(after, settled)
+    # Recorrido de la clave primaria sin filtros hasta el primer hueco; si no
+    # lo hay en ``limit`` ids puede quedar más tramo seguro (has_more)
+    ids = db.session.execute(page_statement(['id'], {}, safe, limit)).scalars().all()
+    contiguous = 0
+    for flight_id in ids:
+        if flight_id != safe + 1:
+            break
+        safe = flight_id
+        contiguous += 1
+    scan_more = contiguous == limit
+    if safe <= after:
+        db.session.rollback()
+        return [], after, False
+    id_index = fields.index('id')
+    rows = db.session.execute(page_statement(fields, filters, after, limit + 1)).all()
+    db.session.rollback()
+    rows = [row for row in rows if row[id_index] <= safe]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows_to_dicts(fields, rows), rows[-1][id_index], True
+    return rows_to_dicts(fields, rows), safe, scan_more
+
+
+def poll_delta(feed, fields, filters, after, limit, timeout):
+    """Long-poll: espera hasta ``timeout`` segundos a que el cursor pueda avanzar.
+
+    Devuelve ``(vuelos, cursor, has_more)``.
+    """
+    deadline = time.monotonic() + timeout
+    latest = feed.wait(after, timeout)
+    while latest > after:
+        flights, cursor, has_more = read_delta(fields, filters, after, limit, feed.settled())
+        remaining = deadline - time.monotonic()
+        if cursor > after or remaining <= 0:
+            return flights, cursor, has_more
+        # Hay un hueco sin confirmar: esperar a vuelos nuevos o a que venza el margen
+        latest = max(latest, feed.wait(latest, min(remaining, feed.poll_interval)))
+    return [], after, False
+
+
+def sse_events(feed, fields, filters, after, limit, heartbeat, max_seconds):
+    """Eventos SSE ('flight', con el id como id del evento) hasta ``max_seconds``.
+
+    Entre lotes sin novedades se envía un comentario cada ``heartbeat``
+    segundos para mantener viva la conexión y detectar clientes cerrados.
+    """
+    yield b'retry: 2000\n\n'
+    end = time.monotonic() + max_seconds
+    cursor = seen = after
+    while True:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return
+        # Con un hueco pendiente (cursor < seen) se reintenta cada poll_interval
+        wait = heartbeat if cursor >= seen else min(heartbeat, feed.poll_interval)
+        latest = feed.wait(seen, min(wait, remaining))
+        if latest <= cursor:
+            yield b': keepalive\n\n'
+            continue
+        seen = max(seen, latest)
+        sent = False
+        has_more = True
+        while has_more:
+            flights, cursor, has_more = read_delta(fields, filters, cursor, limit, feed.settled())
+            if flights:
+                sent = True
+                yield b''.join(
+                    b'id: %d\nevent: flight\ndata: %s\n\n' % (flight['id'], dumps_bytes(flight))
+                    for flight in flights
+                )
+        seen = max(seen, cursor)
+        if not sent:
+            yield b': keepalive\n\n'
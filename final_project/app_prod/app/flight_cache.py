@@ -0,0 +1,381 @@
+# app/flight_cache.py
+
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import Response, current_app, request
+from app.replicas import in_write_window
+
+# Respuesta cacheada: cuerpo, tipo, cabeceras extra, ámbito (filtros de
+# aerolínea/origen/fecha, para invalidar) e instante de creación
+CachedResult = namedtuple('CachedResult', ['body', 'mimetype', 'headers', 'scope', 'etag', 'created'])
+
+
+def _scope(filters):
+    """Parte de los filtros que decide si un vuelo nuevo afecta a la entrada."""
+    scope = {}
+    for field in ('airline', 'origin_airport'):
+        if filters.get(field):
+            scope[field] = list(filters[field])
+    for field in ('year', 'month', 'day'):
+        if field in filters:
+            scope[field] = filters[field]
+    for field in ('date_from', 'date_to'):
+        if filters.get(field):
+            scope[field] = filters[field].isoformat()
+    return scope
+
+
+def _overlaps(scope, keys):
+    """Indica si algún ``(airline, origin, year, month, day)`` cae dentro del ámbito.
+
+    Los demás filtros (destino, cancelado, retraso...) no se comprueban: en
+    caso de duda se invalida.
+    """
+    airlines = scope.get('airline')
+    origins = scope.get('origin_airport')
+    date_from = scope.get('date_from')
+    date_to = scope.get('date_to')
+    for airline, origin, year, month, day in keys:
+        if airlines and airline not in airlines:
+            continue
+        if origins and origin not in origins:
+            continue
+        if scope.get('year', year) != year or scope.get('month', month) != month or scope.get('day', day) != day:
+            continue
+        if date_from or date_to:
+            # Se compara como texto sin construir un date: una fecha imposible
+            # (p. ej. 30 de febrero) no debe impedir la invalidación
+            day_iso = f'{year:04d}-{month:02d}-{day:02d}'
+            if (date_from and day_iso < date_from) or (date_to and day_iso > date_to):
+                continue
+        return True
+    return False
+
+
+class MemoryBackend:
+    """Entradas en el proceso: LRU acotada por bytes con TTL."""
+
+    def __init__(self, app):
+        self.max_bytes = app.config['FLIGHT_CACHE_MAX_BYTES']
+        self.ttl = app.config['FLIGHT_CACHE_TTL']
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl and time.time() - entry.created >= self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def set(self, key, entry, generation):
+        """Guarda la entrada si no hubo invalidaciones desde ``generation``.
+
+        Devuelve ``(guardada, entradas expulsadas)``.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return False, 0
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            evicted = 0
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return True, evicted
+
+    def generation(self):
+        return self._generation
+
+    def invalidate(self, keys):
+        """Elimina las entradas cuyo ámbito incluye alguno de ``keys`` (todas si es None)."""
+        with self._lock:
+            self._generation += 1
+            stale = [k for k, e in self._entries.items() if keys is None or _overlaps(e.scope, keys)]
+            for key in stale:
+                self._remove(key)
+            return len(stale)
+
+    def size(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class SQLiteBackend:
+    """Entradas en un fichero SQLite local compartido por los workers del host.
+
+    Las invalidaciones de un worker afectan a todos; la LRU se aproxima con
+    la columna ``accessed``, que sólo se actualiza si tiene más de
+    ``touch_interval`` segundos: así casi todos los aciertos son lecturas y
+    no compiten por el bloqueo de escritura de SQLite.
+    """
+
+    touch_interval = 5.0
+
+    def __init__(self, app):
+        self.max_bytes = app.config['FLIGHT_CACHE_MAX_BYTES']
+        self.ttl = app.config['FLIGHT_CACHE_TTL']
+        self.path = app.config['FLIGHT_CACHE_PATH']
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB, '
+                         'meta TEXT, scope TEXT, size INTEGER, created REAL, accessed REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_entries_accessed ON entries (accessed)')
+            conn.execute('CREATE TABLE IF NOT EXISTS state (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO state VALUES ('generation', 0)")
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT body, meta, scope, created, accessed FROM entries WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None:
+            return None
+        body, meta, scope, created, accessed = row
+        now = time.time()
+        if self.ttl and now - created >= self.ttl:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return None
+        if now - accessed >= self.touch_interval:
+            conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+        mimetype, headers, etag = json.loads(meta)
+        return CachedResult(body, mimetype, headers, json.loads(scope), etag, created)
+
+    def set(self, key, entry, generation):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute("SELECT value FROM state WHERE name = 'generation'").fetchone()[0] != generation:
+                conn.execute('ROLLBACK')
+                return False, 0
+            conn.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, entry.body, json.dumps([entry.mimetype, entry.headers, entry.etag]),
+                 json.dumps(entry.scope), len(entry.body), entry.created, entry.created)
+            )
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                for old_key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall():
+                    conn.execute('DELETE FROM entries WHERE key = ?', (old_key,))
+                    evicted += 1
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute('COMMIT')
+            return True, evicted
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def generation(self):
+        return self._connect().execute("SELECT value FROM state WHERE name = 'generation'").fetchone()[0]
+
+    def invalidate(self, keys):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("UPDATE state SET value = value + 1 WHERE name = 'generation'")
+            stale = [k for k, scope in conn.execute('SELECT key, scope FROM entries')
+                     if keys is None or _overlaps(json.loads(scope), keys)]
+            conn.executemany('DELETE FROM entries WHERE key = ?', [(k,) for k in stale])
+            conn.execute('COMMIT')
+            return len(stale)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def size(self):
+        entries, size = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'entries': entries, 'bytes': size}
+
+
+BACKENDS = {'memory': MemoryBackend, 'sqlite': SQLiteBackend}
+
+
+def _load_backend(name):
+    """Clase del backend: 'memory', 'sqlite' o una ruta 'paquete.modulo:Clase'."""
+    if name in BACKENDS:
+        return BACKENDS[name]
+    module, _, attr = name.partition(':')
+    return getattr(importlib.import_module(module), attr)
+
+
+class FlightCache:
+    """Caché de resultados de lecturas de vuelos delante de un backend.
+
+    La clave es la forma normalizada de la petición (filtros, campos,
+    paginación y formato). Las entradas mayores que FLIGHT_CACHE_MAX_ENTRY_BYTES
+    no se guardan. Mantiene los contadores del proceso.
+    """
+
+    def __init__(self, app):
+        self.backend = _load_backend(app.config['FLIGHT_CACHE_BACKEND'])(app)
+        self.max_entry_bytes = min(app.config['FLIGHT_CACHE_MAX_ENTRY_BYTES'], app.config['FLIGHT_CACHE_MAX_BYTES'])
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0, 'evictions': 0,
+                         'invalidations': 0, 'skipped': 0}
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    @staticmethod
+    def key(kind, filters, **params):
+        # Los filtros ya vienen normalizados (códigos ordenados, fechas como date)
+        raw = json.dumps({'kind': kind, 'filters': filters, 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """Respuesta desde la caché (304 si coincide el ETag) o None si no está.
+
+        Dentro de la ventana read-your-writes se lee siempre de la base de
+        datos: otro worker pudo cachear el resultado antes de la escritura.
+        """
+        if in_write_window():
+            self._count('bypassed')
+            return None
+        entry = self.backend.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+        self._count('hits')
+        response = Response(entry.body, mimetype=entry.mimetype, headers=entry.headers)
+        response.set_etag(entry.etag)
+        response.headers['X-Cache'] = 'HIT'
+        return response.make_conditional(request)
+
+    def _store(self, key, filters, body, mimetype, headers, generation):
+        if len(body) > self.max_entry_bytes:
+            self._count('skipped')
+            return None
+        etag = hashlib.sha1(body).hexdigest()
+        entry = CachedResult(body, mimetype, headers or {}, _scope(filters), etag, time.time())
+        stored, evicted = self.backend.set(key, entry, generation)
+        self._count('stores' if stored else 'skipped')
+        if evicted:
+            self._count('evictions', evicted)
+        return etag if stored else None
+
+    def generation(self):
+        """Generación de invalidaciones; se lee antes de ejecutar la consulta."""
+        return self.backend.generation()
+
+    def store_response(self, key, filters, response, generation):
+        """Guarda una respuesta ya construida (no en streaming) y le pone ETag.
+
+        ``generation`` debe leerse antes de la consulta: si una invalidación
+        se confirma entre medias la respuesta no se guarda.
+        """
+        etag = self._store(key, filters, response.get_data(), response.mimetype, None, generation)
+        if etag:
+            response.set_etag(etag)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+
+    def tee(self, key, filters, chunks, mimetype, headers=None):
+        """Envuelve los trozos de una respuesta en streaming y la guarda al terminar.
+
+        Se deja de acumular en cuanto se supera FLIGHT_CACHE_MAX_ENTRY_BYTES,
+        así que la memoria extra está acotada. La generación se lee antes de
+        pedir el primer trozo, es decir, antes de ejecutar la consulta.
+        """
+        generation = self.backend.generation()
+        parts, size = [], 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    parts = None
+                    self._count('skipped')
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self._store(key, filters, b''.join(parts), mimetype, headers, generation)
+
+    def invalidate(self, rows=None):
+        """Invalida las entradas afectadas por los vuelos insertados (todas si None)."""
+        keys = None if rows is None else {
+            (r['airline'], r['origin_airport'], r['year'], r['month'], r['day']) for r in rows
+        }
+        removed = self.backend.invalidate(keys)
+        self._count('invalidations', removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['hits'] + counters['misses']
+        counters['hit_rate'] = counters['hits'] / lookups if lookups else None
+        counters.update(self.backend.size())
+        counters['backend'] = type(self.backend).__name__
+        return counters
+
+
+_init_lock = threading.Lock()
+
+
+def get_flight_cache():
+    """Caché de resultados de la aplicación actual (None si está desactivada)."""
+    app = current_app._get_current_object()
+    if not app.config['FLIGHT_CACHE_ENABLED']:
+        return None
+    cache = app.extensions.get('flight_cache')
+    if cache is None:
+        with _init_lock:
+            cache = app.extensions.get('flight_cache')
+            if cache is None:
+                cache = FlightCache(app)
+                app.extensions['flight_cache'] = cache
+    return cache
+
+
+def invalidate_flight_cache(rows=None):
+    """Invalida la caché tras confirmar la inserción de ``rows``.
+
+    No lanza excepciones: la escritura ya está confirmada. Si falla la
+    invalidación selectiva se invalida todo y, si tampoco es posible, se
+    registra el error (las entradas caducan con FLIGHT_CACHE_TTL).
+    """
+    cache = get_flight_cache()
+    if cache is None or not (rows is None or rows):
+        return
+    try:
+        cache.invalidate(rows)
+        return
+    except Exception as e:
+        current_app.logger.error(f"Error al invalidar la caché de vuelos: {str(e)}")
+    if rows is not None:
+        try:
+            cache.invalidate()
+        except Exception as e:
+            current_app.logger.error(f"Error al invalidar toda la caché de vuelos: {str(e)}")
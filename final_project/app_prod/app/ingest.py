@@ -0,0 +1,144 @@
+# app/ingest.py
+
+import csv
+import io
+from sqlalchemy.exc import DBAPIError
+from app import db
+from app.encoding import loads
+from app.queries import FLIGHT_CSV_HEADER, FLIGHT_FIELDS
+from app.feed import notify_new_flights
+from app.flight_cache import invalidate_flight_cache
+from app.partitions import insert_flights
+from app.rollups import apply_flights
+from app.schemas import FLIGHT_SCHEMA, KnownCodes, ValidationError
+
+# Mapear tanto las cabeceras del CSV de descarga ('Day of Week') como los
+# nombres de columna ('day_of_week') al nombre de la columna
+_HEADER_TO_FIELD = {label: field for label, field in zip(FLIGHT_CSV_HEADER, FLIGHT_FIELDS)}
+_HEADER_TO_FIELD.update({field: field for field in FLIGHT_FIELDS})
+
+
+def iter_csv(stream):
+    """Itera un CSV línea a línea devolviendo ``(número de línea, dict)``."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [_HEADER_TO_FIELD.get(h.strip()) for h in header]
+    for line_no, values in enumerate(reader, start=2):
+        if not values:
+            continue
+        yield line_no, {f: v for f, v in zip(fields, values) if f}
+
+
+def iter_ndjson(stream):
+    """Itera un NDJSON (un objeto JSON por línea) devolviendo ``(número de línea, dict)``."""
+    text = io.TextIOWrapper(stream, encoding='utf-8')
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = loads(line)
+        except ValueError as e:
+            yield line_no, e
+            continue
+        if not isinstance(record, dict):
+            yield line_no, ValueError('se esperaba un objeto JSON')
+            continue
+        yield line_no, record
+
+
+def _insert_batch(rows):
+    """Inserta un lote en una sola transacción (executemany) junto con la
+    actualización de los agregados de retrasos.
+
+    Si el lote completo falla, se reintenta fila a fila con savepoints para
+    aislar las filas que rechaza la base de datos. Devuelve
+    ``(insertadas, [(índice, error), ...])``.
+    """
+    try:
+        insert_flights(rows)
+        apply_flights(rows)
+        db.session.commit()
+    except DBAPIError:
+        db.session.rollback()
+    else:
+        invalidate_flight_cache(rows)
+        notify_new_flights()
+        return len(rows), []
+
+    accepted = []
+    failures = []
+    for index, row in enumerate(rows):
+        try:
+            with db.session.begin_nested():
+                insert_flights([row])
+            accepted.append(row)
+        except DBAPIError as e:
+            failures.append((index, str(e.orig)))
+    apply_flights(accepted)
+    db.session.commit()
+    invalidate_flight_cache(accepted)
+    if accepted:
+        notify_new_flights()
+    return len(accepted), failures
+
+
+def ingest_flights(records, batch_size, max_errors):
+    """Valida e inserta vuelos en lotes acotados.
+
+    ``records`` es un iterable de ``(número de línea, dict | Exception)``. La
+    memoria usada depende sólo de ``batch_size`` y ``max_errors``, no del
+    tamaño del fichero.
+    """
+    result = {'inserted': 0, 'rejected': 0, 'batches': [], 'errors': []}
+    # Aerolíneas y aeropuertos se comprueban en memoria, antes de tocar la base de datos
+    known = KnownCodes()
+
+    def reject(line_no, message):
+        result['rejected'] += 1
+        if len(result['errors']) < max_errors:
+            result['errors'].append({'line': line_no, 'error': message})
+
+    def flush(records, lines, rejected_before):
+        # Se valida el lote entero: validate_many usa su camino rápido y
+        # cachés por lote (códigos, fechas ya comprobadas)
+        rows, invalid = FLIGHT_SCHEMA.validate_many(records, known)
+        for failure in invalid:
+            reject(lines[failure['index']], str(ValidationError(failure['errors'])))
+        if invalid:
+            skipped = {failure['index'] for failure in invalid}
+            lines = [line for index, line in enumerate(lines) if index not in skipped]
+        inserted, failures = _insert_batch(rows) if rows else (0, [])
+        for index, message in failures:
+            reject(lines[index], message)
+        result['inserted'] += inserted
+        result['batches'].append({
+            'batch': len(result['batches']) + 1,
+            'inserted': inserted,
+            'rejected': result['rejected'] - rejected_before
+        })
+
+    batch, lines = [], []
+    rejected_before = 0
+    for line_no, record in records:
+        if isinstance(record, Exception):
+            reject(line_no, str(record))
+            continue
+        batch.append(record)
+        lines.append(line_no)
+        if len(batch) >= batch_size:
+            flush(batch, lines, rejected_before)
+            batch, lines = [], []
+            rejected_before = result['rejected']
+    if batch:
+        flush(batch, lines, rejected_before)
+    elif result['rejected'] > rejected_before:
+        result['batches'].append({
+            'batch': len(result['batches']) + 1,
+            'inserted': 0,
+            'rejected': result['rejected'] - rejected_before
+        })
+    return result
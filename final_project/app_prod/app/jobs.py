@@ -0,0 +1,274 @@
+# app/jobs.py
+
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.export import EXPORT_FORMATS, columnar_chunks, csv_chunks, iter_flight_batches
+from app.partitions import data_generation, flight_source, max_flight_id
+from app.queries import apply_flight_filters
+from app.replicas import use_replica
+
+
+class ExportQueueFull(Exception):
+    """No caben más trabajos en la cola de exportación."""
+
+
+def data_version():
+    """Versión de los datos de vuelos.
+
+    Cambia cuando se insertan vuelos (id máximo) y cuando se archivan o
+    eliminan meses (generación de los datos).
+    """
+    return data_generation(), max_flight_id()
+
+
+def job_key(fmt, fields, filters, version):
+    """Identificador determinista: peticiones idénticas comparten artefacto."""
+    payload = {
+        'format': fmt,
+        'fields': fields,
+        'filters': {k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in filters.items()},
+        'version': version,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:20]
+
+
+def _boot_id():
+    """Identificador del arranque del host (vacío si el sistema no lo expone)."""
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return ''
+
+
+def _owner():
+    return {'pid': os.getpid(), 'host': socket.gethostname(), 'boot': _boot_id()}
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ExportJobs:
+    """Trabajos de exportación en segundo plano con un pool de hilos acotado.
+
+    El estado de cada trabajo se guarda junto al artefacto en ``directory``
+    (``<id>.json``) para que cualquier worker pueda consultarlo y servirlo.
+    Cada estado lleva el proceso dueño (``owner``) y un latido
+    (``updated_at``) que se renueva cada ``heartbeat`` segundos mientras el
+    trabajo está en cola o en curso, para detectar trabajos huérfanos.
+    """
+
+    def __init__(self, app, directory, workers, max_pending, retention, heartbeat=10):
+        self.app = app
+        self.directory = directory
+        self.max_pending = max_pending
+        self.retention = retention
+        self.heartbeat = heartbeat
+        self.owner = _owner()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._pending = 0
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._beat, name='export-heartbeat', daemon=True).start()
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def artifact_path(self, job):
+        return os.path.join(self.directory, f"{job['id']}.{EXPORT_FORMATS[job['format']][1]}")
+
+    def _save(self, job):
+        path = self._status_path(job['id'])
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({**job, 'updated_at': time.time()}, f)
+        os.replace(tmp, path)
+
+    def _beat(self):
+        """Renueva el latido de los trabajos de este proceso."""
+        while True:
+            time.sleep(self.heartbeat)
+            with self._lock:
+                jobs = [dict(job) for job in self._jobs.values()]
+            for job in jobs:
+                try:
+                    self._save(job)
+                except OSError:
+                    pass
+
+    def is_orphaned(self, job):
+        """Indica si un trabajo en cola o en curso ya no tiene quien lo termine.
+
+        Lo es si su proceso dueño ya no existe (mismo host y arranque) o si su
+        latido no se ha renovado en varios intervalos (p. ej. otro host).
+        """
+        with self._lock:
+            if job['id'] in self._jobs:
+                return False
+        owner = job.get('owner') or {}
+        if owner.get('host') == self.owner['host'] and owner.get('boot') == self.owner['boot']:
+            # Este proceso no lo tiene en memoria: murió el worker que lo
+            # encoló y el sistema reutilizó su pid
+            if owner.get('pid') == self.owner['pid'] or not _pid_alive(owner.get('pid', 0)):
+                return True
+        return time.time() - job.get('updated_at', 0) > 4 * self.heartbeat
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        try:
+            with open(self._status_path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def submit(self, fmt, fields, filters):
+        """Encola una exportación o devuelve el trabajo idéntico ya existente."""
+        job_id = job_key(fmt, fields, filters, data_version())
+        existing = self.get(job_id)
+        if existing is not None and existing['status'] in ('queued', 'running'):
+            if not self.is_orphaned(existing):
+                return existing, False
+            self.app.logger.warning(f"Exportación {job_id} huérfana ({existing['status']}); se vuelve a encolar")
+        if existing is not None and existing['status'] == 'done' and os.path.exists(self.artifact_path(existing)):
+            return existing, False
+
+        with self._lock:
+            # Otra petición idéntica pudo encolarlo mientras tanto
+            if job_id in self._jobs:
+                return dict(self._jobs[job_id]), False
+            if self._pending >= self.max_pending:
+                raise ExportQueueFull()
+            self._pending += 1
+            job = {
+                'id': job_id,
+                'format': fmt,
+                'fields': fields,
+                'filters': {k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in filters.items()},
+                'status': 'queued',
+                'rows_written': 0,
+                'total_rows': None,
+                'bytes': 0,
+                'error': None,
+                'created_at': time.time(),
+                'finished_at': None,
+                'owner': self.owner,
+            }
+            self._jobs[job_id] = job
+        self._save(job)
+        self._prune()
+        self._executor.submit(self._run, job_id, filters)
+        return dict(job), True
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            snapshot = dict(job)
+        return snapshot
+
+    def _run(self, job_id, filters):
+        job = self._update(job_id, status='running')
+        path = self.artifact_path(job)
+        # Nombre temporal propio: dos workers pueden ejecutar el mismo trabajo
+        # a la vez y cada uno sustituye el artefacto por un fichero completo
+        tmp = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.part'
+        try:
+            with self.app.app_context():
+                # La exportación sólo lee: se hace desde una réplica si la hay
+                use_replica()
+                source = flight_source(filters)
+                total = db.session.execute(
+                    apply_flight_filters(select(func.count()).select_from(source), filters, source)
+                ).scalar()
+                self._save(self._update(job_id, total_rows=total))
+
+                def counted(batches):
+                    written = 0
+                    for rows in batches:
+                        yield rows
+                        written += len(rows)
+                        self._save(self._update(job_id, rows_written=written))
+
+                fields = job['fields']
+                batches = counted(iter_flight_batches(
+                    filters, fields, self.app.config['FLIGHTS_EXPORT_BATCH_SIZE']))
+                if job['format'] == 'csv':
+                    chunks = csv_chunks(fields, batches, self.app.config['FLIGHTS_EXPORT_CHUNK_BYTES'])
+                else:
+                    chunks = columnar_chunks(job['format'], fields, batches)
+                with open(tmp, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+            os.replace(tmp, path)
+            self._save(self._update(job_id, status='done', bytes=os.path.getsize(path),
+                                    finished_at=time.time()))
+        except Exception as e:
+            self.app.logger.error(f"Error en la exportación {job_id}: {str(e)}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            self._save(self._update(job_id, status='failed', error=str(e), finished_at=time.time()))
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._jobs.pop(job_id, None)
+
+    def _prune(self):
+        """Borra artefactos y estados más antiguos que ``retention`` segundos."""
+        limit = time.time() - self.retention
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                # Los .part en curso se modifican continuamente; los antiguos
+                # son de procesos que terminaron sin completarlos
+                if os.path.getmtime(path) >= limit:
+                    continue
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_init_lock = threading.Lock()
+
+
+def get_export_jobs():
+    """Devuelve el gestor de exportaciones de la aplicación actual.
+
+    Se crea bajo demanda (y no en create_app) para que los hilos se arranquen
+    en cada worker después del fork.
+    """
+    app = current_app._get_current_object()
+    jobs = app.extensions.get('export_jobs')
+    if jobs is None:
+        with _init_lock:
+            jobs = app.extensions.get('export_jobs')
+            if jobs is None:
+                jobs = ExportJobs(
+                    app,
+                    directory=app.config['EXPORT_DIR'],
+                    workers=app.config['EXPORT_WORKERS'],
+                    max_pending=app.config['EXPORT_MAX_PENDING'],
+                    retention=app.config['EXPORT_RETENTION'],
+                    heartbeat=app.config['EXPORT_HEARTBEAT_INTERVAL'],
+                )
+                app.extensions['export_jobs'] = jobs
+    return jobs
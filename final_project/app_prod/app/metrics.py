@@ -0,0 +1,226 @@
+# app/metrics.py
+
+import threading
+from time import perf_counter
+from flask import Response, g, has_request_context, request
+from app.encoding import FastJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites (en segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Límites (en bytes) del histograma de tamaño de respuesta
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760, 104857600, 1073741824)
+
+
+class RequestStats:
+    """Contadores de una petición; se guardan en ``g.perf_stats``."""
+    __slots__ = ('start', 'sql_count', 'sql_time', 'serialize_time', 'size')
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self.size = 0
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            # [contadores por bucket..., +Inf, suma]
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+                break
+        else:
+            series[len(self.buckets)] += 1
+        series[-1] += value
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self._series.items()):
+            base = ','.join(f'{k}="{v}"' for k, v in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-1]}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description):
+        self.name = name
+        self.description = description
+        self._series = {}
+
+    def inc(self, labels, value=1):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self, label_names):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._series.items()):
+            base = ','.join(f'{k}="{v}"' for k, v in zip(label_names, labels))
+            lines.append(f'{self.name}{{{base}}} {value}')
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas en memoria del proceso en formato de exposición de Prometheus.
+
+    Con varios workers cada proceso expone sus propias métricas.
+    """
+    LABELS = ('endpoint', 'method')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = Histogram('http_request_duration_seconds',
+                                 'Duración de las peticiones (incluye el streaming del cuerpo)', LATENCY_BUCKETS)
+        self.db_time = Histogram('http_request_db_seconds',
+                                 'Tiempo en la base de datos por petición', LATENCY_BUCKETS)
+        self.size = Histogram('http_response_size_bytes', 'Tamaño de las respuestas', SIZE_BUCKETS)
+        self.statements = Counter('db_statements_total', 'Sentencias SQL ejecutadas')
+        self.serialize = Counter('http_serialization_seconds_total', 'Tiempo de serialización JSON')
+        self.requests = Counter('http_requests_total', 'Peticiones atendidas')
+
+    def record(self, endpoint, method, status, stats, duration):
+        labels = (endpoint, method)
+        with self._lock:
+            self.latency.observe(labels, duration)
+            self.db_time.observe(labels, stats.sql_time)
+            self.size.observe(labels, stats.size)
+            self.statements.inc(labels, stats.sql_count)
+            self.serialize.inc(labels, stats.serialize_time)
+            self.requests.inc(labels + (str(status),))
+
+    def render(self):
+        with self._lock:
+            lines = []
+            for metric in (self.latency, self.db_time, self.size, self.statements, self.serialize):
+                lines.extend(metric.render(self.LABELS))
+            lines.extend(self.requests.render(self.LABELS + ('status',)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _current_stats():
+    if has_request_context():
+        return g.get('perf_stats')
+    return None
+
+
+# El inicio se guarda en el contexto de ejecución de cada sentencia: si falla,
+# after_cursor_execute no se dispara y el contexto se descarta con ella. Sin
+# contexto (sentencias internas del dialecto) se usa conn.info por cursor y
+# handle_error limpia la entrada para no dejarla en la conexión del pool.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = perf_counter()
+    else:
+        conn.info.setdefault('query_start', {})[id(cursor)] = perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        start = getattr(context, '_query_start', None)
+    else:
+        start = conn.info.get('query_start', {}).pop(id(cursor), None)
+    if start is None:
+        return
+    elapsed = perf_counter() - start
+    stats = _current_stats()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_time += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and exception_context.execution_context is None:
+        conn.info.pop('query_start', None)
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """Proveedor JSON que acumula el tiempo de serialización de la petición."""
+
+    def dumps(self, obj, **kwargs):
+        start = perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            stats = _current_stats()
+            if stats is not None:
+                stats.serialize_time += perf_counter() - start
+
+
+class _CountingIterable:
+    """Envuelve el cuerpo de una respuesta en streaming para contar los bytes enviados."""
+
+    def __init__(self, iterable, stats):
+        self._iterable = iterable
+        self._stats = stats
+
+    def __iter__(self):
+        for chunk in self._iterable:
+            self._stats.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        if hasattr(self._iterable, 'close'):
+            self._iterable.close()
+
+
+def _server_timing(stats):
+    total = (perf_counter() - stats.start) * 1000
+    return (f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.sql_count} queries", '
+            f'ser;dur={stats.serialize_time * 1000:.2f}, '
+            f'total;dur={total:.2f}')
+
+
+def init_metrics(app):
+    """Registra los hooks de instrumentación y el endpoint /metrics."""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_stats():
+        g.perf_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.get('perf_stats')
+        if stats is None:
+            return response
+        response.headers['Server-Timing'] = _server_timing(stats)
+        endpoint = request.endpoint or 'unknown'
+        method = request.method
+        status = response.status_code
+
+        if response.is_streamed:
+            response.response = _CountingIterable(response.response, stats)
+        else:
+            stats.size = response.calculate_content_length() or 0
+
+        # Se registra al cerrar la respuesta para incluir el tiempo de streaming
+        response.call_on_close(
+            lambda: registry.record(endpoint, method, status, stats, perf_counter() - stats.start)
+        )
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -19,6 +19,13 @@ class Airport(db.Model):
 
 class Flight(db.Model):
     __tablename__ = 'flights'
+    # Índices compuestos para los filtros de GET /api/flights
+    __table_args__ = (
+        db.Index('ix_flights_airline_date', 'airline', 'year', 'month', 'day'),
+        db.Index('ix_flights_origin_date', 'origin_airport', 'year', 'month', 'day'),
+        db.Index('ix_flights_destination_date', 'destination_airport', 'year', 'month', 'day'),
+        db.Index('ix_flights_date', 'year', 'month', 'day'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     year = db.Column(db.Integer, nullable=False)
     month = db.Column(db.Integer, nullable=False)
@@ -51,3 +58,57 @@ class Flight(db.Model):
     airline_delay = db.Column(db.Integer)
     late_aircraft_delay = db.Column(db.Integer)
     weather_delay = db.Column(db.Integer)
+
+
+class DelayRollupMixin:
+    """Columnas comunes de las tablas de agregados diarios de retrasos."""
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Integer, primary_key=True)
+    flights = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_flights = db.Column(db.Integer, nullable=False, default=0)
+    diverted_flights = db.Column(db.Integer, nullable=False, default=0)
+    departure_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+    arrival_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+    arrival_delay_count = db.Column(db.Integer, nullable=False, default=0)
+    air_system_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+    security_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+    airline_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+    late_aircraft_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+    weather_delay_total = db.Column(db.BigInteger, nullable=False, default=0)
+
+class AirlineDailyStats(DelayRollupMixin, db.Model):
+    __tablename__ = 'airline_daily_stats'
+    airline = db.Column(db.String(3), primary_key=True)
+
+class OriginDailyStats(DelayRollupMixin, db.Model):
+    __tablename__ = 'origin_daily_stats'
+    origin_airport = db.Column(db.String(3), primary_key=True)
+
+class DataGeneration(db.Model):
+    """Generación de los datos de vuelos.
+
+    La incrementan las operaciones que quitan vuelos sin cambiar el id máximo
+    (archivar o eliminar meses); forma parte de ``jobs.data_version``.
+    """
+    __tablename__ = 'data_generation'
+    id = db.Column(db.Integer, primary_key=True)
+    generation = db.Column(db.Integer, nullable=False, default=0)
+
+class DelaySketch(db.Model):
+    """Resumen t-digest de los retrasos de una aerolínea/aeropuerto en un mes.
+
+    Las inserciones de vuelos añaden filas nuevas (deltas) en lugar de
+    modificar las existentes; 'flask sketches compact' las fusiona.
+    """
+    __tablename__ = 'delay_sketches'
+    __table_args__ = (
+        db.Index('ix_delay_sketches_key', 'dimension', 'code', 'year', 'month', 'measure'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)
+    code = db.Column(db.String(3), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    measure = db.Column(db.String(20), nullable=False)
+    digest = db.Column(db.LargeBinary, nullable=False)
@@ -0,0 +1,458 @@
+# app/partitions.py
+
+# Particionado de flights por (year, month) cuando FLIGHTS_PARTITIONED está
+# activado. En MySQL se usa particionado por rango nativo (una partición pYYYYMM
+# por mes y pmax al final); en SQLite, una tabla flights_pYYYYMM por mes con
+# ids repartidos desde una secuencia común. Archivar o borrar un mes es una
+# operación de metadatos, no un DELETE masivo.
+
+import re
+import threading
+from datetime import date, datetime
+from operator import itemgetter
+from flask import current_app
+from sqlalchemy import (
+    BigInteger, Column, Index, Integer, MetaData, Table, and_, false, func, insert, inspect, or_, select,
+    text, union_all, update
+)
+from sqlalchemy.dialects.sqlite import DATETIME as SQLITE_DATETIME
+from app import db
+from app.models import DataGeneration, Flight
+from app.queries import apply_flight_filters, columns_for
+
+flights_table = Flight.__table__
+
+_TABLE_NAME = re.compile(r'^flights_p(\d{4})(\d{2})$')
+_PARTITION_NAME = re.compile(r'^p(\d{4})(\d{2})$')
+_ARCHIVE_NAME = re.compile(r'^flights_archive_p(\d{4})(\d{2})$')
+
+# Tablas mensuales (SQLite): se definen bajo demanda en un MetaData propio
+# para que db.create_all() no las cree
+_metadata = MetaData()
+_lock = threading.Lock()
+
+id_sequence = Table(
+    'flight_id_sequence', _metadata,
+    Column('id', Integer, primary_key=True),
+    Column('next_id', BigInteger, nullable=False),
+)
+
+
+def partition_name(year, month):
+    return f'p{year:04d}{month:02d}'
+
+
+def parse_month(value):
+    """Convierte 'YYYY-MM' en ``(year, month)``."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        date(year, month, 1)
+    except ValueError:
+        raise ValueError(f"Mes inválido '{value}': se espera YYYY-MM")
+    return year, month
+
+
+def next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def month_range(first, last):
+    """Meses ``(year, month)`` de ``first`` a ``last``, ambos incluidos."""
+    months = []
+    current = first
+    while current <= last:
+        months.append(current)
+        current = next_month(*current)
+    return months
+
+
+def layout():
+    """'none', 'native' (MySQL) o 'tables' (tablas por mes)."""
+    if not current_app.config['FLIGHTS_PARTITIONED']:
+        return 'none'
+    dialect = db.session.get_bind().dialect.name
+    return 'native' if dialect in ('mysql', 'mariadb') else 'tables'
+
+
+def month_table(year, month):
+    """Tabla de un mes con las columnas e índices de flights (sin claves foráneas)."""
+    name = f'flights_{partition_name(year, month)}'
+    table = _metadata.tables.get(name)
+    if table is not None:
+        return table
+    with _lock:
+        table = _metadata.tables.get(name)
+        if table is None:
+            columns = [
+                Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable,
+                       autoincrement=False, default=c.default.arg if c.default is not None else None)
+                for c in flights_table.columns
+            ]
+            # Los nombres de índice son globales en SQLite: se sufijan con el mes
+            indexes = [Index(f'{ix.name}_{partition_name(year, month)}', *[c.name for c in ix.columns])
+                       for ix in flights_table.indexes]
+            table = Table(name, _metadata, *columns, *indexes)
+    return table
+
+
+def list_months():
+    """Meses ``(year, month)`` que tienen partición, en orden."""
+    current = layout()
+    if current == 'tables':
+        names = inspect(db.session.connection()).get_table_names()
+        pattern = _TABLE_NAME
+    elif current == 'native':
+        names = db.session.execute(text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'flights' AND PARTITION_NAME IS NOT NULL"
+        )).scalars().all()
+        pattern = _PARTITION_NAME
+    else:
+        return []
+    months = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            months.append((int(match.group(1)), int(match.group(2))))
+    return sorted(months)
+
+
+def archived_months():
+    """Meses ``(year, month)`` archivados con 'flask partitions archive', en orden."""
+    months = []
+    for name in inspect(db.session.connection()).get_table_names():
+        match = _ARCHIVE_NAME.match(name)
+        if match:
+            months.append((int(match.group(1)), int(match.group(2))))
+    return sorted(months)
+
+
+def in_months(table, months):
+    """Condición ``(year, month) IN months`` sobre una tabla con esas columnas."""
+    return or_(*[and_(table.c.year == y, table.c.month == m) for y, m in months])
+
+
+def month_matches(year, month, filters):
+    """Indica si los filtros de fecha admiten vuelos del mes dado."""
+    if 'year' in filters and year != filters['year']:
+        return False
+    if 'month' in filters and month != filters['month']:
+        return False
+    date_from = filters.get('date_from')
+    if date_from and (year, month) < (date_from.year, date_from.month):
+        return False
+    date_to = filters.get('date_to')
+    if date_to and (year, month) > (date_to.year, date_to.month):
+        return False
+    return True
+
+
+def flight_tables(filters=None):
+    """Tablas que hay que leer para los filtros (poda de particiones).
+
+    Fuera de la disposición 'tables' es siempre flights: en MySQL la poda la
+    hace el propio optimizador a partir del WHERE.
+    """
+    if layout() != 'tables':
+        return [flights_table]
+    filters = filters or {}
+    return [month_table(y, m) for y, m in list_months() if month_matches(y, m, filters)]
+
+
+def _empty_source():
+    return select(*flights_table.c).where(false()).subquery('flights')
+
+
+def flight_source(filters=None):
+    """Origen de datos de vuelos para usar en un FROM, ya podado por los filtros."""
+    tables = flight_tables(filters)
+    if not tables:
+        return _empty_source()
+    if len(tables) == 1:
+        return tables[0]
+    return union_all(*[select(*t.c) for t in tables]).subquery('flights')
+
+
+def page_statement(fields, filters, after, limit):
+    """Página de vuelos por cursor (``id > after``) ordenada por id.
+
+    Con varias particiones cada una aporta como mucho ``limit`` filas y sólo
+    se ordena esa unión, no todos los vuelos de los meses seleccionados.
+    """
+    def page(table):
+        return apply_flight_filters(
+            select(*columns_for(fields, table)).where(table.c.id > after),
+            filters, table
+        ).order_by(table.c.id).limit(limit)
+
+    tables = flight_tables(filters)
+    if len(tables) == 1:
+        return page(tables[0])
+    if not tables:
+        return page(_empty_source())
+    pages = union_all(*[select(page(t).subquery()) for t in tables]).subquery('flights')
+    return select(*pages.c).order_by(pages.c.id).limit(limit)
+
+
+def allocate_ids(count):
+    """Reserva ``count`` ids consecutivos de la secuencia común (disposición 'tables').
+
+    El UPDATE toma el bloqueo de escritura, así que dos transacciones no
+    pueden recibir el mismo rango.
+    """
+    result = db.session.execute(update(id_sequence).values(next_id=id_sequence.c.next_id + count))
+    if result.rowcount == 0:
+        raise RuntimeError("Falta la secuencia de ids de vuelos: ejecute 'flask partitions init'")
+    return db.session.execute(select(id_sequence.c.next_id)).scalar() - count
+
+
+def _bind_processor(column, dialect):
+    """Conversor de parámetros de una columna para el driver (None si no hace falta).
+
+    SQLite guarda las fechas como texto; con el formato por defecto el
+    conversor de SQLAlchemy (``%`` con un dict por valor) equivale a
+    ``isoformat(' ', 'microseconds')`` de una fecha sin zona horaria, que es
+    varias veces más rápido. El resto de valores pasan por el original.
+    """
+    impl = column.type.dialect_impl(dialect)
+    processor = impl.bind_processor(dialect)
+    if not isinstance(impl, SQLITE_DATETIME) or impl._storage_format != SQLITE_DATETIME._storage_format:
+        return processor
+    isoformat = datetime.isoformat
+
+    def process(value):
+        if type(value) is datetime and value.tzinfo is None:
+            return isoformat(value, ' ', 'microseconds')
+        return processor(value)
+    return process
+
+
+def _executemany(table, rows):
+    """INSERT de muchas filas con el executemany del driver.
+
+    Equivale a ``db.session.execute(insert(table), rows)`` pero compila la
+    sentencia una vez y construye los parámetros columna a columna: los
+    conversores de tipo (fechas en SQLite, booleanos) se aplican con ``map``
+    y cada tupla se crea una sola vez con ``zip``. Todas las filas deben
+    tener las claves de la primera; las columnas que faltan toman su valor
+    por defecto.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+    defaults = {c.name: c.default.arg for c in table.columns
+                if c.name not in rows[0] and c.default is not None and c.default.is_scalar}
+    keys = list(rows[0]) + list(defaults)
+    compiled = insert(table).compile(dialect=dialect, column_keys=keys)
+    columns = {key: list(map(itemgetter(key), rows)) for key in rows[0]}
+    for key, value in defaults.items():
+        columns[key] = [value] * len(rows)
+    for key in keys:
+        processor = _bind_processor(table.c[key], dialect)
+        if processor is not None:
+            columns[key] = list(map(processor, columns[key]))
+
+    if compiled.positional:
+        params = list(zip(*(columns[key] for key in compiled.positiontup)))
+    else:
+        params = [dict(zip(keys, values)) for values in zip(*(columns[key] for key in keys))]
+    connection.exec_driver_sql(compiled.string, params)
+
+
+def insert_flights(rows):
+    """Inserta vuelos (dicts sin id) en flights o en la tabla de su mes.
+
+    No hace commit: se llama dentro de la transacción del llamador.
+    """
+    if not rows:
+        return
+    if layout() != 'tables':
+        _executemany(flights_table, rows)
+        return
+    first_id = allocate_ids(len(rows))
+    by_month = {}
+    for offset, row in enumerate(rows):
+        by_month.setdefault((row['year'], row['month']), []).append(dict(row, id=first_id + offset))
+    connection = db.session.connection()
+    for (year, month), group in by_month.items():
+        table = month_table(year, month)
+        table.create(connection, checkfirst=True)
+        _executemany(table, group)
+
+
+def max_flight_id():
+    if layout() == 'tables':
+        next_id = db.session.execute(select(id_sequence.c.next_id)).scalar()
+        return next_id - 1 if next_id else 0
+    return db.session.execute(select(func.max(flights_table.c.id))).scalar() or 0
+
+
+def data_generation():
+    """Generación actual de los datos de vuelos (0 si nunca se ha incrementado)."""
+    return db.session.execute(select(DataGeneration.generation).where(DataGeneration.id == 1)).scalar() or 0
+
+
+def bump_data_generation():
+    """Incrementa la generación de los datos (sin commit).
+
+    Invalida los resultados guardados con ``jobs.data_version`` (estadísticas
+    por ruta, exportaciones) en todos los procesos.
+    """
+    table = DataGeneration.__table__
+    result = db.session.execute(update(table).where(table.c.id == 1).values(generation=table.c.generation + 1))
+    if result.rowcount == 0:
+        db.session.execute(insert(table).values(id=1, generation=1))
+
+
+# --- Gestión (comandos 'flask partitions ...') ---
+
+def _mysql_create_statement(months):
+    parts = [f'PARTITION {partition_name(y, m)} VALUES LESS THAN ({next_month(y, m)[0]}, {next_month(y, m)[1]})'
+             for y, m in months]
+    parts.append('PARTITION pmax VALUES LESS THAN (MAXVALUE, MAXVALUE)')
+    return ',\n'.join(parts)
+
+
+def _data_months():
+    rows = db.session.execute(
+        select(flights_table.c.year, flights_table.c.month).distinct()
+    ).all()
+    return sorted((y, m) for y, m in rows)
+
+
+def init_partitions(through):
+    """Convierte flights a la disposición particionada hasta el mes ``through``.
+
+    En MySQL reorganiza la tabla (una sola vez); en SQLite mueve los vuelos
+    existentes a sus tablas mensuales y crea la secuencia de ids.
+    """
+    current = layout()
+    existing = _data_months()
+    first = existing[0] if existing else through
+    months = month_range(min(first, through), max(existing[-1] if existing else through, through))
+
+    if current == 'native':
+        if list_months():
+            raise RuntimeError('flights ya está particionada')
+        # MySQL exige que la clave de partición forme parte de la clave primaria
+        # y no admite claves foráneas en tablas particionadas
+        foreign_keys = db.session.execute(text(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'flights'"
+        )).scalars().all()
+        for name in foreign_keys:
+            db.session.execute(text(f'ALTER TABLE flights DROP FOREIGN KEY `{name}`'))
+        db.session.execute(text('ALTER TABLE flights DROP PRIMARY KEY, ADD PRIMARY KEY (id, year, month)'))
+        db.session.execute(text(
+            f'ALTER TABLE flights PARTITION BY RANGE COLUMNS(year, month) (\n{_mysql_create_statement(months)}\n)'
+        ))
+        return months
+
+    if current != 'tables':
+        raise RuntimeError('El particionado está deshabilitado (FLIGHTS_PARTITIONED)')
+    connection = db.session.connection()
+    id_sequence.create(connection, checkfirst=True)
+    last_id = db.session.execute(select(func.max(flights_table.c.id))).scalar() or 0
+    for year, month in months:
+        table = month_table(year, month)
+        table.create(connection, checkfirst=True)
+        if (year, month) in existing:
+            source = select(*flights_table.c).where(flights_table.c.year == year, flights_table.c.month == month)
+            db.session.execute(insert(table).from_select([c.name for c in flights_table.c], source))
+    # Migración única: flights queda vacía y sólo se usan las tablas mensuales
+    db.session.execute(flights_table.delete())
+    next_id = db.session.execute(select(id_sequence.c.next_id)).scalar()
+    if next_id is None:
+        db.session.execute(insert(id_sequence).values(id=1, next_id=last_id + 1))
+    elif next_id <= last_id:
+        db.session.execute(update(id_sequence).values(next_id=last_id + 1))
+    db.session.commit()
+    return months
+
+
+def create_partitions(through):
+    """Crea por adelantado las particiones que falten hasta ``through``."""
+    current = layout()
+    existing = list_months()
+    start = next_month(*existing[-1]) if existing else through
+    months = month_range(start, through)
+    if not months:
+        return []
+    if current == 'native':
+        db.session.execute(text(
+            f'ALTER TABLE flights REORGANIZE PARTITION pmax INTO (\n{_mysql_create_statement(months)}\n)'
+        ))
+    elif current == 'tables':
+        connection = db.session.connection()
+        for year, month in months:
+            month_table(year, month).create(connection, checkfirst=True)
+        db.session.commit()
+    else:
+        raise RuntimeError('El particionado está deshabilitado (FLIGHTS_PARTITIONED)')
+    return months
+
+
+def archive_partition(year, month):
+    """Saca un mes de flights a la tabla ``flights_archive_pYYYYMM`` sin copiar filas."""
+    name = partition_name(year, month)
+    archive = f'flights_archive_{name}'
+    current = layout()
+    if (year, month) not in list_months():
+        raise RuntimeError(f'No existe la partición {name}')
+    if current == 'native':
+        db.session.execute(text(f'CREATE TABLE {archive} LIKE flights'))
+        db.session.execute(text(f'ALTER TABLE {archive} REMOVE PARTITIONING'))
+        db.session.execute(text(f'ALTER TABLE flights EXCHANGE PARTITION {name} WITH TABLE {archive}'))
+        db.session.execute(text(f'ALTER TABLE flights DROP PARTITION {name}'))
+        bump_data_generation()
+        db.session.commit()
+    else:
+        table = month_table(year, month)
+        # Los índices conservan su nombre al renombrar la tabla: se recrean
+        # con el sufijo del archivo para que el mes pueda volver a crearse
+        for ix in table.indexes:
+            db.session.execute(text(f'DROP INDEX {ix.name}'))
+        db.session.execute(text(f'ALTER TABLE flights_{name} RENAME TO {archive}'))
+        for ix in table.indexes:
+            columns = ', '.join(c.name for c in ix.columns)
+            archived = ix.name.replace(f'_{name}', f'_archive_{name}')
+            db.session.execute(text(f'CREATE INDEX {archived} ON {archive} ({columns})'))
+        bump_data_generation()
+        db.session.commit()
+        _forget(year, month)
+    return archive
+
+
+def drop_partition(year, month):
+    """Elimina un mes completo de flights."""
+    name = partition_name(year, month)
+    if (year, month) not in list_months():
+        raise RuntimeError(f'No existe la partición {name}')
+    if layout() == 'native':
+        db.session.execute(text(f'ALTER TABLE flights DROP PARTITION {name}'))
+        bump_data_generation()
+        db.session.commit()
+    else:
+        month_table(year, month).drop(db.session.connection())
+        bump_data_generation()
+        db.session.commit()
+        _forget(year, month)
+
+
+def partition_counts():
+    """``[(mes, filas)]`` de cada partición."""
+    result = []
+    for year, month in list_months():
+        if layout() == 'native':
+            stmt = select(func.count()).select_from(flights_table).where(
+                flights_table.c.year == year, flights_table.c.month == month)
+        else:
+            stmt = select(func.count()).select_from(month_table(year, month))
+        result.append(((year, month), db.session.execute(stmt).scalar()))
+    return result
+
+
+def _forget(year, month):
+    with _lock:
+        table = _metadata.tables.get(f'flights_{partition_name(year, month)}')
+        if table is not None:
+            _metadata.remove(table)
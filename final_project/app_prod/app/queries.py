@@ -0,0 +1,215 @@
+# app/queries.py
+
+from datetime import date, datetime
+from sqlalchemy import tuple_
+from app.models import Flight
+
+# Campos que se devuelven por defecto en GET /api/flights
+DEFAULT_FLIGHT_FIELDS = [
+    'id', 'year', 'month', 'day', 'day_of_week', 'airline', 'flight_number',
+    'tail_number', 'origin_airport', 'destination_airport', 'scheduled_departure',
+    'departure_time', 'departure_delay'
+]
+
+# Todas las columnas de la tabla flights, en el orden del modelo
+FLIGHT_FIELDS = [c.name for c in Flight.__table__.columns]
+
+# Cabecera del CSV de vuelos (mismo orden que FLIGHT_FIELDS)
+FLIGHT_CSV_HEADER = [
+    'ID', 'Year', 'Month', 'Day', 'Day of Week', 'Airline', 'Flight Number',
+    'Tail Number', 'Origin Airport', 'Destination Airport', 'Scheduled Departure',
+    'Departure Time', 'Departure Delay', 'Taxi Out', 'Wheels Off', 'Scheduled Time',
+    'Elapsed Time', 'Air Time', 'Distance', 'Wheels On', 'Taxi In',
+    'Scheduled Arrival', 'Arrival Time', 'Arrival Delay', 'Diverted',
+    'Cancelled', 'Cancellation Reason', 'Air System Delay', 'Security Delay',
+    'Airline Delay', 'Late Aircraft Delay', 'Weather Delay'
+]
+
+
+class QueryError(ValueError):
+    """Parámetros de consulta inválidos (se responde con 400)."""
+
+
+def parse_fields(raw, default=None):
+    """Convierte el parámetro ``fields=a,b,c`` en una lista de columnas válidas.
+
+    El ``id`` se incluye siempre porque es la clave del cursor.
+    """
+    if not raw:
+        fields = list(default or DEFAULT_FLIGHT_FIELDS)
+    else:
+        fields = [f.strip() for f in raw.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in FLIGHT_FIELDS]
+        if unknown:
+            raise QueryError(f"Campos desconocidos: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    # Eliminar duplicados conservando el orden
+    return list(dict.fromkeys(fields))
+
+
+def parse_int(args, name, default=None, minimum=None, maximum=None):
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return default
+    try:
+        value = int(raw)
+    except (TypeError, ValueError):
+        raise QueryError(f"El parámetro '{name}' debe ser un entero")
+    if minimum is not None and value < minimum:
+        raise QueryError(f"El parámetro '{name}' debe ser >= {minimum}")
+    if maximum is not None and value > maximum:
+        raise QueryError(f"El parámetro '{name}' debe ser <= {maximum}")
+    return value
+
+
+def parse_page(args, default_limit, max_limit):
+    """Devuelve ``(limit, after)`` para la paginación por cursor sobre ``Flight.id``."""
+    limit = parse_int(args, 'limit', default=default_limit, minimum=1, maximum=max_limit)
+    after = parse_int(args, 'after', default=0, minimum=0)
+    return limit, after
+
+
+def _parse_codes(args, name):
+    raw = args.get(name)
+    if not raw:
+        return None
+    codes = sorted({c.strip().upper() for c in raw.split(',') if c.strip()})
+    return codes or None
+
+
+def parse_bool(args, name):
+    raw = args.get(name)
+    if raw is None or raw == '':
+        return None
+    value = raw.strip().lower()
+    if value in ('true', '1', 't', 'yes'):
+        return True
+    if value in ('false', '0', 'f', 'no'):
+        return False
+    raise QueryError(f"El parámetro '{name}' debe ser true o false")
+
+
+def _parse_date(args, name):
+    raw = args.get(name)
+    if not raw:
+        return None
+    try:
+        return date.fromisoformat(raw.strip())
+    except ValueError:
+        raise QueryError(f"El parámetro '{name}' debe tener formato YYYY-MM-DD")
+
+
+def parse_flight_filters(args):
+    """Lee los filtros de vuelos de la query string.
+
+    Devuelve un dict normalizado (sólo con los filtros presentes) que sirve
+    también como clave estable para cachés y trabajos de exportación.
+    """
+    filters = {
+        'airline': _parse_codes(args, 'airline'),
+        'origin_airport': _parse_codes(args, 'origin_airport'),
+        'destination_airport': _parse_codes(args, 'destination_airport'),
+        'year': parse_int(args, 'year'),
+        'month': parse_int(args, 'month', minimum=1, maximum=12),
+        'day': parse_int(args, 'day', minimum=1, maximum=31),
+        'date_from': _parse_date(args, 'date_from'),
+        'date_to': _parse_date(args, 'date_to'),
+        'cancelled': parse_bool(args, 'cancelled'),
+        'diverted': parse_bool(args, 'diverted'),
+        'min_departure_delay': parse_int(args, 'min_departure_delay'),
+    }
+    if filters['date_from'] and filters['date_to'] and filters['date_from'] > filters['date_to']:
+        raise QueryError("'date_from' no puede ser posterior a 'date_to'")
+    return {k: v for k, v in filters.items() if v is not None}
+
+
+def flight_filter_clauses(filters, table=None):
+    """Construye las condiciones WHERE para los filtros normalizados.
+
+    Las condiciones usan los prefijos de los índices compuestos
+    (aerolínea/aeropuerto + year, month, day).
+    """
+    t = table if table is not None else Flight.__table__
+    clauses = []
+    for field in ('airline', 'origin_airport', 'destination_airport'):
+        codes = filters.get(field)
+        if codes:
+            column = t.c[field]
+            clauses.append(column == codes[0] if len(codes) == 1 else column.in_(codes))
+    for field in ('year', 'month', 'day', 'cancelled', 'diverted'):
+        if field in filters:
+            clauses.append(t.c[field] == filters[field])
+
+    # Rango de fechas sobre (year, month, day). Se añade además una cota sobre
+    # year para que el optimizador pueda usar el índice aunque no entienda la
+    # comparación de tuplas.
+    ymd = tuple_(t.c.year, t.c.month, t.c.day)
+    date_from = filters.get('date_from')
+    date_to = filters.get('date_to')
+    if date_from:
+        clauses.append(t.c.year >= date_from.year)
+        clauses.append(ymd >= tuple_(date_from.year, date_from.month, date_from.day))
+    if date_to:
+        clauses.append(t.c.year <= date_to.year)
+        clauses.append(ymd <= tuple_(date_to.year, date_to.month, date_to.day))
+    # Dentro de un mismo año se acota también el mes, lo que permite descartar
+    # particiones mensuales en MySQL
+    if date_from and date_to and date_from.year == date_to.year and 'month' not in filters:
+        clauses.append(t.c.month >= date_from.month)
+        clauses.append(t.c.month <= date_to.month)
+
+    if 'min_departure_delay' in filters:
+        clauses.append(t.c.departure_delay >= filters['min_departure_delay'])
+    return clauses
+
+
+def apply_flight_filters(stmt, filters, table=None):
+    clauses = flight_filter_clauses(filters, table)
+    return stmt.where(*clauses) if clauses else stmt
+
+
+def columns_for(fields, table=None):
+    t = table if table is not None else Flight.__table__
+    return [t.c[f] for f in fields]
+
+
+def serialize_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def rows_to_dicts(fields, rows):
+    return [{f: serialize_value(v) for f, v in zip(fields, row)} for row in rows]
+
+
+def explain_flight_query(session, stmt):
+    """Ejecuta EXPLAIN sobre una consulta y devuelve ``(usa_índice, líneas del plan)``.
+
+    Soporta SQLite (EXPLAIN QUERY PLAN) y MySQL (EXPLAIN). Se considera que la
+    consulta hace un recorrido completo si algún paso recorre ``flights`` sin
+    índice.
+    """
+    bind = session.get_bind()
+    dialect = bind.dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+    with bind.connect() as conn:
+        if dialect.name == 'sqlite':
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).all()
+            plan = [row[-1] for row in rows]
+            full_scan = any(
+                line.startswith('SCAN') and 'flights' in line and 'INDEX' not in line
+                for line in plan
+            )
+        else:
+            result = conn.exec_driver_sql('EXPLAIN ' + sql)
+            keys = list(result.keys())
+            rows = [dict(zip(keys, row)) for row in result]
+            plan = [f"{r.get('table')}: type={r.get('type')} key={r.get('key')} partitions={r.get('partitions')}"
+                    for r in rows]
+            full_scan = any(
+                r.get('table') == 'flights' and (r.get('type') == 'ALL' or not r.get('key'))
+                for r in rows
+            )
+    return not full_scan, plan
@@ -0,0 +1,73 @@
+# app/reference.py
+
+import math
+from sqlalchemy import Float, insert, select, update
+from app import db
+
+# Máximo de claves por IN al leer las filas existentes
+_LOOKUP_CHUNK = 1000
+
+
+def _same(column, old, new):
+    if isinstance(column.type, Float) and old is not None and new is not None:
+        # FLOAT de MySQL es de precisión simple: no se compara bit a bit
+        return math.isclose(old, new, rel_tol=1e-6, abs_tol=1e-9)
+    return old == new
+
+
+def upsert_reference_rows(model, rows):
+    """Inserta o actualiza filas ya validadas en una sola transacción.
+
+    Se leen antes las filas existentes para contar insertadas, actualizadas
+    y sin cambios, y sólo se escriben las dos primeras con un upsert según
+    el dialecto. Devuelve ``{'inserted', 'updated', 'unchanged'}``.
+    """
+    table = model.__table__
+    pk = table.primary_key.columns.values()[0]
+    columns = [c for c in table.columns if c is not pk]
+
+    codes = [row[pk.name] for row in rows]
+    existing = {}
+    for start in range(0, len(codes), _LOOKUP_CHUNK):
+        chunk = codes[start:start + _LOOKUP_CHUNK]
+        for current in db.session.execute(select(table).where(pk.in_(chunk))).mappings():
+            existing[current[pk.name]] = current
+
+    inserts, updates = [], []
+    for row in rows:
+        current = existing.get(row[pk.name])
+        if current is None:
+            inserts.append(row)
+        elif not all(_same(c, current[c.name], row[c.name]) for c in columns):
+            updates.append(row)
+
+    changed = inserts + updates
+    if changed:
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[pk.name],
+                set_={c.name: stmt.excluded[c.name] for c in columns}
+            )
+            db.session.execute(stmt, changed)
+        elif dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert as dialect_insert
+            stmt = dialect_insert(table)
+            stmt = stmt.on_duplicate_key_update({c.name: stmt.inserted[c.name] for c in columns})
+            db.session.execute(stmt, changed)
+        else:
+            # Dialecto sin upsert: INSERT de las nuevas y UPDATE de las modificadas
+            if inserts:
+                db.session.execute(insert(table), inserts)
+            for row in updates:
+                db.session.execute(
+                    update(table).where(pk == row[pk.name]).values({c.name: row[c.name] for c in columns})
+                )
+    db.session.commit()
+    return {
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'unchanged': len(rows) - len(changed),
+    }
@@ -0,0 +1,181 @@
+# app/replicas.py
+
+import itertools
+import threading
+import time
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+
+# Prefijo de las claves de SQLALCHEMY_BINDS que corresponden a réplicas (config.py)
+REPLICA_BIND_PREFIX = 'replica_'
+# Cookie con el instante (epoch) hasta el que las lecturas van al primario
+READ_PRIMARY_COOKIE = 'read_primary_until'
+# Blueprints cuyas peticiones GET/HEAD pueden atenderse desde una réplica
+READ_BLUEPRINTS = ('airlines', 'airports', 'flights')
+# Lecturas que deben ver los últimos commits: el feed de cambios lee los
+# vuelos justo después del aviso de inserción
+PRIMARY_ENDPOINTS = ('flights.flight_feed',)
+
+
+class ReplicaRouter:
+    """Reparto round-robin de lecturas entre réplicas sanas.
+
+    Las réplicas sanas se eligen sin ninguna comprobación previa. Una réplica
+    se marca caída cuando falla al conectar o pierde la conexión (evento
+    ``handle_error`` del engine) y deja de recibir lecturas; pasados
+    REPLICA_RETRY_INTERVAL segundos una sola petición la prueba con una
+    conexión del pool antes de volver a usarla. Si no queda ninguna sana se
+    lee del primario.
+    """
+
+    def __init__(self, app, engines, retry_interval):
+        self.app = app
+        self.engines = engines
+        self.retry_interval = retry_interval
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # clave -> instante (monotonic) a partir del cual se reintenta
+        self._down = {}
+        for key, engine in engines.items():
+            event.listen(engine, 'handle_error', self._on_error(key))
+
+    def _on_error(self, key):
+        def handle_error(context):
+            if context.is_disconnect or context.connection is None:
+                self.mark_down(key)
+        return handle_error
+
+    def mark_down(self, key):
+        with self._lock:
+            if key not in self._down:
+                self.app.logger.warning(f'Réplica {key} fuera de servicio')
+            self._down[key] = time.monotonic() + self.retry_interval
+
+    def check(self, key):
+        """Comprueba la réplica con una conexión del pool (pre_ping si está activo)."""
+        try:
+            with self.engines[key].connect():
+                pass
+        except SQLAlchemyError:
+            self.mark_down(key)
+            return False
+        with self._lock:
+            if self._down.pop(key, None) is not None:
+                self.app.logger.info(f'Réplica {key} recuperada')
+        return True
+
+    def choose(self):
+        """Engine de la siguiente réplica sana o ``None`` si no hay ninguna."""
+        keys = list(self.engines)
+        start = next(self._counter)
+        now = time.monotonic()
+        for i in range(len(keys)):
+            key = keys[(start + i) % len(keys)]
+            retry_at = self._down.get(key)
+            if retry_at is None:
+                return self.engines[key]
+            if now >= retry_at and self._claim_retry(key, now) and self.check(key):
+                return self.engines[key]
+        return None
+
+    def _claim_retry(self, key, now):
+        """Aplaza el siguiente reintento para que sólo esta petición pruebe la réplica."""
+        with self._lock:
+            retry_at = self._down.get(key)
+            if retry_at is None or now < retry_at:
+                return False
+            self._down[key] = now + self.retry_interval
+            return True
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            key: 'up' if self._down.get(key) is None else f'down (reintento en {max(0.0, self._down[key] - now):.0f}s)'
+            for key in self.engines
+        }
+
+
+def get_router():
+    return current_app.extensions.get('replica_router')
+
+
+def use_replica():
+    """Marca el contexto de aplicación actual como de sólo lectura.
+
+    Las consultas siguientes de ``db.session`` irán a una réplica (elegida en
+    la primera consulta) mientras la sesión no escriba.
+    """
+    if get_router() is not None:
+        g.db_read_replica = True
+
+
+def in_write_window():
+    """Indica si la petición está en la ventana read-your-writes de su cliente."""
+    return has_app_context() and g.get('db_read_primary', False)
+
+
+def read_engine():
+    """Engine de réplica para la consulta actual o ``None`` para el primario."""
+    if not has_app_context() or not g.get('db_read_replica'):
+        return None
+    if 'db_read_engine' not in g:
+        g.db_read_engine = get_router().choose()
+    return g.db_read_engine
+
+
+class RoutingSession(Session):
+    """Sesión que envía las lecturas a una réplica cuando el contexto lo permite.
+
+    Las escrituras (flush y sentencias DML) van siempre al primario y, desde
+    la primera, también el resto de consultas de la sesión, para que lean lo
+    que se acaba de escribir.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._wrote:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self._wrote = True
+            else:
+                engine = read_engine()
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def init_replicas(app, db):
+    """Activa el enrutado de lecturas si hay réplicas en SQLALCHEMY_BINDS."""
+    with app.app_context():
+        engines = {key: engine for key, engine in db.engines.items()
+                   if key is not None and key.startswith(REPLICA_BIND_PREFIX)}
+    if not engines:
+        return
+    app.extensions['replica_router'] = ReplicaRouter(app, engines, app.config['REPLICA_RETRY_INTERVAL'])
+    window = app.config['READ_YOUR_WRITES_SECONDS']
+
+    @app.before_request
+    def route_reads():
+        if (request.method not in ('GET', 'HEAD') or request.blueprint not in READ_BLUEPRINTS
+                or request.endpoint in PRIMARY_ENDPOINTS):
+            return
+        # Ventana read-your-writes: el cliente acaba de escribir y lee del primario
+        try:
+            if float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time():
+                g.db_read_primary = True
+                return
+        except ValueError:
+            pass
+        use_replica()
+
+    if window:
+        @app.after_request
+        def remember_write(response):
+            if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+                response.set_cookie(READ_PRIMARY_COOKIE, f'{time.time() + window:.3f}',
+                                    max_age=window, httponly=True, samesite='Lax')
+            return response
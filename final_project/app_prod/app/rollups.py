@@ -0,0 +1,183 @@
+# app/rollups.py
+
+from sqlalchemy import case, delete, func, insert, select, update
+from app import db
+from app.models import AirlineDailyStats, OriginDailyStats
+from app.partitions import archived_months, flight_source, in_months
+
+# Tablas de agregados: (tabla, columna de la dimensión)
+ROLLUPS = [
+    (AirlineDailyStats.__table__, 'airline'),
+    (OriginDailyStats.__table__, 'origin_airport'),
+]
+
+# Columnas de retraso por causa que se suman tal cual
+CAUSE_DELAYS = ['air_system_delay', 'security_delay', 'airline_delay',
+                'late_aircraft_delay', 'weather_delay']
+
+MEASURES = ['flights', 'cancelled_flights', 'diverted_flights', 'departure_delay_total',
+            'arrival_delay_total', 'arrival_delay_count'] + [f'{c}_total' for c in CAUSE_DELAYS]
+
+
+def _measures(row):
+    arrival_delay = row.get('arrival_delay')
+    values = [
+        1,
+        1 if row.get('cancelled') else 0,
+        1 if row.get('diverted') else 0,
+        row.get('departure_delay') or 0,
+        arrival_delay or 0,
+        0 if arrival_delay is None else 1,
+    ]
+    values.extend(row.get(c) or 0 for c in CAUSE_DELAYS)
+    return values
+
+
+def _accumulate(rows, dimensions):
+    """Agrupa las filas de un lote por (dimensión, year, month, day) con NumPy.
+
+    Las medidas de cada fila se calculan una sola vez para todas las
+    dimensiones. Devuelve ``{dimensión: {clave: [medidas]}}``.
+    """
+    import numpy as np
+    measures = np.array([_measures(row) for row in rows], dtype=np.int64)
+    dates = np.array([(row['year'], row['month'], row['day']) for row in rows], dtype=np.int64)
+    date_keys = (dates[:, 0] * 13 + dates[:, 1]) * 32 + dates[:, 2]
+    span = int(date_keys.max()) + 1
+    result = {}
+    for dimension in dimensions:
+        codes, code_ids = np.unique(np.array([row[dimension] for row in rows], dtype=str), return_inverse=True)
+        keys, inverse = np.unique(code_ids.reshape(-1) * span + date_keys, return_inverse=True)
+        sums = np.zeros((len(keys), measures.shape[1]), dtype=np.int64)
+        np.add.at(sums, inverse.reshape(-1), measures)
+        groups = {}
+        for key, values in zip(keys.tolist(), sums.tolist()):
+            date_key = key % span
+            groups[(str(codes[key // span]), date_key // 32 // 13, date_key // 32 % 13, date_key % 32)] = values
+        result[dimension] = groups
+    return result
+
+
+def _upsert_increment(table, dimension, groups):
+    """Suma los deltas a las filas existentes o las crea (upsert según el dialecto)."""
+    keys = [dimension, 'year', 'month', 'day']
+    params = [dict(zip(keys, key), **dict(zip(MEASURES, values))) for key, values in groups.items()]
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={m: table.c[m] + stmt.excluded[m] for m in MEASURES}
+        )
+    elif dialect in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_duplicate_key_update({m: table.c[m] + stmt.inserted[m] for m in MEASURES})
+    else:
+        # Dialecto sin upsert: UPDATE y, si no existe la fila, INSERT
+        for p in params:
+            where = [table.c[k] == p[k] for k in keys]
+            result = db.session.execute(
+                update(table).where(*where).values({m: table.c[m] + p[m] for m in MEASURES})
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(table), [p])
+        return
+    db.session.execute(stmt, params)
+
+
+def apply_flights(rows):
+    """Actualiza los agregados y los sketches con vuelos recién insertados.
+
+    Debe llamarse dentro de la misma transacción que el INSERT de los vuelos
+    para que los agregados no se desincronicen si ésta se revierte.
+    """
+    if not rows:
+        return
+    groups = _accumulate(rows, [dimension for _, dimension in ROLLUPS])
+    for table, dimension in ROLLUPS:
+        _upsert_increment(table, dimension, groups[dimension])
+    # Sketches de percentiles (numpy se importa bajo demanda)
+    from app.sketches import apply_sketches
+    apply_sketches(rows)
+
+
+def measure_columns(f):
+    """Expresiones SQL de MEASURES sobre una tabla (u origen) de vuelos."""
+    return [
+        func.count(),
+        func.sum(case((f.c.cancelled, 1), else_=0)),
+        func.sum(case((f.c.diverted, 1), else_=0)),
+        func.coalesce(func.sum(f.c.departure_delay), 0),
+        func.coalesce(func.sum(f.c.arrival_delay), 0),
+        func.count(f.c.arrival_delay),
+    ] + [func.coalesce(func.sum(f.c[c]), 0) for c in CAUSE_DELAYS]
+
+
+def rebuild_rollups():
+    """Recalcula los agregados desde la tabla flights (backfill).
+
+    Los meses archivados ya no están en flights: sus agregados se conservan
+    tal cual en lugar de recalcularse.
+    """
+    f = flight_source()
+    aggregates = measure_columns(f)
+    archived = archived_months()
+    for table, dimension in ROLLUPS:
+        stmt = delete(table)
+        if archived:
+            stmt = stmt.where(~in_months(table, archived))
+        db.session.execute(stmt)
+        group = [f.c[dimension], f.c.year, f.c.month, f.c.day]
+        source = select(*group, *aggregates).group_by(*group)
+        if archived:
+            source = source.where(~in_months(f, archived))
+        db.session.execute(
+            insert(table).from_select([dimension, 'year', 'month', 'day'] + MEASURES, source)
+        )
+    db.session.commit()
+
+
+def delete_month_rollups(year, month):
+    """Borra los agregados de un mes (tras eliminar sus vuelos)."""
+    for table, _ in ROLLUPS:
+        db.session.execute(delete(table).where(table.c.year == year, table.c.month == month))
+    db.session.commit()
+
+
+def query_stats(table, group_by, clauses):
+    """Agrega las filas diarias de una tabla de agregados.
+
+    ``group_by`` es la lista de columnas de la tabla por las que agrupar.
+    """
+    group = [table.c[c] for c in group_by]
+    sums = [func.sum(table.c[m]).label(m) for m in MEASURES]
+    stmt = select(*group, *sums).where(*clauses).group_by(*group).order_by(*group)
+    result = []
+    for row in db.session.execute(stmt):
+        data = row._asdict()
+        # MySQL devuelve Decimal en los SUM
+        totals = {m: int(data[m] or 0) for m in MEASURES}
+        result.append(stats_item({c: data[c] for c in group_by}, totals))
+    return result
+
+
+def stats_item(item, totals):
+    """Completa ``item`` (valores de agrupación) con las medidas derivadas de ``totals``."""
+    flights = totals['flights']
+    arrival_count = totals['arrival_delay_count']
+    item.update({
+        'flights': flights,
+        'cancelled_flights': totals['cancelled_flights'],
+        'diverted_flights': totals['diverted_flights'],
+        'cancellation_rate': totals['cancelled_flights'] / flights if flights else None,
+        'total_departure_delay': totals['departure_delay_total'],
+        'avg_departure_delay': totals['departure_delay_total'] / flights if flights else None,
+        'total_arrival_delay': totals['arrival_delay_total'],
+        'avg_arrival_delay': totals['arrival_delay_total'] / arrival_count if arrival_count else None,
+    })
+    for c in CAUSE_DELAYS:
+        item[f'total_{c}'] = totals[f'{c}_total']
+    return item
@@ -1,19 +1,49 @@
 # app/routes/airlines.py
 
-from flask import Blueprint, request, jsonify, Response
-from flasgger import swag_from
+from flask import Blueprint, request, jsonify, current_app
+from app.docs import swag_from
 from app import db
+from app.cache import cached_response, reference_cache
+from app.dimensions import invalidate_dimensions
+from app.encoding import row_batches, stream_json_response, wants_ndjson
 from app.models import Airline
+from app.reference import upsert_reference_rows
+from app.schemas import AIRLINE_SCHEMA, KnownCodes, ValidationError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 import csv
 import io
 
 airlines_bp = Blueprint('airlines', __name__)
 
+
+def _airlines_json():
+    airlines = Airline.query.all()
+    return current_app.json.dumps([{'iata_code': a.iata_code, 'airline': a.airline} for a in airlines])
+
+
+def _airlines_csv():
+    # Consultar todas las aerolíneas
+    airlines = Airline.query.all()
+
+    # Crear un objeto StringIO para escribir el CSV en memoria
+    si = io.StringIO()
+    cw = csv.writer(si)
+
+    # Escribir la cabecera del CSV
+    cw.writerow(['IATA Code', 'Airline'])
+
+    # Escribir los datos de aerolíneas
+    for airline in airlines:
+        cw.writerow([airline.iata_code, airline.airline])
+
+    return si.getvalue()
+
 @airlines_bp.route('', methods=['GET', 'POST'])
 @swag_from({
     'responses': {
         200: {
-            'description': 'Lista de aerolíneas',
+            'description': 'Lista de aerolíneas (con ETag; se admite If-None-Match). Con Accept: application/x-ndjson se devuelve NDJSON en streaming',
             'schema': {
                 'type': 'array',
                 'items': {
@@ -25,6 +55,9 @@ airlines_bp = Blueprint('airlines', __name__)
                 }
             }
         },
+        304: {
+            'description': 'La lista no ha cambiado desde el ETag indicado'
+        },
         201: {
             'description': 'Aerolínea agregada exitosamente',
             'schema': {
@@ -35,7 +68,10 @@ airlines_bp = Blueprint('airlines', __name__)
             }
         },
         400: {
-            'description': 'Datos incompletos o inválidos'
+            'description': 'Datos incompletos o inválidos (con la lista de errores por campo)'
+        },
+        409: {
+            'description': 'La aerolínea ya existe'
         },
         500: {
             'description': 'Error interno del servidor'
@@ -59,23 +95,96 @@ airlines_bp = Blueprint('airlines', __name__)
 })
 def handle_airlines():
     if request.method == 'POST':
-        data = request.get_json()
-        if not data or 'iata_code' not in data or 'airline' not in data:
-            return jsonify({'error': 'Datos incompletos o inválidos'}), 400
         try:
-            airline = Airline(
-                iata_code=data['iata_code'],
-                airline=data['airline']
-            )
-            db.session.add(airline)
+            row = AIRLINE_SCHEMA.validate(request.get_json(silent=True))
+        except ValidationError as e:
+            return jsonify({'error': 'Datos incompletos o inválidos', 'errors': e.errors}), 400
+        if KnownCodes().contains('airlines', row['iata_code']):
+            return jsonify({'error': f"La aerolínea {row['iata_code']} ya existe"}), 409
+        try:
+            db.session.add(Airline(**row))
             db.session.commit()
+            reference_cache.invalidate('airlines')
+            invalidate_dimensions()
             return jsonify({'message': 'Airline added successfully'}), 201
+        except IntegrityError:
+            # Creado por otro worker después de la última recarga de dimensiones
+            db.session.rollback()
+            return jsonify({'error': f"La aerolínea {row['iata_code']} ya existe"}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
     else:
-        airlines = Airline.query.all()
-        return jsonify([{'iata_code': a.iata_code, 'airline': a.airline} for a in airlines])
+        if wants_ndjson():
+            # NDJSON en streaming directamente desde la consulta por lotes
+            stmt = select(Airline.__table__).order_by(Airline.iata_code)
+            return stream_json_response(row_batches(stmt, current_app.config['JSON_STREAM_BATCH_SIZE']), ndjson=True)
+        return cached_response('airlines:json', _airlines_json, 'application/json')
+
+@airlines_bp.route('/bulk', methods=['POST'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Resultado del upsert (una sola transacción)',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'inserted': {'type': 'integer'},
+                    'updated': {'type': 'integer'},
+                    'unchanged': {'type': 'integer'}
+                }
+            }
+        },
+        400: {
+            'description': 'Alguna fila es inválida; no se aplica ninguna'
+        },
+        413: {
+            'description': 'Demasiadas filas en una sola petición'
+        },
+        500: {
+            'description': 'Error interno del servidor'
+        }
+    },
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'description': 'Lista completa o parcial del catálogo; las filas existentes (por iata_code) se actualizan',
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'iata_code': {'type': 'string'},
+                        'airline': {'type': 'string'}
+                    }
+                }
+            }
+        }
+    ],
+    'tags': ['Aerolíneas']
+})
+def bulk_airlines():
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return jsonify({'error': 'Se esperaba una lista de objetos JSON'}), 400
+    if len(data) > current_app.config['REFERENCE_BULK_MAX_ROWS']:
+        return jsonify({'error': f"Como máximo {current_app.config['REFERENCE_BULK_MAX_ROWS']} filas por petición"}), 413
+    # Se valida todo antes de escribir nada
+    rows, errors = AIRLINE_SCHEMA.validate_many(data, unique=True)
+    if errors:
+        return jsonify({'error': 'Datos inválidos', 'errors': errors}), 400
+    try:
+        result = upsert_reference_rows(Airline, rows)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en la carga masiva de aerolíneas: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    if result['inserted'] or result['updated']:
+        reference_cache.invalidate('airlines')
+        invalidate_dimensions()
+    return jsonify(result), 200
 
 @airlines_bp.route('/download', methods=['GET'])
 @swag_from({
@@ -91,6 +200,9 @@ def handle_airlines():
                 }
             }
         },
+        304: {
+            'description': 'El CSV no ha cambiado desde el ETag indicado'
+        },
         500: {
             'description': 'Error interno del servidor'
         }
@@ -99,28 +211,8 @@ def handle_airlines():
 })
 def download_airlines():
     try:
-        # Consultar todas las aerolíneas
-        airlines = Airline.query.all()
-
-        # Crear un objeto StringIO para escribir el CSV en memoria
-        si = io.StringIO()
-        cw = csv.writer(si)
-
-        # Escribir la cabecera del CSV
-        cw.writerow(['IATA Code', 'Airline'])
-
-        # Escribir los datos de aerolíneas
-        for airline in airlines:
-            cw.writerow([airline.iata_code, airline.airline])
-
-        # Obtener el contenido del CSV
-        output = si.getvalue()
-        si.close()
-
-        # Crear una respuesta con el contenido del CSV
-        return Response(
-            output,
-            mimetype='text/csv',
+        return cached_response(
+            'airlines:csv', _airlines_csv, 'text/csv',
             headers={'Content-Disposition': 'attachment;filename=airlines.csv'}
         )
     except Exception as e:
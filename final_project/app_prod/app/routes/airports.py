@@ -1,19 +1,67 @@
 # app/routes/airports.py
 
-from flask import Blueprint, request, jsonify, Response
-from flasgger import swag_from
+from flask import Blueprint, request, jsonify, current_app
+from app.docs import swag_from
 from app import db
+from app.cache import cached_response, reference_cache
+from app.dimensions import invalidate_dimensions
+from app.encoding import row_batches, stream_json_response, wants_ndjson
 from app.models import Airport
+from app.reference import upsert_reference_rows
+from app.schemas import AIRPORT_SCHEMA, KnownCodes, ValidationError
+from app.queries import QueryError, parse_int
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 import csv
 import io
+import math
 
 airports_bp = Blueprint('airports', __name__)
 
+
+def _airports_json():
+    airports = Airport.query.all()
+    return current_app.json.dumps([{
+        'iata_code': a.iata_code,
+        'airport': a.airport,
+        'city': a.city,
+        'state': a.state,
+        'country': a.country,
+        'latitude': a.latitude,
+        'longitude': a.longitude
+    } for a in airports])
+
+
+def _airports_csv():
+    # Consultar todos los aeropuertos
+    airports = Airport.query.all()
+
+    # Crear un objeto StringIO para escribir el CSV en memoria
+    si = io.StringIO()
+    cw = csv.writer(si)
+
+    # Escribir la cabecera del CSV
+    cw.writerow(['IATA Code', 'Airport', 'City', 'State', 'Country', 'Latitude', 'Longitude'])
+
+    # Escribir los datos de aeropuertos
+    for airport in airports:
+        cw.writerow([
+            airport.iata_code,
+            airport.airport,
+            airport.city,
+            airport.state if airport.state else '',
+            airport.country,
+            airport.latitude,
+            airport.longitude
+        ])
+
+    return si.getvalue()
+
 @airports_bp.route('', methods=['GET', 'POST'])
 @swag_from({
     'responses': {
         200: {
-            'description': 'Lista de aeropuertos',
+            'description': 'Lista de aeropuertos (con ETag; se admite If-None-Match). Con Accept: application/x-ndjson se devuelve NDJSON en streaming',
             'schema': {
                 'type': 'array',
                 'items': {
@@ -30,6 +78,9 @@ airports_bp = Blueprint('airports', __name__)
                 }
             }
         },
+        304: {
+            'description': 'La lista no ha cambiado desde el ETag indicado'
+        },
         201: {
             'description': 'Aeropuerto agregado exitosamente',
             'schema': {
@@ -40,7 +91,10 @@ airports_bp = Blueprint('airports', __name__)
             }
         },
         400: {
-            'description': 'Datos incompletos o inválidos'
+            'description': 'Datos incompletos o inválidos (con la lista de errores por campo)'
+        },
+        409: {
+            'description': 'El aeropuerto ya existe'
         },
         500: {
             'description': 'Error interno del servidor'
@@ -69,36 +123,106 @@ airports_bp = Blueprint('airports', __name__)
 })
 def handle_airports():
     if request.method == 'POST':
-        data = request.get_json()
-        if not data or 'iata_code' not in data or 'airport' not in data or 'city' not in data:
-            return jsonify({'error': 'Datos incompletos o inválidos'}), 400
         try:
-            airport = Airport(
-                iata_code=data['iata_code'],
-                airport=data['airport'],
-                city=data['city'],
-                state=data.get('state'),
-                country=data['country'],
-                latitude=data['latitude'],
-                longitude=data['longitude']
-            )
-            db.session.add(airport)
+            row = AIRPORT_SCHEMA.validate(request.get_json(silent=True))
+        except ValidationError as e:
+            return jsonify({'error': 'Datos incompletos o inválidos', 'errors': e.errors}), 400
+        if KnownCodes().contains('airports', row['iata_code']):
+            return jsonify({'error': f"El aeropuerto {row['iata_code']} ya existe"}), 409
+        try:
+            db.session.add(Airport(**row))
             db.session.commit()
+            reference_cache.invalidate('airports')
+            invalidate_dimensions()
+            # El índice espacial se reconstruye en la siguiente consulta
+            from app.spatial import invalidate_airport_index
+            invalidate_airport_index()
             return jsonify({'message': 'Airport added successfully'}), 201
+        except IntegrityError:
+            # Creado por otro worker después de la última recarga de dimensiones
+            db.session.rollback()
+            return jsonify({'error': f"El aeropuerto {row['iata_code']} ya existe"}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
     else:
-        airports = Airport.query.all()
-        return jsonify([{
-            'iata_code': a.iata_code,
-            'airport': a.airport,
-            'city': a.city,
-            'state': a.state,
-            'country': a.country,
-            'latitude': a.latitude,
-            'longitude': a.longitude
-        } for a in airports])
+        if wants_ndjson():
+            # NDJSON en streaming directamente desde la consulta por lotes
+            stmt = select(Airport.__table__).order_by(Airport.iata_code)
+            return stream_json_response(row_batches(stmt, current_app.config['JSON_STREAM_BATCH_SIZE']), ndjson=True)
+        return cached_response('airports:json', _airports_json, 'application/json')
+
+@airports_bp.route('/bulk', methods=['POST'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Resultado del upsert (una sola transacción)',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'inserted': {'type': 'integer'},
+                    'updated': {'type': 'integer'},
+                    'unchanged': {'type': 'integer'}
+                }
+            }
+        },
+        400: {
+            'description': 'Alguna fila es inválida; no se aplica ninguna'
+        },
+        413: {
+            'description': 'Demasiadas filas en una sola petición'
+        },
+        500: {
+            'description': 'Error interno del servidor'
+        }
+    },
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'description': 'Lista completa o parcial del catálogo; las filas existentes (por iata_code) se actualizan',
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'iata_code': {'type': 'string'},
+                        'airport': {'type': 'string'},
+                        'city': {'type': 'string'},
+                        'state': {'type': 'string'},
+                        'country': {'type': 'string'},
+                        'latitude': {'type': 'number'},
+                        'longitude': {'type': 'number'}
+                    }
+                }
+            }
+        }
+    ],
+    'tags': ['Aeropuertos']
+})
+def bulk_airports():
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return jsonify({'error': 'Se esperaba una lista de objetos JSON'}), 400
+    if len(data) > current_app.config['REFERENCE_BULK_MAX_ROWS']:
+        return jsonify({'error': f"Como máximo {current_app.config['REFERENCE_BULK_MAX_ROWS']} filas por petición"}), 413
+    # Se valida todo antes de escribir nada
+    rows, errors = AIRPORT_SCHEMA.validate_many(data, unique=True)
+    if errors:
+        return jsonify({'error': 'Datos inválidos', 'errors': errors}), 400
+    try:
+        result = upsert_reference_rows(Airport, rows)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en la carga masiva de aeropuertos: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    if result['inserted'] or result['updated']:
+        reference_cache.invalidate('airports')
+        invalidate_dimensions()
+        from app.spatial import invalidate_airport_index
+        invalidate_airport_index()
+    return jsonify(result), 200
 
 @airports_bp.route('/download', methods=['GET'])
 @swag_from({
@@ -114,6 +238,9 @@ def handle_airports():
                 }
             }
         },
+        304: {
+            'description': 'El CSV no ha cambiado desde el ETag indicado'
+        },
         500: {
             'description': 'Error interno del servidor'
         }
@@ -122,37 +249,97 @@ def handle_airports():
 })
 def download_airports():
     try:
-        # Consultar todos los aeropuertos
-        airports = Airport.query.all()
-
-        # Crear un objeto StringIO para escribir el CSV en memoria
-        si = io.StringIO()
-        cw = csv.writer(si)
-
-        # Escribir la cabecera del CSV
-        cw.writerow(['IATA Code', 'Airport', 'City', 'State', 'Country', 'Latitude', 'Longitude'])
-
-        # Escribir los datos de aeropuertos
-        for airport in airports:
-            cw.writerow([
-                airport.iata_code,
-                airport.airport,
-                airport.city,
-                airport.state if airport.state else '',
-                airport.country,
-                airport.latitude,
-                airport.longitude
-            ])
-
-        # Obtener el contenido del CSV
-        output = si.getvalue()
-        si.close()
-
-        # Crear una respuesta con el contenido del CSV
-        return Response(
-            output,
-            mimetype='text/csv',
+        return cached_response(
+            'airports:csv', _airports_csv, 'text/csv',
             headers={'Content-Disposition': 'attachment;filename=airports.csv'}
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+AIRPORT_DISTANCE_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'iata_code': {'type': 'string'},
+            'airport': {'type': 'string'},
+            'city': {'type': 'string'},
+            'state': {'type': 'string'},
+            'country': {'type': 'string'},
+            'latitude': {'type': 'number'},
+            'longitude': {'type': 'number'},
+            'distance_km': {'type': 'number'}
+        }
+    }
+}
+
+
+def _parse_point(args):
+    try:
+        lat = float(args['lat'])
+        lon = float(args['lon'])
+    except (KeyError, TypeError, ValueError):
+        raise QueryError("Los parámetros 'lat' y 'lon' son obligatorios y numéricos")
+    if not -90.0 <= lat <= 90.0 or not -180.0 <= lon <= 180.0:
+        raise QueryError("Coordenadas fuera de rango")
+    return lat, lon
+
+
+def _with_distance(matches):
+    return [dict(airport, distance_km=round(distance, 3)) for airport, distance in matches]
+
+
+@airports_bp.route('/nearby', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Aeropuertos dentro del radio, ordenados por distancia', 'schema': AIRPORT_DISTANCE_SCHEMA},
+        400: {'description': 'Parámetros inválidos'}
+    },
+    'parameters': [
+        {'name': 'lat', 'in': 'query', 'type': 'number', 'required': True},
+        {'name': 'lon', 'in': 'query', 'type': 'number', 'required': True},
+        {'name': 'radius_km', 'in': 'query', 'type': 'number', 'required': True},
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False}
+    ],
+    'tags': ['Aeropuertos']
+})
+def nearby_airports():
+    # numpy se importa bajo demanda para no alargar el arranque
+    from app.spatial import get_airport_index
+    try:
+        lat, lon = _parse_point(request.args)
+        try:
+            radius_km = float(request.args['radius_km'])
+        except (KeyError, ValueError):
+            raise QueryError("El parámetro 'radius_km' es obligatorio y numérico")
+        # nan e inf pasan float() pero no tienen sentido como radio
+        if not math.isfinite(radius_km) or radius_km < 0:
+            raise QueryError("El parámetro 'radius_km' debe ser un número finito >= 0")
+        limit = parse_int(request.args, 'limit', minimum=1)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(_with_distance(get_airport_index().within(lat, lon, radius_km, limit)))
+
+
+@airports_bp.route('/nearest', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Los k aeropuertos más cercanos, ordenados por distancia', 'schema': AIRPORT_DISTANCE_SCHEMA},
+        400: {'description': 'Parámetros inválidos'}
+    },
+    'parameters': [
+        {'name': 'lat', 'in': 'query', 'type': 'number', 'required': True},
+        {'name': 'lon', 'in': 'query', 'type': 'number', 'required': True},
+        {'name': 'k', 'in': 'query', 'type': 'integer', 'required': False, 'description': 'Por defecto 5'}
+    ],
+    'tags': ['Aeropuertos']
+})
+def nearest_airports():
+    from app.spatial import get_airport_index
+    try:
+        lat, lon = _parse_point(request.args)
+        k = parse_int(request.args, 'k', default=5, minimum=1, maximum=1000)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(_with_distance(get_airport_index().nearest(lat, lon, k)))
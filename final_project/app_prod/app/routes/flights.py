@@ -1,40 +1,89 @@
 # app/routes/flights.py
 
-from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
-from flasgger import swag_from
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context, send_file, url_for
+from app.docs import swag_from
 from app import db
-from app.models import Flight
-import csv
-import io
+from app.dimensions import enrich_flights
+from app.encoding import stream_json_response, wants_ndjson
+from app.feed import get_flight_feed, notify_new_flights, poll_delta, sse_events
+from app.flight_cache import get_flight_cache, invalidate_flight_cache
+from app.models import AirlineDailyStats, OriginDailyStats
+from app.export import (
+    EXPORT_FORMATS, columnar_available, columnar_chunks, csv_chunks, gzip_chunks, iter_flight_batches
+)
+from app.ingest import ingest_flights, iter_csv, iter_ndjson
+from app.jobs import ExportQueueFull, get_export_jobs
+from app.partitions import insert_flights, page_statement, parse_month
+from app.rollups import apply_flights, query_stats
+from app.schemas import FLIGHT_SCHEMA, KnownCodes
+from app.queries import (
+    FLIGHT_FIELDS, QueryError, parse_bool, parse_fields, parse_int, parse_page,
+    parse_flight_filters, flight_filter_clauses, rows_to_dicts
+)
+import os
 
 flights_bp = Blueprint('flights', __name__)
 
 
+# Parámetros de filtro comunes a la lista y a la descarga de vuelos
+FLIGHT_FILTER_PARAMETERS = [
+    {'name': 'airline', 'in': 'query', 'type': 'string', 'required': False,
+     'description': 'Código IATA de la aerolínea (se admiten varios separados por comas)'},
+    {'name': 'origin_airport', 'in': 'query', 'type': 'string', 'required': False,
+     'description': 'Código IATA del aeropuerto de origen (se admiten varios separados por comas)'},
+    {'name': 'destination_airport', 'in': 'query', 'type': 'string', 'required': False,
+     'description': 'Código IATA del aeropuerto de destino (se admiten varios separados por comas)'},
+    {'name': 'year', 'in': 'query', 'type': 'integer', 'required': False},
+    {'name': 'month', 'in': 'query', 'type': 'integer', 'required': False},
+    {'name': 'day', 'in': 'query', 'type': 'integer', 'required': False},
+    {'name': 'date_from', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False,
+     'description': 'Fecha inicial inclusiva (YYYY-MM-DD)'},
+    {'name': 'date_to', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False,
+     'description': 'Fecha final inclusiva (YYYY-MM-DD)'},
+    {'name': 'cancelled', 'in': 'query', 'type': 'boolean', 'required': False},
+    {'name': 'diverted', 'in': 'query', 'type': 'boolean', 'required': False},
+    {'name': 'min_departure_delay', 'in': 'query', 'type': 'integer', 'required': False,
+     'description': 'Retraso mínimo de salida en minutos'},
+]
+
+
 @flights_bp.route('', methods=['GET', 'POST'])
 @swag_from({
     'responses': {
         200: {
-            'description': 'Lista de vuelos',
+            'description': 'Página de vuelos (paginación por cursor sobre el id)',
             'schema': {
-                'type': 'array',
-                'items': {
-                    'type': 'object',
-                    'properties': {
-                        'id': {'type': 'integer'},
-                        'year': {'type': 'integer'},
-                        'month': {'type': 'integer'},
-                        'day': {'type': 'integer'},
-                        'day_of_week': {'type': 'integer'},
-                        'airline': {'type': 'string'},
-                        'flight_number': {'type': 'string'},
-                        'tail_number': {'type': 'string'},
-                        'origin_airport': {'type': 'string'},
-                        'destination_airport': {'type': 'string'},
-                        'scheduled_departure': {'type': 'integer'},
-                        'departure_time': {'type': 'integer'},
-                        'departure_delay': {'type': 'integer'},
-                        # Agregar otros campos según sea necesario
-                    }
+                'type': 'object',
+                'properties': {
+                    'flights': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'id': {'type': 'integer'},
+                                'year': {'type': 'integer'},
+                                'month': {'type': 'integer'},
+                                'day': {'type': 'integer'},
+                                'day_of_week': {'type': 'integer'},
+                                'airline': {'type': 'string'},
+                                'flight_number': {'type': 'string'},
+                                'tail_number': {'type': 'string'},
+                                'origin_airport': {'type': 'string'},
+                                'destination_airport': {'type': 'string'},
+                                'scheduled_departure': {'type': 'integer'},
+                                'departure_time': {'type': 'integer'},
+                                'departure_delay': {'type': 'integer'},
+                                # Agregar otros campos según sea necesario
+                                'airline_name': {'type': 'string', 'description': 'Sólo con enrich=true'},
+                                'origin_airport_name': {'type': 'string', 'description': 'Sólo con enrich=true'},
+                                'origin_city': {'type': 'string', 'description': 'Sólo con enrich=true'},
+                                'destination_airport_name': {'type': 'string', 'description': 'Sólo con enrich=true'},
+                                'destination_city': {'type': 'string', 'description': 'Sólo con enrich=true'}
+                            }
+                        }
+                    },
+                    'next_cursor': {'type': 'integer', 'description': 'Valor para el parámetro after de la siguiente página (null si no hay más)'},
+                    'limit': {'type': 'integer'}
                 }
             }
         },
@@ -55,10 +104,49 @@ flights_bp = Blueprint('flights', __name__)
         }
     },
     'parameters': [
+        {
+            'name': 'limit',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Número máximo de vuelos por página'
+        },
+        {
+            'name': 'after',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Cursor: devolver vuelos con id mayor que este valor'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Lista de columnas separadas por comas (el id siempre se incluye)'
+        },
+        {
+            'name': 'enrich',
+            'in': 'query',
+            'type': 'boolean',
+            'required': False,
+            'description': ('Añadir el nombre de la aerolínea y el nombre y la ciudad de los aeropuertos '
+                            'de origen y destino (si esas columnas están en fields)')
+        },
+        {
+            'name': 'stream',
+            'in': 'query',
+            'type': 'boolean',
+            'required': False,
+            'description': ('Devolver todos los vuelos filtrados como un array JSON en streaming, sin paginar '
+                            '(se ignoran limit y after). Con Accept: application/x-ndjson se devuelve NDJSON')
+        },
+        *FLIGHT_FILTER_PARAMETERS,
         {
             'name': 'body',
             'in': 'body',
             'required': False,
+            'description': 'Un vuelo, o una lista de vuelos que se insertan en una sola transacción',
             'schema': {
                 'type': 'object',
                 'properties': {
@@ -83,160 +171,817 @@ flights_bp = Blueprint('flights', __name__)
 })
 def handle_flights():
     if request.method == 'POST':
-        data = request.get_json()
-        # Validar los campos requeridos
-        required_fields = ['year', 'month', 'day', 'day_of_week', 'airline', 'flight_number',
-                           'origin_airport', 'destination_airport', 'scheduled_departure',
-                           'departure_time', 'departure_delay']
-        if not data or not all(field in data for field in required_fields):
+        data = request.get_json(silent=True)
+        # Se admite un vuelo o una lista de vuelos; todo se valida (tipos,
+        # rangos y códigos de aerolínea/aeropuerto en memoria) antes de escribir
+        records = data if isinstance(data, list) else [data]
+        if not records:
             return jsonify({'error': 'Datos incompletos o inválidos'}), 400
+        if len(records) > current_app.config['FLIGHTS_BULK_MAX_BATCH_SIZE']:
+            return jsonify({'error': 'Demasiados vuelos en una sola petición (usar /api/flights/bulk)'}), 413
+        rows, errors = FLIGHT_SCHEMA.validate_many(records, KnownCodes())
+        if errors:
+            if not isinstance(data, list):
+                return jsonify({'error': 'Datos incompletos o inválidos', 'errors': errors[0]['errors']}), 400
+            return jsonify({'error': 'Datos incompletos o inválidos', 'errors': errors}), 400
         try:
-            flight = Flight(
-                year=data['year'],
-                month=data['month'],
-                day=data['day'],
-                day_of_week=data['day_of_week'],
-                airline=data['airline'],
-                flight_number=data['flight_number'],
-                tail_number=data.get('tail_number'),
-                origin_airport=data['origin_airport'],
-                destination_airport=data['destination_airport'],
-                scheduled_departure=data['scheduled_departure'],
-                departure_time=data['departure_time'],
-                departure_delay=data['departure_delay'],
-                taxi_out=data.get('taxi_out'),
-                wheels_off=datetime.fromisoformat(data['wheels_off']) if data.get('wheels_off') else None,
-                scheduled_time=data.get('scheduled_time'),
-                elapsed_time=data.get('elapsed_time'),
-                air_time=data.get('air_time'),
-                distance=data.get('distance'),
-                wheels_on=datetime.fromisoformat(data['wheels_on']) if data.get('wheels_on') else None,
-                taxi_in=data.get('taxi_in'),
-                scheduled_arrival=datetime.fromisoformat(data['scheduled_arrival']) if data.get('scheduled_arrival') else None,
-                arrival_time=datetime.fromisoformat(data['arrival_time']) if data.get('arrival_time') else None,
-                arrival_delay=data.get('arrival_delay'),
-                diverted=data.get('diverted', False),
-                cancelled=data.get('cancelled', False),
-                cancellation_reason=data.get('cancellation_reason'),
-                air_system_delay=data.get('air_system_delay'),
-                security_delay=data.get('security_delay'),
-                airline_delay=data.get('airline_delay'),
-                late_aircraft_delay=data.get('late_aircraft_delay'),
-                weather_delay=data.get('weather_delay')
-            )
-            db.session.add(flight)
+            # Las filas van a flights o a la partición de su mes
+            insert_flights(rows)
+            # Actualizar los agregados en la misma transacción que los vuelos
+            apply_flights(rows)
             db.session.commit()
-            return jsonify({'message': 'Flight added successfully'}), 201
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
+        # Fuera del try: la escritura ya está confirmada y no se debe
+        # responder con error ni hacer rollback si falla la invalidación
+        invalidate_flight_cache(rows)
+        notify_new_flights()
+        if isinstance(data, list):
+            return jsonify({'message': 'Flights added successfully', 'inserted': len(rows)}), 201
+        return jsonify({'message': 'Flight added successfully'}), 201
+    else:
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            filters = parse_flight_filters(request.args)
+            ndjson = wants_ndjson()
+            stream = ndjson or bool(parse_bool(request.args, 'stream'))
+            enrich = bool(parse_bool(request.args, 'enrich'))
+            limit, after = parse_page(
+                request.args,
+                current_app.config['FLIGHTS_PAGE_SIZE'],
+                current_app.config['FLIGHTS_MAX_PAGE_SIZE']
+            )
+        except QueryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Caché de resultados por filtros normalizados (se invalida al insertar)
+        cache = get_flight_cache()
+        if cache is not None:
+            key = cache.key('list', filters, fields=fields, enrich=enrich, ndjson=ndjson,
+                            stream=stream, limit=None if stream else limit, after=None if stream else after)
+            cached = cache.lookup(key)
+            if cached is not None:
+                return cached
+
+        if stream:
+            # Lotes pequeños desde el cursor del servidor: la memoria no depende
+            # del número de vuelos y el primer byte sale con el primer lote
+            batches = iter_flight_batches(filters, fields, current_app.config['JSON_STREAM_BATCH_SIZE'])
+            pages = (rows_to_dicts(fields, rows) for rows in batches)
+            if enrich:
+                pages = (enrich_flights(page) for page in pages)
+            response = stream_json_response(pages, ndjson)
+            if cache is not None:
+                response.response = cache.tee(key, filters, response.response, response.mimetype)
+                response.headers['X-Cache'] = 'MISS'
+            return response
+
+        # Generación de la caché antes de consultar: una invalidación posterior
+        # impide guardar esta página
+        generation = cache.generation() if cache is not None else None
+        # Paginación por cursor (keyset sobre Flight.id): se piden limit + 1 filas
+        # para saber si hay una página siguiente sin hacer un COUNT
+        stmt = page_statement(fields, filters, after, limit + 1)
+        rows = db.session.execute(stmt).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = rows[-1][fields.index('id')] if has_more else None
+        flights = rows_to_dicts(fields, rows)
+        if enrich:
+            # Nombres desde los diccionarios en memoria: ninguna consulta por fila
+            flights = enrich_flights(flights)
+        response = jsonify({
+            'flights': flights,
+            'next_cursor': next_cursor,
+            'limit': limit
+        })
+        if cache is not None:
+            response = cache.store_response(key, filters, response, generation)
+        return response
+
+
+
+@flights_bp.route('/bulk', methods=['POST'])
+@swag_from({
+    'consumes': ['text/csv', 'application/x-ndjson'],
+    'responses': {
+        200: {
+            'description': 'Resultado de la carga masiva por lotes',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'inserted': {'type': 'integer'},
+                    'rejected': {'type': 'integer'},
+                    'batches': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'batch': {'type': 'integer'},
+                                'inserted': {'type': 'integer'},
+                                'rejected': {'type': 'integer'}
+                            }
+                        }
+                    },
+                    'errors': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'line': {'type': 'integer'},
+                                'error': {'type': 'string'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        415: {
+            'description': 'Tipo de contenido no soportado (usar text/csv o application/x-ndjson)'
+        },
+        500: {
+            'description': 'Error interno del servidor'
+        }
+    },
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'description': 'CSV con la misma cabecera que /api/flights/download, o NDJSON (un vuelo por línea). La columna ID se ignora.',
+            'schema': {'type': 'string', 'format': 'binary'}
+        },
+        {
+            'name': 'batch_size',
+            'in': 'query',
+            'type': 'integer',
+            'required': False,
+            'description': 'Filas por lote/transacción'
+        }
+    ],
+    'tags': ['Vuelos']
+})
+def bulk_flights():
+    content_type = request.mimetype
+    if content_type in ('text/csv', 'application/csv'):
+        records = iter_csv(request.stream)
+    elif content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        records = iter_ndjson(request.stream)
     else:
-        flights = Flight.query.all()
-        return jsonify([{
-            'id': f.id,
-            'year': f.year,
-            'month': f.month,
-            'day': f.day,
-            'day_of_week': f.day_of_week,
-            'airline': f.airline,
-            'flight_number': f.flight_number,
-            'tail_number': f.tail_number,
-            'origin_airport': f.origin_airport,
-            'destination_airport': f.destination_airport,
-            'scheduled_departure': f.scheduled_departure,
-            'departure_time': f.departure_time,
-            'departure_delay': f.departure_delay,
-            # Agregar otros campos según sea necesario
-        } for f in flights])
+        return jsonify({'error': 'Tipo de contenido no soportado (usar text/csv o application/x-ndjson)'}), 415
+    try:
+        batch_size = parse_int(
+            request.args, 'batch_size',
+            default=current_app.config['FLIGHTS_BULK_BATCH_SIZE'],
+            minimum=1,
+            maximum=current_app.config['FLIGHTS_BULK_MAX_BATCH_SIZE']
+        )
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        result = ingest_flights(records, batch_size, current_app.config['FLIGHTS_BULK_MAX_ERRORS'])
+        return jsonify(result), 200
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error en la carga masiva de vuelos: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+# Filtros admitidos por los endpoints de estadísticas (los agregados son diarios)
+STATS_FILTERS = {'airline', 'origin_airport', 'year', 'month', 'day', 'date_from', 'date_to'}
+
+STATS_PARAMETERS = [
+    {'name': 'airline', 'in': 'query', 'type': 'string', 'required': False},
+    {'name': 'origin_airport', 'in': 'query', 'type': 'string', 'required': False},
+    {'name': 'year', 'in': 'query', 'type': 'integer', 'required': False},
+    {'name': 'month', 'in': 'query', 'type': 'integer', 'required': False},
+    {'name': 'day', 'in': 'query', 'type': 'integer', 'required': False},
+    {'name': 'date_from', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False},
+    {'name': 'date_to', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False},
+]
+
+STATS_RESPONSE = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'flights': {'type': 'integer'},
+            'cancelled_flights': {'type': 'integer'},
+            'diverted_flights': {'type': 'integer'},
+            'cancellation_rate': {'type': 'number'},
+            'total_departure_delay': {'type': 'integer'},
+            'avg_departure_delay': {'type': 'number'},
+            'total_arrival_delay': {'type': 'integer'},
+            'avg_arrival_delay': {'type': 'number'},
+            'total_air_system_delay': {'type': 'integer'},
+            'total_security_delay': {'type': 'integer'},
+            'total_airline_delay': {'type': 'integer'},
+            'total_late_aircraft_delay': {'type': 'integer'},
+            'total_weather_delay': {'type': 'integer'}
+        }
+    }
+}
+
+
+def _stats_response(model, group_by):
+    try:
+        filters = parse_flight_filters(request.args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    table = model.__table__
+    unsupported = sorted(f for f in filters if f not in STATS_FILTERS or
+                         (f in ('airline', 'origin_airport') and f not in table.c))
+    if unsupported:
+        return jsonify({'error': f"Filtros no soportados: {', '.join(unsupported)}"}), 400
+    return jsonify(query_stats(table, group_by, flight_filter_clauses(filters, table)))
+
+
+@flights_bp.route('/stats/airlines', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Retrasos agregados por aerolínea', 'schema': STATS_RESPONSE},
+        400: {'description': 'Filtros inválidos'}
+    },
+    'parameters': [p for p in STATS_PARAMETERS if p['name'] != 'origin_airport'],
+    'tags': ['Vuelos']
+})
+def stats_airlines():
+    return _stats_response(AirlineDailyStats, ['airline'])
+
+
+@flights_bp.route('/stats/airports', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Retrasos agregados por aeropuerto de origen', 'schema': STATS_RESPONSE},
+        400: {'description': 'Filtros inválidos'}
+    },
+    'parameters': [p for p in STATS_PARAMETERS if p['name'] != 'airline'],
+    'tags': ['Vuelos']
+})
+def stats_airports():
+    return _stats_response(OriginDailyStats, ['origin_airport'])
+
+
+@flights_bp.route('/stats/daily', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Retrasos agregados por día (opcionalmente filtrados por aerolínea o aeropuerto de origen)',
+              'schema': STATS_RESPONSE},
+        400: {'description': 'Filtros inválidos'}
+    },
+    'parameters': STATS_PARAMETERS,
+    'tags': ['Vuelos']
+})
+def stats_daily():
+    # Si se filtra por aeropuerto se usan los agregados por origen; si no, los
+    # de aerolínea (que cubren todos los vuelos igualmente)
+    model = OriginDailyStats if request.args.get('origin_airport') else AirlineDailyStats
+    return _stats_response(model, ['year', 'month', 'day'])
+
+
+@flights_bp.route('/stats/routes', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Estadísticas por ruta (origen, destino), ordenadas por número de vuelos',
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'origin_airport': {'type': 'string'},
+                        'destination_airport': {'type': 'string'},
+                        'airline': {'type': 'string'},
+                        'month': {'type': 'integer'},
+                        'flights': {'type': 'integer'},
+                        'mean_arrival_delay': {'type': 'number'},
+                        'median_arrival_delay': {'type': 'number'},
+                        'cancellation_rate': {'type': 'number'},
+                        'mean_distance': {'type': 'number'}
+                    }
+                }
+            }
+        },
+        400: {'description': 'Filtros inválidos'}
+    },
+    'parameters': FLIGHT_FILTER_PARAMETERS + [
+        {'name': 'by_airline', 'in': 'query', 'type': 'boolean', 'required': False,
+         'description': 'Desglosar cada ruta por aerolínea'},
+        {'name': 'by_month', 'in': 'query', 'type': 'boolean', 'required': False,
+         'description': 'Desglosar cada ruta por mes'},
+        {'name': 'min_flights', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': 'Omitir las rutas con menos vuelos'},
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': 'Número máximo de rutas devueltas'}
+    ],
+    'tags': ['Vuelos']
+})
+def stats_routes():
+    # numpy se importa bajo demanda para no alargar el arranque
+    from app.analytics import get_route_statistics
+    try:
+        filters = parse_flight_filters(request.args)
+        by_airline = bool(parse_bool(request.args, 'by_airline'))
+        by_month = bool(parse_bool(request.args, 'by_month'))
+        min_flights = parse_int(request.args, 'min_flights', default=1, minimum=1)
+        limit = parse_int(request.args, 'limit', minimum=1)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        routes = get_route_statistics(filters, by_airline, by_month)
+    except Exception as e:
+        current_app.logger.error(f"Error al calcular las estadísticas por ruta: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+    if min_flights > 1:
+        routes = [r for r in routes if r['flights'] >= min_flights]
+    return jsonify(routes[:limit] if limit else routes)
+
+
+@flights_bp.route('/stats/aggregate', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Retrasos agregados por las columnas de group_by con cualquier filtro de vuelos '
+                             '(cabecera X-Data-Source: columnar o database)',
+              'schema': STATS_RESPONSE},
+        400: {'description': 'Parámetros inválidos'}
+    },
+    'parameters': FLIGHT_FILTER_PARAMETERS + [
+        {'name': 'group_by', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Columnas de agrupación separadas por comas (airline, origin_airport, '
+                        'destination_airport, year, month, day, day_of_week); por defecto airline'}
+    ],
+    'tags': ['Vuelos']
+})
+def stats_aggregate():
+    # numpy se importa bajo demanda para no alargar el arranque
+    from app.columnar import GROUP_COLUMNS, aggregate_flights
+    group_by = [c.strip() for c in request.args.get('group_by', 'airline').split(',') if c.strip()]
+    try:
+        invalid = sorted(set(c for c in group_by if c not in GROUP_COLUMNS))
+        if invalid:
+            raise QueryError(f"Columnas de agrupación no válidas: {', '.join(invalid)}")
+        if len(set(group_by)) != len(group_by):
+            raise QueryError("Columnas de agrupación repetidas en 'group_by'")
+        filters = parse_flight_filters(request.args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        result, source = aggregate_flights(filters, group_by)
+    except Exception as e:
+        current_app.logger.error(f"Error al agregar los vuelos: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+    response = jsonify(result)
+    response.headers['X-Data-Source'] = source
+    return response
+
+
+# Filtros admitidos por los percentiles (los sketches son mensuales)
+PERCENTILE_FILTERS = {'airline', 'origin_airport', 'year', 'month'}
+
+PERCENTILE_DELAY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'count': {'type': 'integer'},
+        'min': {'type': 'number'},
+        'max': {'type': 'number'},
+        'percentiles': {'type': 'object', 'additionalProperties': {'type': 'number'}}
+    }
+}
+
 
+def _parse_percentiles(raw):
+    try:
+        values = [float(p) for p in raw.split(',') if p.strip()]
+    except ValueError:
+        raise QueryError("El parámetro 'percentiles' debe ser una lista de números separados por comas")
+    if not values or any(not 0 <= p <= 100 for p in values):
+        raise QueryError("Los percentiles deben estar entre 0 y 100")
+    return [p / 100 for p in values]
+
+
+@flights_bp.route('/stats/percentiles', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Percentiles de retraso de salida y llegada por aerolínea o aeropuerto de origen',
+            'schema': {
+                'type': 'array',
+                'items': {
+                    'type': 'object',
+                    'properties': {
+                        'airline': {'type': 'string'},
+                        'origin_airport': {'type': 'string'},
+                        'departure_delay': PERCENTILE_DELAY_SCHEMA,
+                        'arrival_delay': PERCENTILE_DELAY_SCHEMA
+                    }
+                }
+            }
+        },
+        400: {'description': 'Parámetros inválidos'}
+    },
+    'parameters': [
+        {'name': 'by', 'in': 'query', 'type': 'string', 'enum': ['airline', 'origin_airport'],
+         'required': False, 'description': 'Dimensión de los sketches (por defecto airline)'},
+        {'name': 'airline', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Códigos de aerolínea separados por comas (con by=airline)'},
+        {'name': 'origin_airport', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Códigos de aeropuerto separados por comas (con by=origin_airport)'},
+        {'name': 'year', 'in': 'query', 'type': 'integer', 'required': False},
+        {'name': 'month', 'in': 'query', 'type': 'integer', 'required': False},
+        {'name': 'month_from', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Mes inicial inclusivo (YYYY-MM)'},
+        {'name': 'month_to', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Mes final inclusivo (YYYY-MM)'},
+        {'name': 'percentiles', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Percentiles separados por comas (por defecto 50,90,99)'},
+        {'name': 'merge', 'in': 'query', 'type': 'boolean', 'required': False,
+         'description': 'Fusionar todos los códigos seleccionados en un único resultado'}
+    ],
+    'tags': ['Vuelos']
+})
+def stats_percentiles():
+    # numpy se importa bajo demanda para no alargar el arranque
+    from app.sketches import DIMENSIONS, get_sketch_store
+    dimension = request.args.get('by', 'airline')
+    try:
+        if dimension not in DIMENSIONS:
+            raise QueryError(f"El parámetro 'by' debe ser uno de: {', '.join(DIMENSIONS)}")
+        filters = parse_flight_filters(request.args)
+        unsupported = sorted(f for f in filters if f not in PERCENTILE_FILTERS or
+                             (f in DIMENSIONS and f != dimension))
+        if unsupported:
+            raise QueryError(f"Filtros no soportados: {', '.join(unsupported)}")
+        bounds = []
+        for name in ('month_from', 'month_to'):
+            raw = request.args.get(name)
+            try:
+                bounds.append(parse_month(raw) if raw else None)
+            except ValueError as e:
+                raise QueryError(str(e))
+        quantiles = _parse_percentiles(request.args.get('percentiles', '50,90,99'))
+        merge = bool(parse_bool(request.args, 'merge'))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    month_from, month_to = bounds
+    year, month = filters.get('year'), filters.get('month')
+
+    def months(y, m):
+        return ((year is None or y == year) and (month is None or m == month) and
+                (month_from is None or (y, m) >= month_from) and
+                (month_to is None or (y, m) <= month_to))
+
+    try:
+        result = get_sketch_store().percentiles(
+            dimension, codes=filters.get(dimension), months=months, quantiles=quantiles, merge=merge)
+    except Exception as e:
+        current_app.logger.error(f"Error al calcular los percentiles de retraso: {str(e)}")
+        return jsonify({'error': 'Error interno del servidor'}), 500
+    return jsonify(result[0] if merge else result)
+
+
+@flights_bp.route('/feed', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': ('Vuelos con id mayor que el cursor. Con Accept: text/event-stream se devuelve un '
+                            'stream SSE (evento "flight" por vuelo, con el id como id del evento); si no, '
+                            'un long-poll que espera hasta que llegan vuelos nuevos o vence timeout'),
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'flights': {'type': 'array', 'items': {'type': 'object'}},
+                    'next_cursor': {'type': 'integer', 'description': 'Valor de after para la siguiente petición'},
+                    'has_more': {'type': 'boolean', 'description': 'Quedan vuelos pendientes (pedir otra vez sin esperar)'}
+                }
+            }
+        },
+        400: {'description': 'Parámetros inválidos'}
+    },
+    'parameters': [
+        {'name': 'after', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': ('Último id recibido (en SSE también la cabecera Last-Event-ID). '
+                         'Sin él sólo se reciben los vuelos insertados a partir de ahora')},
+        {'name': 'timeout', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': 'Segundos máximos de espera del long-poll'},
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False,
+         'description': 'Vuelos máximos por respuesta (o por lote en SSE)'},
+        {'name': 'fields', 'in': 'query', 'type': 'string', 'required': False,
+         'description': 'Lista de columnas separadas por comas (el id siempre se incluye)'},
+        *FLIGHT_FILTER_PARAMETERS
+    ],
+    'tags': ['Vuelos']
+})
+def flight_feed():
+    sse = request.accept_mimetypes.best == 'text/event-stream'
+    max_timeout = current_app.config['FEED_LONG_POLL_TIMEOUT']
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        filters = parse_flight_filters(request.args)
+        args = dict(request.args)
+        if sse and request.headers.get('Last-Event-ID'):
+            args['after'] = request.headers['Last-Event-ID']
+        after = parse_int(args, 'after', minimum=0)
+        timeout = parse_int(request.args, 'timeout', default=max_timeout, minimum=0, maximum=max_timeout)
+        limit = parse_int(request.args, 'limit', default=current_app.config['FEED_BATCH_SIZE'], minimum=1,
+                          maximum=current_app.config['FLIGHTS_MAX_PAGE_SIZE'])
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    feed = get_flight_feed()
+    if after is None:
+        after = feed.current()
+
+    if sse:
+        events = sse_events(feed, fields, filters, after, limit,
+                            current_app.config['FEED_HEARTBEAT_SECONDS'],
+                            current_app.config['FEED_SSE_MAX_SECONDS'])
+        return Response(
+            stream_with_context(events),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    # Long-poll: si ya hay vuelos nuevos se responde sin esperar
+    flights, cursor, has_more = poll_delta(feed, fields, filters, after, limit, timeout)
+    return jsonify({'flights': flights, 'next_cursor': cursor, 'has_more': has_more})
+
+
+@flights_bp.route('/cache', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Contadores de la caché de resultados de vuelos (de este proceso)',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'backend': {'type': 'string'},
+                    'hits': {'type': 'integer'},
+                    'misses': {'type': 'integer'},
+                    'hit_rate': {'type': 'number'},
+                    'bypassed': {'type': 'integer'},
+                    'stores': {'type': 'integer'},
+                    'evictions': {'type': 'integer'},
+                    'invalidations': {'type': 'integer'},
+                    'skipped': {'type': 'integer'},
+                    'entries': {'type': 'integer'},
+                    'bytes': {'type': 'integer'}
+                }
+            }
+        },
+        404: {'description': 'Caché desactivada (FLIGHT_CACHE_ENABLED)'}
+    },
+    'tags': ['Vuelos']
+})
+def cache_stats():
+    cache = get_flight_cache()
+    if cache is None:
+        return jsonify({'error': 'La caché de resultados está desactivada'}), 404
+    return jsonify(cache.stats())
 
 
 @flights_bp.route('/download', methods=['GET'])
 @swag_from({
     'responses': {
         200: {
-            'description': 'Descarga de vuelos en formato CSV',
+            'description': 'Descarga de vuelos en CSV (comprimida con gzip si el cliente envía Accept-Encoding: gzip), Parquet o Arrow IPC',
             'content': {
                 'text/csv': {
                     'schema': {
                         'type': 'string',
                         'format': 'binary'
                     }
+                },
+                'application/vnd.apache.parquet': {
+                    'schema': {
+                        'type': 'string',
+                        'format': 'binary'
+                    }
+                },
+                'application/vnd.apache.arrow.stream': {
+                    'schema': {
+                        'type': 'string',
+                        'format': 'binary'
+                    }
                 }
             }
         },
+        400: {
+            'description': 'Filtros, campos o formato inválidos'
+        },
+        501: {
+            'description': 'Formato columnar no disponible (pyarrow no está instalado)'
+        },
         500: {
             'description': 'Error interno del servidor'
         }
     },
+    'parameters': [
+        {
+            'name': 'format',
+            'in': 'query',
+            'type': 'string',
+            'enum': ['csv', 'parquet', 'arrow'],
+            'required': False,
+            'description': 'Formato del fichero (por defecto csv)'
+        },
+        {
+            'name': 'fields',
+            'in': 'query',
+            'type': 'string',
+            'required': False,
+            'description': 'Lista de columnas separadas por comas (por defecto todas)'
+        },
+        *FLIGHT_FILTER_PARAMETERS
+    ],
     'tags': ['Vuelos']
 })
 def download_flights():
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Formato no soportado: {fmt}"}), 400
+    if fmt != 'csv' and not columnar_available():
+        return jsonify({'error': 'El formato columnar requiere pyarrow'}), 501
+    try:
+        fields = parse_fields(request.args.get('fields'), default=FLIGHT_FIELDS)
+        filters = parse_flight_filters(request.args)
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    batch_size = current_app.config['FLIGHTS_EXPORT_BATCH_SIZE']
+    chunk_bytes = current_app.config['FLIGHTS_EXPORT_CHUNK_BYTES']
+    # Parquet y Arrow ya van comprimidos/compactos: gzip sólo para CSV
+    use_gzip = fmt == 'csv' and 'gzip' in request.accept_encodings
+
+    mimetype, extension = EXPORT_FORMATS[fmt]
+    headers = {'Content-Disposition': f'attachment;filename=flights.{extension}', 'Vary': 'Accept-Encoding'}
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+
+    cache = get_flight_cache()
+    if cache is not None:
+        key = cache.key('download', filters, fields=fields, format=fmt, gzip=use_gzip)
+        cached = cache.lookup(key)
+        if cached is not None:
+            return cached
+
     def generate():
         try:
-            # Crear un objeto StringIO para el encabezado
-            data = io.StringIO()
-            writer = csv.writer(data)
-            writer.writerow([
-                'ID', 'Year', 'Month', 'Day', 'Day of Week', 'Airline', 'Flight Number',
-                'Tail Number', 'Origin Airport', 'Destination Airport', 'Scheduled Departure',
-                'Departure Time', 'Departure Delay', 'Taxi Out', 'Wheels Off', 'Scheduled Time',
-                'Elapsed Time', 'Air Time', 'Distance', 'Wheels On', 'Taxi In',
-                'Scheduled Arrival', 'Arrival Time', 'Arrival Delay', 'Diverted',
-                'Cancelled', 'Cancellation Reason', 'Air System Delay', 'Security Delay',
-                'Airline Delay', 'Late Aircraft Delay', 'Weather Delay'
-            ])
-            yield data.getvalue()
-            data.seek(0)
-            data.truncate(0)
-
-            # Usar yield_per para iterar en batches y evitar cargar todo en memoria
-            query = Flight.query.yield_per(1000).enable_eagerloads(False)
-            for flight in query:
-                writer.writerow([
-                    flight.id,
-                    flight.year,
-                    flight.month,
-                    flight.day,
-                    flight.day_of_week,
-                    flight.airline,
-                    flight.flight_number,
-                    flight.tail_number if flight.tail_number else '',
-                    flight.origin_airport,
-                    flight.destination_airport,
-                    flight.scheduled_departure,
-                    flight.departure_time,
-                    flight.departure_delay,
-                    flight.taxi_out if flight.taxi_out is not None else '',
-                    flight.wheels_off.isoformat() if flight.wheels_off else '',
-                    flight.scheduled_time if flight.scheduled_time is not None else '',
-                    flight.elapsed_time if flight.elapsed_time is not None else '',
-                    flight.air_time if flight.air_time is not None else '',
-                    flight.distance if flight.distance is not None else '',
-                    flight.wheels_on.isoformat() if flight.wheels_on else '',
-                    flight.taxi_in if flight.taxi_in is not None else '',
-                    flight.scheduled_arrival.isoformat() if flight.scheduled_arrival else '',
-                    flight.arrival_time.isoformat() if flight.arrival_time else '',
-                    flight.arrival_delay if flight.arrival_delay is not None else '',
-                    flight.diverted,
-                    flight.cancelled,
-                    flight.cancellation_reason if flight.cancellation_reason else '',
-                    flight.air_system_delay if flight.air_system_delay is not None else '',
-                    flight.security_delay if flight.security_delay is not None else '',
-                    flight.airline_delay if flight.airline_delay is not None else '',
-                    flight.late_aircraft_delay if flight.late_aircraft_delay is not None else '',
-                    flight.weather_delay if flight.weather_delay is not None else ''
-                ])
-                yield data.getvalue()
-                data.seek(0)
-                data.truncate(0)
+            batches = iter_flight_batches(filters, fields, batch_size)
+            if fmt == 'csv':
+                # Filas como tuplas (Core, cursor del lado del servidor) escritas en
+                # trozos grandes en lugar de una cadena por fila
+                chunks = csv_chunks(fields, batches, chunk_bytes)
+            else:
+                chunks = columnar_chunks(fmt, fields, batches)
+            if use_gzip:
+                chunks = gzip_chunks(chunks)
+            if cache is not None:
+                # Sólo se guarda si la descarga termina sin errores
+                chunks = cache.tee(key, filters, chunks, mimetype, headers)
+            yield from chunks
         except Exception as e:
             # Registrar el error en los logs
             current_app.logger.error(f"Error al descargar vuelos: {str(e)}")
-            yield ''  # Puedes optar por no yield nada o un mensaje de error
+            yield b''  # Puedes optar por no yield nada o un mensaje de error
 
-    return Response(
+    response = Response(
         stream_with_context(generate()),
-        mimetype='text/csv',
-        headers={'Content-Disposition': 'attachment;filename=flights.csv'}
-    )
\ No newline at end of file
+        mimetype=mimetype,
+        headers=headers
+    )
+    if cache is not None:
+        response.headers['X-Cache'] = 'MISS'
+    return response
+
+
+def _job_response(job):
+    data = dict(job)
+    data.pop('owner', None)
+    data['status_url'] = url_for('flights.export_status', job_id=job['id'])
+    if job['status'] == 'done':
+        data['download_url'] = url_for('flights.export_file', job_id=job['id'])
+    return data
+
+
+def _body_to_args(body):
+    """Convierte los filtros de un cuerpo JSON al formato de la query string."""
+    args = {}
+    for key, value in (body or {}).items():
+        if isinstance(value, bool):
+            args[key] = 'true' if value else 'false'
+        elif isinstance(value, (list, tuple)):
+            args[key] = ','.join(str(v) for v in value)
+        elif value is not None:
+            args[key] = str(value)
+    return args
+
+
+@flights_bp.route('/exports', methods=['POST'])
+@swag_from({
+    'responses': {
+        202: {'description': 'Exportación encolada'},
+        200: {'description': 'Ya existe una exportación idéntica con los datos actuales (se reutiliza)'},
+        400: {'description': 'Filtros, campos o formato inválidos'},
+        501: {'description': 'Formato columnar no disponible (pyarrow no está instalado)'},
+        503: {'description': 'Cola de exportaciones llena; reintentar más tarde'}
+    },
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': False,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'format': {'type': 'string', 'enum': ['csv', 'parquet', 'arrow']},
+                    'fields': {'type': 'array', 'items': {'type': 'string'}},
+                    'filters': {
+                        'type': 'object',
+                        'description': 'Mismos filtros que GET /api/flights (airline, origin_airport, date_from, ...)'
+                    }
+                }
+            }
+        }
+    ],
+    'tags': ['Vuelos']
+})
+def create_export():
+    body = request.get_json(silent=True) or {}
+    fmt = str(body.get('format', 'csv')).lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Formato no soportado: {fmt}"}), 400
+    if fmt != 'csv' and not columnar_available():
+        return jsonify({'error': 'El formato columnar requiere pyarrow'}), 501
+    try:
+        fields = body.get('fields')
+        if isinstance(fields, list):
+            fields = ','.join(fields)
+        fields = parse_fields(fields, default=FLIGHT_FIELDS)
+        filters = parse_flight_filters(_body_to_args(body.get('filters')))
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job, created = get_export_jobs().submit(fmt, fields, filters)
+    except ExportQueueFull:
+        response = jsonify({'error': 'Demasiadas exportaciones en curso'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    return jsonify(_job_response(job)), 202 if created else 200
+
+
+@flights_bp.route('/exports/<job_id>', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {
+            'description': 'Estado y progreso de la exportación',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'string'},
+                    'status': {'type': 'string', 'enum': ['queued', 'running', 'done', 'failed']},
+                    'rows_written': {'type': 'integer'},
+                    'total_rows': {'type': 'integer'},
+                    'bytes': {'type': 'integer'},
+                    'error': {'type': 'string'},
+                    'download_url': {'type': 'string'}
+                }
+            }
+        },
+        404: {'description': 'Exportación no encontrada'}
+    },
+    'tags': ['Vuelos']
+})
+def export_status(job_id):
+    job = get_export_jobs().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    return jsonify(_job_response(job))
+
+
+@flights_bp.route('/exports/<job_id>/file', methods=['GET'])
+@swag_from({
+    'responses': {
+        200: {'description': 'Fichero exportado (admite cabeceras Range para reanudar la descarga)'},
+        206: {'description': 'Fragmento del fichero solicitado con Range'},
+        404: {'description': 'Exportación no encontrada'},
+        409: {'description': 'La exportación aún no ha terminado'}
+    },
+    'tags': ['Vuelos']
+})
+def export_file(job_id):
+    jobs = get_export_jobs()
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"La exportación está en estado '{job['status']}'"}), 409
+    path = jobs.artifact_path(job)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Exportación no encontrada'}), 404
+    mimetype, extension = EXPORT_FORMATS[job['format']]
+    # conditional=True habilita ETag/Last-Modified y respuestas 206 con Range
+    return send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True,
+                     download_name=f'flights.{extension}', conditional=True)
@@ -0,0 +1,341 @@
+# app/schemas.py
+
+from datetime import date, datetime
+from flask import current_app
+from app.dimensions import get_dimensions, reload_dimensions
+from app.models import Airline, Airport, Flight
+
+
+class ValidationError(ValueError):
+    """Registro inválido; ``errors`` es una lista de ``{'field', 'error'}``."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(f"{e['field']}: {e['error']}" for e in errors))
+        self.errors = errors
+
+
+def _to_bool(value):
+    if value is True or value is False:
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in ('true', '1', 't', 'yes', 'y'):
+        return True
+    if text in ('false', '0', 'f', 'no', 'n'):
+        return False
+    raise ValueError('debe ser booleano')
+
+
+def _to_int(value):
+    if type(value) is int:
+        return value
+    if isinstance(value, bool):
+        raise ValueError('debe ser un entero')
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError('debe ser un entero')
+        return int(value)
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise ValueError('debe ser un entero')
+
+
+def _to_float(value):
+    if type(value) is float:
+        return value
+    if isinstance(value, bool):
+        raise ValueError('debe ser numérico')
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError('debe ser numérico')
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise ValueError('debe ser una fecha ISO 8601')
+
+
+def _string(max_length, upper):
+    def convert(value):
+        if type(value) is not str:
+            if isinstance(value, (dict, list)):
+                raise ValueError('debe ser texto')
+            value = str(value)
+        value = value.strip()
+        if upper:
+            value = value.upper()
+        if max_length and len(value) > max_length:
+            raise ValueError(f'más de {max_length} caracteres')
+        return value
+    return convert
+
+
+def _converter_for(column, upper):
+    python_type = column.type.python_type
+    if python_type is bool:
+        return _to_bool
+    if python_type is int:
+        return _to_int
+    if python_type is float:
+        return _to_float
+    if python_type is datetime:
+        return _to_datetime
+    return _string(getattr(column.type, 'length', None), upper)
+
+
+def _text(convert, value):
+    """Conversión de un texto para el camino rápido: None si no es válido o queda vacío."""
+    try:
+        return convert(value) or None
+    except ValueError:
+        return None
+
+
+class Schema:
+    """Validador precalculado a partir de la tabla de un modelo.
+
+    Los conversores, obligatoriedad, valores por defecto, rangos y claves
+    foráneas de cada columna se calculan una sola vez; validar un registro es
+    un recorrido por esa lista. Los valores que ya tienen el tipo de la
+    columna (JSON) no llaman a ningún conversor.
+
+    ``validate_many`` usa además un camino rápido generado a partir de la
+    misma lista (ver ``_compile``) y sólo llama a ``validate`` con los
+    registros que se salen de él.
+    """
+
+    def __init__(self, model, exclude=(), defaults=None, ranges=None, checks=()):
+        table = model.__table__
+        defaults = defaults or {}
+        self.ranges = ranges or {}
+        # Comprobaciones entre campos: (campos, función) que recibe sus valores
+        # y devuelve un error o None
+        self.checks = tuple(checks)
+        # Claves foráneas: columna -> tabla referenciada (airlines/airports)
+        self.foreign_keys = {
+            c.name: next(iter(c.foreign_keys)).column.table.name
+            for c in table.columns if c.foreign_keys and c.name not in exclude
+        }
+        self.fields = [c for c in table.columns if c.name not in exclude]
+        self.defaults = defaults
+        self.key = table.primary_key.columns.values()[0].name
+        # Por columna: (nombre, tipo del camino rápido, conversor, obligatoria, valor por defecto)
+        self._columns = []
+        for column in self.fields:
+            name = column.name
+            # Los códigos IATA se normalizan a mayúsculas
+            upper = name == 'iata_code' or name in self.foreign_keys
+            python_type = column.type.python_type
+            # Los textos pasan siempre por el conversor (strip, mayúsculas, longitud)
+            fast_type = python_type if python_type in (int, float, bool) else None
+            required = not column.nullable and name not in defaults
+            self._columns.append((name, fast_type, _converter_for(column, upper), required, defaults.get(name)))
+        self._fast, self._fast_caches = self._compile()
+
+    def _compile(self):
+        """Genera el camino rápido de ``validate_many``.
+
+        Es ``validate`` desenrollada para los registros correctos: un bloque
+        por columna sin bucle ni llamadas a conversores, salvo en los textos
+        (con caché por lote: códigos y matrículas se repiten) y las fechas.
+        Las comprobaciones entre campos también se cachean por combinación de
+        valores. Ante cualquier cosa fuera de lo habitual (tipo inesperado,
+        ausente obligatorio, fuera de rango, código desconocido...) devuelve
+        None y el registro pasa por ``validate``, que da los errores, así que
+        el resultado es siempre el mismo que con ``validate``.
+
+        Devuelve la función y el número de cachés que espera.
+        """
+        namespace = {'_text': _text, 'fromisoformat': datetime.fromisoformat}
+        body, caches = [], []
+        for index, (name, fast_type, convert, required, default) in enumerate(self._columns):
+            value = f'v{index}'
+            namespace[f'default{index}'] = default
+            missing = 'return None' if required else f'{value} = default{index}'
+            body.append(f'{value} = get({name!r})')
+            if fast_type is not None:
+                body.append(f'if type({value}) is not {fast_type.__name__}:')
+                if fast_type is float:
+                    body.append(f'    if type({value}) is int: {value} = float({value})')
+                    body.append(f'    elif {value} is not None: return None')
+                    body.append(f'    else: {missing}')
+                else:
+                    body.append(f'    if {value} is not None: return None')
+                    body.append(f'    {missing}')
+            elif convert is _to_datetime:
+                # Con espacios alrededor fromisoformat falla y decide validate
+                body.append(f'if type({value}) is str:')
+                body.append(f'    try: {value} = fromisoformat({value})')
+                body.append('    except ValueError: return None')
+                body.append(f'elif {value} is not None: return None')
+                body.append(f'else: {missing}')
+            else:
+                cache = f'cache{len(caches)}'
+                caches.append(cache)
+                namespace[f'convert{index}'] = convert
+                body.append(f'if type({value}) is str:')
+                body.append(f'    converted = {cache}.get({value})')
+                body.append('    if converted is None:')
+                body.append(f'        converted = {cache}[{value}] = _text(convert{index}, {value})')
+                body.append('        if converted is None: return None')
+                body.append(f'    {value} = converted')
+                body.append(f'elif {value} is not None: return None')
+                body.append(f'else: {missing}')
+        names = [column[0] for column in self._columns]
+        for name, (low, high) in self.ranges.items():
+            value = f'v{names.index(name)}'
+            body.append(f'if {value} is not None and not {low!r} <= {value} <= {high!r}: return None')
+        for index, (fields, check) in enumerate(self.checks):
+            cache = f'cache{len(caches)}'
+            caches.append(cache)
+            namespace[f'check{index}'] = check
+            body.append(f"key = ({', '.join(f'v{names.index(name)}' for name in fields)},)")
+            body.append(f'if key not in {cache}:')
+            body.append(f'    if check{index}(*key): return None')
+            body.append(f'    {cache}[key] = True')
+        if self.foreign_keys:
+            body.append('if known is not None:')
+            for name, target in self.foreign_keys.items():
+                value = f'v{names.index(name)}'
+                body.append(f'    if {value} is not None and {value} not in known.{target}: return None')
+        body.append('return {' + ', '.join(f'{name!r}: v{index}' for index, name in enumerate(names)) + '}')
+        prelude = ['get = record.get']
+        if caches:
+            prelude.append(f"{', '.join(caches)}, = caches")
+        source = 'def validate_fast(record, known, caches):\n' + ''.join(f'    {line}\n' for line in prelude + body)
+        exec(compile(source, f'<schema {self.key}>', 'exec'), namespace)
+        return namespace['validate_fast'], len(caches)
+
+    def validate(self, record, known=None):
+        """Devuelve la fila normalizada o lanza ``ValidationError``.
+
+        ``known`` (un ``KnownCodes``) activa la comprobación de claves foráneas.
+        Un texto vacío (o sólo con espacios) cuenta como ausente.
+        """
+        if not isinstance(record, dict):
+            raise ValidationError([{'field': None, 'error': 'se esperaba un objeto'}])
+        row = {}
+        errors = []
+        for name, fast_type, convert, required, default in self._columns:
+            value = record.get(name)
+            if fast_type is None or type(value) is not fast_type:
+                if value is not None and value != '':
+                    try:
+                        value = convert(value)
+                    except ValueError as e:
+                        errors.append({'field': name, 'error': str(e)})
+                        row[name] = None
+                        continue
+                if value is None or value == '':
+                    if required:
+                        errors.append({'field': name, 'error': 'obligatorio'})
+                    value = default
+            row[name] = value
+
+        for name, (low, high) in self.ranges.items():
+            value = row[name]
+            if value is not None and not low <= value <= high:
+                errors.append({'field': name, 'error': f'fuera de rango [{low}, {high}]'})
+        if not errors:
+            for fields, check in self.checks:
+                error = check(*(row[name] for name in fields))
+                if error:
+                    errors.append(error)
+        if known is not None and not errors:
+            for name, target in self.foreign_keys.items():
+                code = row[name]
+                if code is not None and code not in getattr(known, target) and not known.reload_has(target, code):
+                    errors.append({'field': name, 'error': f'código desconocido {code!r}'})
+        if errors:
+            raise ValidationError(errors)
+        return row
+
+    def validate_many(self, records, known=None, unique=False):
+        """Valida una lista completa.
+
+        Devuelve ``(filas, errores)`` con errores ``{'index', 'errors'}``. Con
+        ``unique`` se rechazan además claves primarias repetidas en la carga.
+        """
+        rows, failures, seen = [], [], {}
+        fast, validate = self._fast, self.validate
+        # Cachés del camino rápido, sólo para este lote (memoria acotada)
+        caches = [{} for _ in range(self._fast_caches)]
+        for index, record in enumerate(records):
+            row = fast(record, known, caches) if type(record) is dict else None
+            if row is None:
+                try:
+                    row = validate(record, known)
+                except ValidationError as e:
+                    failures.append({'index': index, 'errors': e.errors})
+                    continue
+            if unique:
+                key = row[self.key]
+                if key in seen:
+                    failures.append({'index': index, 'errors': [
+                        {'field': self.key, 'error': f'duplicado (fila {seen[key]})'}]})
+                    continue
+                seen[key] = index
+            rows.append(row)
+        return rows, failures
+
+
+class KnownCodes:
+    """Códigos IATA existentes, desde los diccionarios de dimensiones en memoria.
+
+    ``airlines`` y ``airports`` admiten ``in`` en O(1). Ante un código
+    desconocido se recargan una vez, por si otro worker lo acaba de crear,
+    salvo que se hayan cargado hace menos de DIMENSIONS_RELOAD_INTERVAL
+    segundos.
+    """
+
+    def __init__(self):
+        self._load(get_dimensions())
+        self._reloaded = False
+
+    def _load(self, dimensions):
+        self.airlines = dimensions.airlines
+        self.airports = dimensions.airports
+
+    def reload_has(self, table, code):
+        if self._reloaded:
+            return False
+        self._reloaded = True
+        self._load(reload_dimensions(current_app.config['DIMENSIONS_RELOAD_INTERVAL']))
+        return code in getattr(self, table)
+
+    def contains(self, table, code):
+        return code in getattr(self, table) or self.reload_has(table, code)
+
+
+def _check_flight_date(year, month, day, day_of_week):
+    """El año/mes/día debe ser una fecha real y ``day_of_week`` su día ISO (lunes = 1)."""
+    if year is None or month is None or day is None:
+        return None
+    try:
+        weekday = date(year, month, day).isoweekday()
+    except ValueError:
+        return {'field': 'day', 'error': f'fecha inexistente {year:04d}-{month:02d}-{day:02d}'}
+    if day_of_week is not None and day_of_week != weekday:
+        return {'field': 'day_of_week', 'error': f'no coincide con la fecha (debe ser {weekday})'}
+    return None
+
+
+AIRLINE_SCHEMA = Schema(Airline)
+
+AIRPORT_SCHEMA = Schema(Airport, ranges={'latitude': (-90.0, 90.0), 'longitude': (-180.0, 180.0)})
+
+# El id lo asigna la base de datos (o la secuencia de particiones)
+FLIGHT_SCHEMA = Schema(
+    Flight,
+    exclude=('id',),
+    defaults={'diverted': False, 'cancelled': False},
+    ranges={'month': (1, 12), 'day': (1, 31), 'day_of_week': (1, 7)},
+    checks=((('year', 'month', 'day', 'day_of_week'), _check_flight_date),),
+)
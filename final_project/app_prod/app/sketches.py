@@ -0,0 +1,368 @@
+# app/sketches.py
+
+import math
+import threading
+import time
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from app import db
+from app.export import iter_flight_batches
+from app.models import DelaySketch
+from app.partitions import archived_months, in_months
+
+# Dimensiones y medidas con sketch propio (un t-digest por combinación y mes)
+DIMENSIONS = ('airline', 'origin_airport')
+MEASURES = ('departure_delay', 'arrival_delay')
+
+# Valores sueltos acumulados antes de comprimir un digest
+_BUFFER_LIMIT = 50000
+# Filas por DELETE/INSERT al compactar
+_WRITE_CHUNK = 1000
+
+
+class TDigest:
+    """t-digest fusionable implementado con NumPy.
+
+    Los centroides (media, peso) se ordenan por media y se agrupan según la
+    función de escala k1 (``δ/2π · asin(2q - 1)``): los de las colas quedan
+    casi sin agrupar y los del centro se funden, de modo que p99 conserva
+    precisión con unos ``δ/2`` centroides. Fusionar dos digests es
+    concatenar sus centroides y volver a comprimir.
+    """
+
+    __slots__ = ('compression', 'means', 'weights', 'min', 'max', '_pending', '_pending_count')
+
+    def __init__(self, compression, means=None, weights=None, minimum=math.inf, maximum=-math.inf):
+        self.compression = compression
+        self.means = np.empty(0) if means is None else means
+        self.weights = np.empty(0) if weights is None else weights
+        self.min = minimum
+        self.max = maximum
+        self._pending = []
+        self._pending_count = 0
+
+    @classmethod
+    def from_values(cls, values, compression):
+        digest = cls(compression)
+        digest.update(values)
+        return digest
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._pending.append((values, np.ones(len(values))))
+        self._pending_count += len(values)
+        if self._pending_count >= _BUFFER_LIMIT:
+            self._compress()
+
+    def merge(self, other):
+        other._compress()
+        if not len(other.means):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._pending.append((other.means, other.weights))
+        self._pending_count += len(other.means)
+        if self._pending_count >= _BUFFER_LIMIT:
+            self._compress()
+
+    def _compress(self):
+        if not self._pending:
+            return
+        means = np.concatenate([self.means] + [m for m, _ in self._pending])
+        weights = np.concatenate([self.weights] + [w for _, w in self._pending])
+        self._pending = []
+        self._pending_count = 0
+        order = np.argsort(means, kind='stable')
+        means = means[order]
+        weights = weights[order]
+        total = weights.sum()
+        # Posición (cuantil) del centro de cada centroide y su celda de la escala k1
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        cells = np.floor(k + self.compression / 4)
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    @property
+    def count(self):
+        self._compress()
+        return int(round(self.weights.sum()))
+
+    def quantiles(self, qs):
+        """Cuantiles (0..1) interpolando entre los centros de los centroides."""
+        self._compress()
+        if not len(self.means):
+            return [None] * len(qs)
+        cumulative = np.cumsum(self.weights)
+        centers = cumulative - self.weights / 2
+        positions = np.r_[0.0, centers, cumulative[-1]]
+        values = np.r_[self.min, self.means, self.max]
+        return [float(v) for v in np.interp(np.asarray(qs) * cumulative[-1], positions, values)]
+
+    def to_bytes(self):
+        self._compress()
+        return np.r_[self.min, self.max, self.means, self.weights].astype('<f8').tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, compression):
+        array = np.frombuffer(data, dtype='<f8')
+        n = (len(array) - 2) // 2
+        return cls(compression, array[2:2 + n].copy(), array[2 + n:].copy(), float(array[0]), float(array[1]))
+
+
+def _compression():
+    return current_app.config['SKETCH_COMPRESSION']
+
+
+def _sketch_rows(digests):
+    return [
+        {'dimension': dimension, 'code': code, 'year': year, 'month': month,
+         'measure': measure, 'digest': digest.to_bytes()}
+        for (dimension, code, year, month, measure), digest in digests.items()
+    ]
+
+
+# Columnas de vuelos que alimentan los sketches, en el orden de _add_batch
+_FIELDS = ['airline', 'origin_airport', 'year', 'month', 'departure_delay', 'arrival_delay']
+
+
+def _add_batch(digests, columns, compression, skip_months=()):
+    """Añade un lote de vuelos (columnas en el orden de ``_FIELDS``) a ``digests``.
+
+    Los retrasos se agrupan por clave con NumPy y cada grupo se añade al
+    digest de su (dimensión, código, mes, medida).
+    """
+    months = np.array(columns[2], dtype=np.int64) * 12 + np.array(columns[3], dtype=np.int64) - 1
+    for d, dimension in enumerate(DIMENSIONS):
+        codes, code_ids = np.unique(np.array(columns[d], dtype=str), return_inverse=True)
+        keys = code_ids.reshape(-1).astype(np.int64) * 1000000 + months
+        for m, measure in enumerate(MEASURES):
+            values = np.array(columns[4 + m], dtype=np.float64)
+            known = ~np.isnan(values)
+            group_keys, group_values = keys[known], values[known]
+            order = np.argsort(group_keys, kind='stable')
+            group_keys, group_values = group_keys[order], group_values[order]
+            starts = np.flatnonzero(np.r_[True, group_keys[1:] != group_keys[:-1]]) if len(group_keys) else []
+            for start, end in zip(starts, list(starts[1:]) + [len(group_keys)]):
+                key = int(group_keys[start])
+                month_index = key % 1000000
+                if (month_index // 12, month_index % 12 + 1) in skip_months:
+                    continue
+                sketch_key = (dimension, str(codes[key // 1000000]), month_index // 12, month_index % 12 + 1, measure)
+                digest = digests.get(sketch_key)
+                if digest is None:
+                    digest = digests[sketch_key] = TDigest(compression)
+                digest.update(group_values[start:end])
+
+
+def apply_sketches(rows):
+    """Añade los retrasos de vuelos recién insertados como deltas.
+
+    Cada (dimensión, código, mes, medida) presente en el lote recibe una fila
+    nueva con el digest de sus valores; no se leen ni modifican filas
+    existentes, así que varios workers pueden insertar a la vez. Debe
+    llamarse en la transacción del INSERT de los vuelos (``apply_flights``).
+    """
+    digests = {}
+    _add_batch(digests, [[row.get(f) for row in rows] for f in _FIELDS], _compression())
+    if not digests:
+        return
+    db.session.execute(insert(DelaySketch.__table__), _sketch_rows(digests))
+    store = current_app.extensions.get('delay_sketches')
+    if store is not None:
+        store.mark_stale()
+
+
+def _replace_all(digests, keep_months=()):
+    table = DelaySketch.__table__
+    stmt = delete(table)
+    if keep_months:
+        stmt = stmt.where(~in_months(table, keep_months))
+    db.session.execute(stmt)
+    params = _sketch_rows(digests)
+    for start in range(0, len(params), _WRITE_CHUNK):
+        db.session.execute(insert(table), params[start:start + _WRITE_CHUNK])
+
+
+def rebuild_sketches(batch_size=200000):
+    """Recalcula todos los sketches desde flights en una sola pasada.
+
+    Los vuelos se leen en lotes con un cursor del lado del servidor y cada
+    lote se añade a los digests con ``_add_batch``. Los sketches de los
+    meses archivados se conservan. Devuelve el número de sketches escritos.
+    """
+    compression = _compression()
+    archived = set(archived_months())
+    digests = {}
+    for rows in iter_flight_batches({}, _FIELDS, batch_size):
+        _add_batch(digests, list(zip(*rows)), compression, archived)
+    _replace_all(digests, sorted(archived))
+    db.session.commit()
+    return len(digests)
+
+
+def compact_sketches():
+    """Fusiona los deltas de cada clave en una sola fila.
+
+    Se borran exactamente las filas leídas (por id), así que los deltas que
+    se confirmen mientras tanto se conservan. Devuelve ``(filas leídas,
+    filas escritas)``; ``(0, 0)`` si otro proceso las compactó antes.
+    """
+    table = DelaySketch.__table__
+    compression = _compression()
+    digests, ids = {}, []
+    for row in db.session.execute(select(table)):
+        ids.append(row.id)
+        key = (row.dimension, row.code, row.year, row.month, row.measure)
+        digest = TDigest.from_bytes(row.digest, compression)
+        if key in digests:
+            digests[key].merge(digest)
+        else:
+            digests[key] = digest
+    deleted = 0
+    for start in range(0, len(ids), _WRITE_CHUNK):
+        deleted += db.session.execute(delete(table).where(table.c.id.in_(ids[start:start + _WRITE_CHUNK]))).rowcount
+    if deleted != len(ids):
+        # Otro proceso compactó las mismas filas a la vez: se descarta esta
+        # compactación para no duplicar sus valores
+        db.session.rollback()
+        return 0, 0
+    params = _sketch_rows(digests)
+    for start in range(0, len(params), _WRITE_CHUNK):
+        db.session.execute(insert(table), params[start:start + _WRITE_CHUNK])
+    db.session.commit()
+    return len(ids), len(params)
+
+
+def delete_month_sketches(year, month):
+    """Borra los sketches de un mes (tras eliminar sus vuelos)."""
+    table = DelaySketch.__table__
+    db.session.execute(delete(table).where(table.c.year == year, table.c.month == month))
+    db.session.commit()
+
+
+class SketchStore:
+    """Sketches del proceso en memoria, al día con la tabla delay_sketches.
+
+    Cada refresco lee sólo las filas con id mayor que la última vista. Si
+    cambia el número de filas ya vistas (compactación, reconstrucción,
+    borrado de un mes o una transacción confirmada tarde con un id menor)
+    se recarga todo.
+
+    Cuando las filas superan ``compact_deltas`` veces el número de claves se
+    compactan en un hilo en segundo plano, de modo que la tabla y las
+    recargas no crecen con el número de inserciones.
+    """
+
+    def __init__(self, app, compression, refresh_interval, compact_deltas):
+        self.app = app
+        self.compression = compression
+        self.refresh_interval = refresh_interval
+        self.compact_deltas = compact_deltas
+        self._compacting = None
+        self._lock = threading.Lock()
+        # (dimension, code) -> {(year, month, measure): TDigest}
+        self._sketches = {}
+        self._last_id = 0
+        self._seen = 0
+        self._checked_at = None
+
+    def mark_stale(self):
+        self._checked_at = None
+
+    def _refresh(self):
+        table = DelaySketch.__table__
+        seen = db.session.execute(select(func.count()).where(table.c.id <= self._last_id)).scalar()
+        if seen != self._seen:
+            self._sketches, self._last_id, self._seen = {}, 0, 0
+        stmt = select(table).where(table.c.id > self._last_id).order_by(table.c.id)
+        for row in db.session.execute(stmt):
+            months = self._sketches.setdefault((row.dimension, row.code), {})
+            key = (row.year, row.month, row.measure)
+            digest = TDigest.from_bytes(row.digest, self.compression)
+            if key in months:
+                months[key].merge(digest)
+            else:
+                months[key] = digest
+            self._last_id = row.id
+            self._seen += 1
+        self._checked_at = time.monotonic()
+        keys = sum(len(months) for months in self._sketches.values())
+        if self.compact_deltas and self._seen > self.compact_deltas * keys:
+            self._compact_in_background()
+
+    def _compact_in_background(self):
+        if self._compacting is not None and self._compacting.is_alive():
+            return
+        self._compacting = threading.Thread(target=self._compact, name='sketches-compact', daemon=True)
+        self._compacting.start()
+
+    def _compact(self):
+        try:
+            with self.app.app_context():
+                read, written = compact_sketches()
+            if read:
+                self.app.logger.info(f'Sketches compactados: {read} filas en {written}')
+                self.mark_stale()
+        except Exception as e:
+            self.app.logger.error(f'Error al compactar los sketches: {str(e)}')
+
+    def percentiles(self, dimension, codes=None, months=None, quantiles=(0.5, 0.9, 0.99), merge=False):
+        """Percentiles de retraso por código (o de todos juntos con ``merge``).
+
+        ``months`` es un predicado ``(year, month) -> bool``. Los digests de
+        los meses y códigos seleccionados se fusionan en el momento; el coste
+        depende del número de sketches, no del de vuelos.
+        """
+        with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at >= self.refresh_interval:
+                self._refresh()
+            groups = {}
+            for (dim, code), sketches in self._sketches.items():
+                if dim != dimension or (codes and code not in codes):
+                    continue
+                for (year, month, measure), digest in sketches.items():
+                    if months is None or months(year, month):
+                        groups.setdefault(None if merge else code, {}).setdefault(measure, []).append(digest)
+
+            if merge and not groups:
+                groups[None] = {}
+            result = []
+            for code, measures in sorted(groups.items(), key=lambda item: item[0] or ''):
+                item = {} if merge else {dimension: code}
+                for measure in MEASURES:
+                    digest = TDigest(self.compression)
+                    for part in measures.get(measure, []):
+                        digest.merge(part)
+                    values = digest.quantiles(quantiles)
+                    item[measure] = {
+                        'count': digest.count,
+                        'min': digest.min if digest.count else None,
+                        'max': digest.max if digest.count else None,
+                        'percentiles': {f'p{q * 100:g}': v for q, v in zip(quantiles, values)},
+                    }
+                result.append(item)
+            return result
+
+
+_init_lock = threading.Lock()
+
+
+def get_sketch_store():
+    """Almacén de sketches de la aplicación actual (se crea en cada worker)."""
+    app = current_app._get_current_object()
+    store = app.extensions.get('delay_sketches')
+    if store is None:
+        with _init_lock:
+            store = app.extensions.get('delay_sketches')
+            if store is None:
+                store = SketchStore(app, app.config['SKETCH_COMPRESSION'], app.config['SKETCH_REFRESH_INTERVAL'],
+                                    app.config['SKETCH_COMPACT_DELTAS'])
+                app.extensions['delay_sketches'] = store
+    return store
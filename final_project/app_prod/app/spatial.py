@@ -0,0 +1,160 @@
+# app/spatial.py
+
+import threading
+import time
+import numpy as np
+from flask import current_app
+from app.models import Airport
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Distancia de gran círculo (km) de un punto a un array de puntos, vectorizada."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    lats = np.radians(lats)
+    lons = np.radians(lons)
+    a = (np.sin((lats - lat) / 2.0) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class AirportIndex:
+    """Índice espacial en memoria de aeropuertos sobre una rejilla lat/lon.
+
+    Los aeropuertos se ordenan por celda (fila de latitud * columnas + columna
+    de longitud), de modo que cada fila de la rejilla que toca una consulta es
+    un rango contiguo que se localiza con ``np.searchsorted``. Las distancias
+    exactas se calculan después con haversine vectorizado sólo sobre los
+    candidatos.
+    """
+
+    def __init__(self, airports, cell_degrees=1.0):
+        self.cell = float(cell_degrees)
+        self.rows = int(np.ceil(180.0 / self.cell))
+        self.cols = int(np.ceil(360.0 / self.cell))
+
+        lats = np.array([a['latitude'] for a in airports], dtype=np.float64)
+        lons = np.array([a['longitude'] for a in airports], dtype=np.float64)
+        cells = self._row(lats) * self.cols + self._col(lons)
+        order = np.argsort(cells, kind='stable')
+
+        self.airports = [airports[i] for i in order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.cells = cells[order]
+
+    def __len__(self):
+        return len(self.airports)
+
+    def _row(self, lats):
+        return np.clip(((np.asarray(lats) + 90.0) // self.cell).astype(np.int64), 0, self.rows - 1)
+
+    def _col(self, lons):
+        return np.clip(((np.asarray(lons) + 180.0) // self.cell).astype(np.int64), 0, self.cols - 1)
+
+    def _candidates(self, lat, lon, radius_km):
+        """Índices de los aeropuertos en las celdas que pueden estar a <= radius_km."""
+        dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        lat_min, lat_max = lat - dlat, lat + dlat
+        cos_lat = np.cos(np.radians(max(abs(lat_min), abs(lat_max))))
+        # Cerca de los polos (o con radios enormes) la banda cubre todas las longitudes
+        if lat_min <= -90.0 or lat_max >= 90.0 or cos_lat < 1e-6:
+            dlon = 180.0
+        else:
+            dlon = min(180.0, dlat / cos_lat)
+
+        rows = np.arange(self._row(max(lat_min, -90.0)), self._row(min(lat_max, 90.0)) + 1)
+        if dlon >= 180.0:
+            ranges = [(0, self.cols - 1)]
+        else:
+            c0 = int(self._col(((lon - dlon + 180.0) % 360.0) - 180.0))
+            c1 = int(self._col(((lon + dlon + 180.0) % 360.0) - 180.0))
+            # La ventana puede cruzar el antimeridiano
+            ranges = [(c0, c1)] if c0 <= c1 else [(c0, self.cols - 1), (0, c1)]
+
+        slices = []
+        for first, last in ranges:
+            starts = np.searchsorted(self.cells, rows * self.cols + first, side='left')
+            ends = np.searchsorted(self.cells, rows * self.cols + last, side='right')
+            slices.extend(np.arange(s, e) for s, e in zip(starts, ends) if e > s)
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def within(self, lat, lon, radius_km, limit=None):
+        """Aeropuertos a ``radius_km`` o menos, ordenados por distancia."""
+        candidates = self._candidates(lat, lon, radius_km)
+        if candidates.size == 0:
+            return []
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        mask = distances <= radius_km
+        candidates, distances = candidates[mask], distances[mask]
+        order = np.argsort(distances, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return [(self.airports[candidates[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lat, lon, k):
+        """Los ``k`` aeropuertos más cercanos.
+
+        Se busca con un radio creciente: en cuanto hay al menos ``k`` aeropuertos
+        dentro del radio, los ``k`` más cercanos están necesariamente entre ellos.
+        """
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        radius = self.cell * 111.0
+        max_radius = np.pi * EARTH_RADIUS_KM
+        while True:
+            candidates = self._candidates(lat, lon, radius)
+            if candidates.size >= k or radius >= max_radius:
+                distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+                inside = distances <= radius
+                if inside.sum() >= k or radius >= max_radius:
+                    top = np.argsort(distances, kind='stable')[:k]
+                    return [(self.airports[candidates[i]], float(distances[i])) for i in top]
+            radius = min(radius * 2.0, max_radius)
+
+
+_lock = threading.Lock()
+_state = {'index': None, 'built_at': 0.0}
+
+
+def airport_to_dict(a):
+    return {
+        'iata_code': a.iata_code,
+        'airport': a.airport,
+        'city': a.city,
+        'state': a.state,
+        'country': a.country,
+        'latitude': a.latitude,
+        'longitude': a.longitude
+    }
+
+
+def get_airport_index():
+    """Devuelve el índice, construyéndolo desde la tabla airports si hace falta.
+
+    Se reconstruye tras un POST en este proceso y, como red de seguridad para
+    los cambios hechos por otros workers, cuando supera REFERENCE_CACHE_TTL.
+    """
+    ttl = current_app.config['REFERENCE_CACHE_TTL']
+    index = _state['index']
+    if index is not None and (not ttl or time.monotonic() - _state['built_at'] < ttl):
+        return index
+    with _lock:
+        index = _state['index']
+        if index is not None and (not ttl or time.monotonic() - _state['built_at'] < ttl):
+            return index
+        airports = [airport_to_dict(a) for a in Airport.query.all()]
+        index = AirportIndex(airports, current_app.config['AIRPORT_GRID_DEGREES'])
+        _state['index'] = index
+        _state['built_at'] = time.monotonic()
+        return index
+
+
+def invalidate_airport_index():
+    with _lock:
+        _state['index'] = None
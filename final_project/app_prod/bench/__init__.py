@@ -0,0 +1,3 @@
+# bench/__init__.py
+
+# Suite de benchmarks: datos sintéticos (datagen) y ejecución (run_bench)
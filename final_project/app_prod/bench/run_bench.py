@@ -0,0 +1,345 @@
+# bench/run_bench.py
+
+"""Benchmark de la API sobre una base de datos SQLite local con datos sintéticos.
+
+Uso (desde final_project/app_prod):
+
+    python -m bench.run_bench --flights 1000000
+    python -m bench.run_bench --save-baseline bench/baseline.json
+    python -m bench.run_bench --baseline bench/baseline.json
+
+Los resultados (filas/s, latencias p50/p99, pico de RSS y tiempo de arranque
+en frío de manage.py) se escriben en JSON.
+Con ``--baseline`` se comparan con una ejecución anterior y el proceso
+termina con código 1 si alguna métrica empeora más que ``--tolerance``.
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import time
+from time import perf_counter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo devuelve en KB y macOS en bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+# Funciones que cuentan las filas devueltas por cada tipo de respuesta
+def _count_json_list(resp, data):
+    return len(json.loads(data))
+
+
+def _count_page(resp, data):
+    return len(json.loads(data)['flights'])
+
+
+def _count_csv(resp, data):
+    if resp.headers.get('Content-Encoding') == 'gzip':
+        data = gzip.decompress(data)
+    return max(0, data.count(b'\n') - 1)
+
+
+def _count_parquet(resp, data):
+    import pyarrow.parquet as pq
+    return pq.ParquetFile(io.BytesIO(data)).metadata.num_rows
+
+
+def _count_arrow(resp, data):
+    import pyarrow as pa
+    return pa.ipc.open_stream(data).read_all().num_rows
+
+
+def _count_bulk(resp, data):
+    return json.loads(data)['inserted']
+
+
+def _count_one(resp, data):
+    return 1
+
+
+def _count_stats(resp, data):
+    return len(json.loads(data))
+
+
+def _flight_payloads(seed):
+    """Genera cuerpos para POST /api/flights y /api/flights/bulk."""
+    from bench.datagen import AIRLINES, HUBS, iter_flights
+
+    airports = [dict(iata_code=c, latitude=lat, longitude=lon) for c, _, _, _, lat, lon in HUBS]
+    rng = random.Random(seed)
+
+    def one():
+        row = next(iter_flights(rng, 1, AIRLINES, airports))
+        return json.dumps({k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in row.items()})
+
+    def ndjson(count):
+        def build():
+            lines = (json.dumps({k: (v.isoformat() if hasattr(v, 'isoformat') else v) for k, v in row.items()})
+                     for row in iter_flights(rng, count, AIRLINES, airports))
+            return ('\n'.join(lines) + '\n').encode('utf-8')
+        return build
+
+    return one, ndjson
+
+
+def scenarios(columnar, bulk_rows):
+    one_flight, ndjson = _flight_payloads(7)
+    items = [
+        dict(name='index', path='/', count=_count_one),
+        dict(name='airlines_list', path='/api/airlines', count=_count_json_list),
+        dict(name='airlines_list_304', path='/api/airlines', count=_count_one, etag=True, status=304),
+        dict(name='airlines_download', path='/api/airlines/download', count=_count_csv),
+        dict(name='airports_list', path='/api/airports', count=_count_json_list),
+        dict(name='airports_download', path='/api/airports/download', count=_count_csv),
+        dict(name='flights_page', path='/api/flights?limit=1000', count=_count_page),
+        dict(name='flights_page_deep', path='/api/flights?limit=1000&after=500000', count=_count_page),
+        dict(name='flights_filtered', path='/api/flights?airline=DL&origin_airport=ATL&month=6&limit=1000',
+             count=_count_page),
+        dict(name='flights_projection', path='/api/flights?fields=airline,departure_delay&limit=1000',
+             count=_count_page),
+        dict(name='flights_post', path='/api/flights', method='POST', json=one_flight, count=_count_one,
+             status=201),
+        dict(name='flights_bulk_ndjson', path='/api/flights/bulk', method='POST', data=ndjson(bulk_rows),
+             content_type='application/x-ndjson', count=_count_bulk, iterations=3),
+        # Carga grande con el lote máximo: los agregados y sketches se
+        # actualizan una vez por lote, así que mide el techo de ingesta
+        dict(name='flights_bulk_ndjson_large', path='/api/flights/bulk?batch_size=50000', method='POST',
+             data=ndjson(bulk_rows * 5), content_type='application/x-ndjson', count=_count_bulk, iterations=1),
+        dict(name='stats_airlines', path='/api/flights/stats/airlines', count=_count_stats),
+        dict(name='stats_airports', path='/api/flights/stats/airports?month=1', count=_count_stats),
+        dict(name='stats_daily', path='/api/flights/stats/daily?airline=AA', count=_count_stats),
+        dict(name='download_csv_month', path='/api/flights/download?month=1', count=_count_csv, iterations=3),
+        dict(name='download_csv_gzip_month', path='/api/flights/download?month=1', count=_count_csv,
+             headers={'Accept-Encoding': 'gzip'}, iterations=3),
+        dict(name='download_csv_full', path='/api/flights/download', count=_count_csv, iterations=1),
+        dict(name='metrics', path='/metrics', count=_count_one),
+        dict(name='apispec', path='/apispec.json', count=_count_one),
+    ]
+    if columnar:
+        items += [
+            dict(name='download_parquet_month', path='/api/flights/download?format=parquet&month=1',
+                 count=_count_parquet, iterations=3),
+            dict(name='download_arrow_month', path='/api/flights/download?format=arrow&month=1',
+                 count=_count_arrow, iterations=3),
+        ]
+    return items
+
+
+def run_scenario(client, scenario, iterations, warmup):
+    iterations = scenario.get('iterations', iterations)
+    warmup = min(warmup, iterations)
+    expected = scenario.get('status', 200)
+    headers = dict(scenario.get('headers', {}))
+    if scenario.get('etag'):
+        headers['If-None-Match'] = client.get(scenario['path']).headers['ETag']
+
+    latencies = []
+    rows = 0
+    size = 0
+    for i in range(warmup + iterations):
+        kwargs = {'headers': headers, 'method': scenario.get('method', 'GET')}
+        if 'json' in scenario:
+            kwargs['data'] = scenario['json']()
+            kwargs['content_type'] = 'application/json'
+        elif 'data' in scenario:
+            kwargs['data'] = scenario['data']()
+            kwargs['content_type'] = scenario['content_type']
+
+        start = perf_counter()
+        resp = client.open(scenario['path'], **kwargs)
+        data = resp.get_data()
+        resp.close()
+        elapsed = perf_counter() - start
+
+        if resp.status_code != expected:
+            raise RuntimeError(f"{scenario['name']}: estado {resp.status_code} (se esperaba {expected}): {data[:200]!r}")
+        if i >= warmup:
+            latencies.append(elapsed)
+            rows += scenario['count'](resp, data)
+            size += len(data)
+
+    total = sum(latencies)
+    return {
+        'iterations': len(latencies),
+        'rows': rows,
+        'bytes': size,
+        'mean_ms': total / len(latencies) * 1000,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'rows_per_sec': rows / total if total else None,
+        'bytes_per_sec': size / total if total else None,
+        'peak_rss_bytes': _peak_rss_bytes(),
+    }
+
+
+# Arranque en frío: importar manage.py (create_app) y atender la primera petición
+STARTUP_CODE = "import manage; manage.app.test_client().get('/api/airlines').close()"
+
+
+def measure_startup(runs):
+    """Mide el tiempo desde lanzar el intérprete hasta la primera respuesta."""
+    app_dir = os.path.dirname(BENCH_DIR)
+    latencies = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run([sys.executable, '-c', STARTUP_CODE], cwd=app_dir, env=os.environ.copy(),
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        latencies.append(perf_counter() - start)
+    return {
+        'iterations': runs,
+        'rows': 0,
+        'bytes': 0,
+        'mean_ms': sum(latencies) / runs * 1000,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'rows_per_sec': None,
+        'bytes_per_sec': None,
+        'peak_rss_bytes': None,
+    }
+
+
+# Métricas comparadas con la línea base: (clave, True si más alto es peor)
+COMPARED = [('p50_ms', True), ('p99_ms', True), ('rows_per_sec', False)]
+
+
+def compare(results, baseline, tolerance):
+    """Devuelve la lista de regresiones respecto a la línea base."""
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for key, higher_is_worse in COMPARED:
+            old, new = previous.get(key), current.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append({'scenario': name, 'metric': key, 'baseline': old,
+                                    'current': new, 'change': change})
+    return regressions
+
+
+def _flight_count(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with sqlite3.connect(path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM flights').fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de la API de vuelos')
+    parser.add_argument('--db', default=os.path.join(BENCH_DIR, 'bench.db'), help='Fichero SQLite')
+    parser.add_argument('--flights', type=int, default=1000000, help='Vuelos sintéticos a generar')
+    parser.add_argument('--airports', type=int, default=300, help='Aeropuertos sintéticos a generar')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--regenerate', action='store_true', help='Regenerar la base de datos aunque exista')
+    parser.add_argument('--iterations', type=int, default=20, help='Iteraciones por escenario')
+    parser.add_argument('--warmup', type=int, default=2, help='Iteraciones de calentamiento por escenario')
+    parser.add_argument('--bulk-rows', type=int, default=20000, help='Filas por petición de carga masiva')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='Arranques en frío de manage.py a medir (0 para omitir)')
+    parser.add_argument('--only', help='Ejecutar sólo los escenarios indicados (separados por comas)')
+    parser.add_argument('--output', default=os.path.join(BENCH_DIR, 'results.json'))
+    parser.add_argument('--baseline', help='Fichero JSON con resultados previos para comparar')
+    parser.add_argument('--save-baseline', help='Guardar además los resultados como línea base')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Empeoramiento relativo admitido antes de marcar una regresión')
+    args = parser.parse_args(argv)
+
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.db)}'
+
+    from app import create_app
+    from bench.datagen import generate
+
+    # Generar los datos sólo si hace falta: los escritos por ejecuciones
+    # anteriores (POST y carga masiva) se descartan al regenerar
+    existing = _flight_count(args.db)
+    regenerate = args.regenerate or existing is None or existing < args.flights
+    app = create_app()
+    app.logger.setLevel('WARNING')
+    if regenerate:
+        print(f'Generando {args.flights} vuelos en {args.db}...')
+        start = perf_counter()
+        with app.app_context():
+            generate(args.flights, airports=args.airports, seed=args.seed)
+        print(f'Datos generados en {perf_counter() - start:.1f}s')
+
+    try:
+        import pyarrow  # noqa: F401
+        columnar = True
+    except ImportError:
+        columnar = False
+
+    selected = set(args.only.split(',')) if args.only else None
+    client = app.test_client()
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'flights': _flight_count(args.db),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+        },
+        'results': {},
+    }
+    for scenario in scenarios(columnar, args.bulk_rows):
+        if selected and scenario['name'] not in selected:
+            continue
+        result = run_scenario(client, scenario, args.iterations, args.warmup)
+        results['results'][scenario['name']] = result
+        rows_per_sec = f"{result['rows_per_sec']:.0f}" if result['rows_per_sec'] else '-'
+        print(f"{scenario['name']:<26} p50={result['p50_ms']:9.2f}ms p99={result['p99_ms']:9.2f}ms "
+              f"filas/s={rows_per_sec:>10} rss={result['peak_rss_bytes'] / 2 ** 20:.0f}MB")
+
+    if args.startup_runs and (not selected or 'cold_start' in selected):
+        result = measure_startup(args.startup_runs)
+        results['results']['cold_start'] = result
+        print(f"{'cold_start':<26} p50={result['p50_ms']:9.2f}ms p99={result['p99_ms']:9.2f}ms")
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        results['regressions'] = regressions
+        for r in regressions:
+            print(f"REGRESIÓN {r['scenario']} {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} "
+                  f"({r['change']:+.0%})")
+        if regressions:
+            exit_code = 1
+        else:
+            print('Sin regresiones respecto a la línea base')
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+    print(f'Resultados guardados en {args.output}')
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
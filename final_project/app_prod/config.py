@@ -2,6 +2,35 @@
 
 import os
 
+
+def engine_options(uri):
+    """Opciones del engine de SQLAlchemy (pool de conexiones) según el entorno."""
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        # Segundos tras los que se recicla una conexión (menor que wait_timeout de MySQL)
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True').lower() in ['true', '1', 't'],
+        # Segundos de espera por una conexión libre del pool
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    }
+    if uri.startswith('mysql'):
+        options['connect_args'] = {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 10)),
+            'read_timeout': int(os.getenv('DB_READ_TIMEOUT', 600)),
+            'write_timeout': int(os.getenv('DB_WRITE_TIMEOUT', 600)),
+        }
+    return options
+
+
+def replica_binds(uris):
+    """SQLALCHEMY_BINDS de las réplicas de lectura (``replica_0``, ``replica_1``...)."""
+    return {
+        f'replica_{i}': {'url': uri, **engine_options(uri)}
+        for i, uri in enumerate(u.strip() for u in uris.split(',') if u.strip())
+    }
+
+
 class Config:
     # Cargar variables de entorno
     SECRET_KEY = os.getenv('SECRET_KEY')
@@ -10,8 +39,167 @@ class Config:
     DB_HOST = os.getenv('DB_HOST')
     DB_NAME = os.getenv('DB_NAME')
     DB_PORT = os.getenv('DB_PORT', '3306')
-    SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # DATABASE_URL permite usar otra base de datos (p. ej. SQLite local para benchmarks)
+    SQLALCHEMY_DATABASE_URI = os.getenv(
+        'DATABASE_URL',
+        f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+
+    # Réplicas de lectura (URLs separadas por comas): los GET de la API y las
+    # exportaciones se reparten entre ellas; las escrituras van al primario
+    SQLALCHEMY_BINDS = replica_binds(os.getenv('DATABASE_REPLICA_URLS', ''))
+    # Segundos que una réplica caída queda fuera del reparto antes de reintentarla
+    REPLICA_RETRY_INTERVAL = int(os.getenv('REPLICA_RETRY_INTERVAL', 30))
+    # Segundos tras una escritura en los que el mismo cliente lee del primario
+    # (cookie); 0 lo desactiva
+    READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 0))
+
+    # Conexiones del pool que abre cada worker al arrancar (gunicorn.conf.py)
+    DB_WARMUP_CONNECTIONS = int(os.getenv('DB_WARMUP_CONNECTIONS', 4))
+
+    # Instrumentación por petición (cabecera Server-Timing y endpoint /metrics)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() in ['true', '1', 't']
+
+    # Segundos que se conservan en caché las listas de aerolíneas/aeropuertos
+    # (se invalidan además en cada POST)
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 300))
+    # Segundos mínimos entre recargas de aerolíneas/aeropuertos provocadas por
+    # códigos desconocidos en las validaciones (creados por otro worker)
+    DIMENSIONS_RELOAD_INTERVAL = float(os.getenv('DIMENSIONS_RELOAD_INTERVAL', 5))
+
+    # Filas admitidas por petición en POST /api/airlines/bulk y /api/airports/bulk
+    REFERENCE_BULK_MAX_ROWS = int(os.getenv('REFERENCE_BULK_MAX_ROWS', 100000))
+
+    # Tamaño (grados) de las celdas del índice espacial de aeropuertos
+    AIRPORT_GRID_DEGREES = float(os.getenv('AIRPORT_GRID_DEGREES', 1.0))
+
+    # Estadísticas por ruta (GET /api/flights/stats/routes): filas por lote
+    # leídas del cursor y resultados distintos que se conservan en caché
+    ROUTE_STATS_BATCH_SIZE = int(os.getenv('ROUTE_STATS_BATCH_SIZE', 200000))
+    ROUTE_STATS_CACHE_ENTRIES = int(os.getenv('ROUTE_STATS_CACHE_ENTRIES', 64))
+
+    # Percentiles de retraso (GET /api/flights/stats/percentiles): compresión
+    # de los t-digest (más centroides = más precisión) y segundos entre
+    # lecturas de los deltas nuevos desde la base de datos
+    SKETCH_COMPRESSION = int(os.getenv('SKETCH_COMPRESSION', 200))
+    SKETCH_REFRESH_INTERVAL = float(os.getenv('SKETCH_REFRESH_INTERVAL', 5))
+    # Filas de delay_sketches por clave (media) a partir de las que se
+    # compactan automáticamente los deltas de las inserciones; 0 lo desactiva
+    SKETCH_COMPACT_DELTAS = int(os.getenv('SKETCH_COMPACT_DELTAS', 4))
+
+    # Snapshot columnar de flights para las agregaciones (/stats/routes y
+    # /stats/aggregate): arrays de NumPy en COLUMNAR_DIR que los workers del
+    # host comparten con mmap. Se refresca en segundo plano por id cada
+    # COLUMNAR_REFRESH_INTERVAL segundos, así que las respuestas pueden ir
+    # ese tiempo por detrás de la base de datos
+    COLUMNAR_ENABLED = os.getenv('COLUMNAR_ENABLED', 'False').lower() in ['true', '1', 't']
+    COLUMNAR_DIR = os.getenv('COLUMNAR_DIR', 'columnar')
+    COLUMNAR_REFRESH_INTERVAL = float(os.getenv('COLUMNAR_REFRESH_INTERVAL', 10))
+    # Filas por segmento, segmentos a partir de los que se fusionan los
+    # pequeños y filas por lote leídas de la base de datos
+    COLUMNAR_SEGMENT_ROWS = int(os.getenv('COLUMNAR_SEGMENT_ROWS', 1000000))
+    COLUMNAR_MAX_SEGMENTS = int(os.getenv('COLUMNAR_MAX_SEGMENTS', 16))
+    COLUMNAR_BATCH_SIZE = int(os.getenv('COLUMNAR_BATCH_SIZE', 200000))
+
+    # Particionado de flights por mes (ver 'flask partitions'): nativo en MySQL,
+    # una tabla por mes en SQLite
+    FLIGHTS_PARTITIONED = os.getenv('FLIGHTS_PARTITIONED', 'False').lower() in ['true', '1', 't']
+
+    # Paginación de GET /api/flights
+    FLIGHTS_PAGE_SIZE = int(os.getenv('FLIGHTS_PAGE_SIZE', 100))
+    FLIGHTS_MAX_PAGE_SIZE = int(os.getenv('FLIGHTS_MAX_PAGE_SIZE', 1000))
+
+    # Caché de resultados de GET /api/flights y /api/flights/download:
+    # backend 'memory' (por proceso), 'sqlite' (fichero FLIGHT_CACHE_PATH
+    # compartido por los workers del host) o 'paquete.modulo:Clase'.
+    # gunicorn.conf.py usa 'sqlite' por defecto con más de un worker. Con
+    # 'memory' y varios procesos, una escritura sólo invalida la caché del
+    # proceso que la atiende: los demás pueden servir páginas sin los vuelos
+    # nuevos durante FLIGHT_CACHE_TTL segundos. Entre hosts distintos pasa
+    # lo mismo con 'sqlite' (usar un backend propio compartido)
+    FLIGHT_CACHE_ENABLED = os.getenv('FLIGHT_CACHE_ENABLED', 'True').lower() in ['true', '1', 't']
+    FLIGHT_CACHE_BACKEND = os.getenv('FLIGHT_CACHE_BACKEND', 'memory')
+    FLIGHT_CACHE_PATH = os.getenv('FLIGHT_CACHE_PATH', 'cache/flights.sqlite')
+    FLIGHT_CACHE_TTL = int(os.getenv('FLIGHT_CACHE_TTL', 60))
+    FLIGHT_CACHE_MAX_BYTES = int(os.getenv('FLIGHT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    FLIGHT_CACHE_MAX_ENTRY_BYTES = int(os.getenv('FLIGHT_CACHE_MAX_ENTRY_BYTES', 4 * 1024 * 1024))
+
+    # Filas por lote de las respuestas JSON/NDJSON en streaming
+    JSON_STREAM_BATCH_SIZE = int(os.getenv('JSON_STREAM_BATCH_SIZE', 1000))
+
+    # Carga masiva (POST /api/flights/bulk). Los agregados y sketches se
+    # actualizan una vez por lote, así que lotes grandes los abaratan
+    FLIGHTS_BULK_BATCH_SIZE = int(os.getenv('FLIGHTS_BULK_BATCH_SIZE', 20000))
+    FLIGHTS_BULK_MAX_BATCH_SIZE = int(os.getenv('FLIGHTS_BULK_MAX_BATCH_SIZE', 50000))
+    FLIGHTS_BULK_MAX_ERRORS = int(os.getenv('FLIGHTS_BULK_MAX_ERRORS', 100))
+
+    # Feed de vuelos nuevos (GET /api/flights/feed): segundos entre consultas
+    # de max(id) para ver inserciones de otros procesos (las de este proceso
+    # despiertan al instante), espera máxima del long-poll, duración de cada
+    # conexión SSE, intervalo de keepalive y vuelos por lote
+    FEED_POLL_INTERVAL = float(os.getenv('FEED_POLL_INTERVAL', 1.0))
+    FEED_LONG_POLL_TIMEOUT = int(os.getenv('FEED_LONG_POLL_TIMEOUT', 25))
+    FEED_SSE_MAX_SECONDS = int(os.getenv('FEED_SSE_MAX_SECONDS', 300))
+    FEED_HEARTBEAT_SECONDS = int(os.getenv('FEED_HEARTBEAT_SECONDS', 15))
+    FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', 1000))
+    # Segundos que el feed espera a que aparezca un id no visible por debajo
+    # del último confirmado (transacción aún abierta, p. ej. en MySQL) antes
+    # de darlo por revertido y seguir; debe superar la duración de un lote
+    # de la carga masiva
+    FEED_GAP_GRACE = float(os.getenv('FEED_GAP_GRACE', 10))
+
+    # Control de admisión de las rutas pesadas de /api/flights (por proceso):
+    # grupo -> (peticiones simultáneas, peticiones en cola). 'export' son las
+    # descargas y los GET en streaming, 'list' las páginas sin filtros
+    # selectivos, 'analytics' /stats/routes y /stats/aggregate, 'bulk' las
+    # cargas masivas y 'feed' el feed de cambios
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() in ['true', '1', 't']
+    ADMISSION_LIMITS = {
+        'export': (int(os.getenv('EXPORT_MAX_CONCURRENT', 1)), int(os.getenv('EXPORT_MAX_QUEUED', 1))),
+        'list': (int(os.getenv('LIST_MAX_CONCURRENT', 2)), int(os.getenv('LIST_MAX_QUEUED', 2))),
+        'analytics': (int(os.getenv('ANALYTICS_MAX_CONCURRENT', 1)), int(os.getenv('ANALYTICS_MAX_QUEUED', 1))),
+        'bulk': (int(os.getenv('BULK_MAX_CONCURRENT', 1)), int(os.getenv('BULK_MAX_QUEUED', 0))),
+        # Conexiones abiertas del feed (SSE/long-poll) por proceso. Cada una
+        # ocupa un hilo mientras espera, pero no cuenta en ADMISSION_MAX_HEAVY:
+        # gunicorn.conf.py añade FEED_MAX_CONCURRENT hilos a WEB_THREADS para
+        # que no quiten hilos al resto de peticiones
+        'feed': (int(os.getenv('FEED_MAX_CONCURRENT', 32)), int(os.getenv('FEED_MAX_QUEUED', 0))),
+    }
+    # Tope de peticiones pesadas (en curso + en cola) por proceso; debe ser
+    # menor que los hilos del worker (WEB_THREADS) para dejar hilos libres
+    # a las consultas baratas
+    ADMISSION_MAX_HEAVY = int(os.getenv('ADMISSION_MAX_HEAVY', max(1, int(os.getenv('WEB_THREADS', 4)) - 1)))
+    # Segundos máximos de espera en cola y valor de Retry-After en los 503
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 5))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 5))
+    # Límites de tasa por cliente (IP) y grupo: 'grupo=peticiones por segundo/ráfaga'
+    # separados por comas, p. ej. 'export=0.2/3,analytics=1/5'; 429 al superarlos
+    RATE_LIMITS = os.getenv('RATE_LIMITS', '')
+
+    # Exportación de vuelos: filas por lote leídas del cursor y bytes por trozo enviado
+    FLIGHTS_EXPORT_BATCH_SIZE = int(os.getenv('FLIGHTS_EXPORT_BATCH_SIZE', 10000))
+    FLIGHTS_EXPORT_CHUNK_BYTES = int(os.getenv('FLIGHTS_EXPORT_CHUNK_BYTES', 256 * 1024))
+
+    # Exportaciones en segundo plano (POST /api/flights/exports)
+    EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+    EXPORT_WORKERS = int(os.getenv('EXPORT_WORKERS', 2))
+    EXPORT_MAX_PENDING = int(os.getenv('EXPORT_MAX_PENDING', 8))
+    # Segundos que se conservan los ficheros exportados
+    EXPORT_RETENTION = int(os.getenv('EXPORT_RETENTION', 86400))
+    # Segundos entre latidos de los trabajos en cola o en curso; un trabajo
+    # sin latido durante 4 intervalos (o cuyo proceso ya no existe) se da
+    # por perdido y la siguiente petición idéntica lo vuelve a encolar
+    EXPORT_HEARTBEAT_INTERVAL = float(os.getenv('EXPORT_HEARTBEAT_INTERVAL', 10))
+
+    # Crear las tablas en cada arranque (por defecto se usa 'flask init-db')
+    AUTO_CREATE_TABLES = os.getenv('AUTO_CREATE_TABLES', 'False').lower() in ['true', '1', 't']
+
+    # Documentación Swagger; APISPEC_FILE apunta a una especificación
+    # precompilada con 'flask export-apispec' para no construirla en cada worker
+    SWAGGER_ENABLED = os.getenv('SWAGGER_ENABLED', 'True').lower() in ['true', '1', 't']
+    APISPEC_FILE = os.getenv('APISPEC_FILE')
 
     # Configuración de Swagger
     SWAGGER = {
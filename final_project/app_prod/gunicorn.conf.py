@@ -0,0 +1,47 @@
+# gunicorn.conf.py
+
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+# Las variables de .env también valen aquí (y antes de los valores por
+# defecto que se fijan más abajo para la aplicación)
+load_dotenv()
+
+# Servidor de producción: varios procesos con varios hilos cada uno
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# Con varios workers la caché de resultados de vuelos por defecto es la
+# compartida (sqlite): con la de memoria una escritura sólo invalidaría la
+# del worker que la atiende. Se fija antes de cargar la aplicación (config.py)
+if workers > 1:
+    os.environ.setdefault('FLIGHT_CACHE_BACKEND', 'sqlite')
+# Hilos para peticiones normales más uno por conexión del feed de vuelos
+# (FEED_MAX_CONCURRENT, ver config.py): los clientes SSE/long-poll esperan
+# en su propio hilo sin quitar capacidad al resto
+web_threads = int(os.getenv('WEB_THREADS', 4))
+threads = web_threads + int(os.getenv('FEED_MAX_CONCURRENT', 32))
+worker_class = 'gthread'
+
+# Crear la aplicación una sola vez en el proceso maestro y compartirla con los workers
+preload_app = True
+
+# Las descargas de vuelos pueden durar varios minutos
+timeout = int(os.getenv('WEB_TIMEOUT', 300))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('WEB_KEEPALIVE', 5))
+
+# Reiniciar los workers periódicamente para acotar la memoria
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('WEB_LOG_LEVEL', 'info')
+
+
+def post_fork(server, worker):
+    # Cada worker abre sus propias conexiones (no se comparten sockets con el maestro)
+    from app import warm_up
+    from wsgi import app
+    warm_up(app, min(web_threads, app.config['DB_WARMUP_CONNECTIONS']))
@@ -0,0 +1,3 @@
+# tests/__init__.py
+
+# Pruebas automáticas (python -m pytest desde final_project/app_prod)
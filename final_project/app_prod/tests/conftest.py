@@ -0,0 +1,23 @@
+# tests/conftest.py
+
+import os
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """Aplicación sobre una base de datos SQLite vacía con el esquema creado."""
+    directory = tmp_path_factory.mktemp('app')
+    # config.py lee el entorno al importarse (en create_app)
+    os.environ['DATABASE_URL'] = f"sqlite:///{directory / 'flights.db'}"
+    os.environ.setdefault('SWAGGER_ENABLED', 'False')
+    cwd = os.getcwd()
+    os.chdir(directory)  # create_app escribe logs/ en el directorio actual
+    try:
+        from app import create_app, db
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+    finally:
+        os.chdir(cwd)
+    yield app
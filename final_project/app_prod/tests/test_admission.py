@@ -0,0 +1,51 @@
+# tests/test_admission.py
+
+import pytest
+from app.admission import (
+    ConcurrencyLimiter, HeavyGate, NoGate, Overloaded, TokenBuckets, admission_group, parse_rate_limits
+)
+
+
+def test_feed_slots_do_not_use_the_heavy_gate():
+    heavy = HeavyGate(1)
+    export = ConcurrencyLimiter(2, 0, 0.01)
+    feed = ConcurrencyLimiter(32, 0, 0.01)
+    export.acquire(heavy)
+    with pytest.raises(Overloaded):
+        export.acquire(heavy)
+    # Con el tope de pesadas lleno, el feed sigue admitiendo conexiones
+    for _ in range(32):
+        feed.acquire(NoGate())
+    with pytest.raises(Overloaded):
+        feed.acquire(NoGate())
+    assert heavy.count == 1
+
+
+def test_rejected_wait_releases_the_gate():
+    heavy = HeavyGate(2)
+    limiter = ConcurrencyLimiter(1, 1, 0.01)
+    limiter.acquire(heavy)
+    with pytest.raises(Overloaded):
+        limiter.acquire(heavy)
+    assert heavy.count == 1
+
+
+def test_token_buckets():
+    assert parse_rate_limits('export=0.5/2, analytics=1/5') == {'export': (0.5, 2), 'analytics': (1.0, 5)}
+    with pytest.raises(ValueError):
+        parse_rate_limits('export=1')
+    buckets = TokenBuckets(rate=0.001, burst=2)
+    assert buckets.take('a') == 0 and buckets.take('a') == 0
+    assert buckets.take('a') > 0
+    assert buckets.take('b') == 0
+
+
+@pytest.mark.parametrize('accept, group', [
+    ('application/x-ndjson', 'export'),
+    ('application/json, application/x-ndjson;q=0.5', 'list'),
+    ('application/x-ndjson;q=0', 'list'),
+    ('application/json', 'list'),
+])
+def test_admission_follows_content_negotiation(app, accept, group):
+    with app.test_request_context('/api/flights', headers={'Accept': accept}):
+        assert admission_group('flights.handle_flights', 'GET', {}) == group
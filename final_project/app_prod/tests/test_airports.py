@@ -0,0 +1,9 @@
+# tests/test_airports.py
+
+import pytest
+
+
+@pytest.mark.parametrize('radius', ['nan', 'inf', '-inf', '-1', 'x'])
+def test_nearby_rejects_invalid_radius(app, radius):
+    response = app.test_client().get(f'/api/airports/nearby?lat=40&lon=-73&radius_km={radius}')
+    assert response.status_code == 400
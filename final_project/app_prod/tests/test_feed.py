@@ -0,0 +1,33 @@
+# tests/test_feed.py
+
+from app import db
+from app.feed import read_delta
+from app.partitions import flights_table, insert_flights
+
+
+def _flight(flight_id, airline):
+    return {
+        'id': flight_id, 'year': 2015, 'month': 1, 'day': 1, 'day_of_week': 4, 'airline': airline,
+        'flight_number': str(flight_id), 'origin_airport': 'JFK', 'destination_airport': 'LAX',
+        'scheduled_departure': 900, 'departure_time': 905, 'departure_delay': 5,
+    }
+
+
+def test_cursor_waits_for_uncommitted_ids(app):
+    fields = ['id', 'airline']
+    with app.app_context():
+        # El id 3 aún no es visible (otra transacción sin confirmar)
+        insert_flights([_flight(1, 'AA'), _flight(2, 'DL'), _flight(4, 'AA')])
+        db.session.commit()
+        try:
+            flights, cursor, has_more = read_delta(fields, {}, 0, 10, settled=0)
+            assert [f['id'] for f in flights] == [1, 2] and cursor == 2 and not has_more
+            # Con filtros el cursor salta los vuelos que no pasan, pero no el hueco
+            flights, cursor, _ = read_delta(fields, {'airline': ['AA']}, 1, 10, settled=0)
+            assert flights == [] and cursor == 2
+            # Vencido el margen el hueco se da por definitivo
+            flights, cursor, _ = read_delta(fields, {}, 2, 10, settled=4)
+            assert [f['id'] for f in flights] == [4] and cursor == 4
+        finally:
+            db.session.execute(flights_table.delete())
+            db.session.commit()
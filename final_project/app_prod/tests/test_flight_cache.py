@@ -0,0 +1,47 @@
+# tests/test_flight_cache.py
+
+import time
+from app.flight_cache import CachedResult, SQLiteBackend, _overlaps, get_flight_cache, invalidate_flight_cache
+
+
+def test_overlaps_accepts_impossible_dates():
+    scope = {'date_from': '2015-02-01', 'date_to': '2015-02-28'}
+    # 30 de febrero: no se construye un date, sólo se compara el texto
+    assert not _overlaps(scope, {('AA', 'JFK', 2015, 2, 30)})
+    assert _overlaps(scope, {('AA', 'JFK', 2015, 2, 28)})
+
+
+def test_invalidation_failure_falls_back_to_everything(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'FLIGHT_CACHE_ENABLED', True)
+    with app.app_context():
+        cache = get_flight_cache()
+        calls = []
+
+        def invalidate(keys):
+            calls.append(keys)
+            if keys is not None:
+                raise RuntimeError('fallo')
+            return 0
+
+        monkeypatch.setattr(cache.backend, 'invalidate', invalidate)
+        row = {'airline': 'AA', 'origin_airport': 'JFK', 'year': 2015, 'month': 1, 'day': 2}
+        # No lanza: la escritura ya estaba confirmada
+        invalidate_flight_cache([row])
+        assert calls == [{('AA', 'JFK', 2015, 1, 2)}, None]
+
+
+def test_sqlite_hits_only_touch_stale_access_times(app, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, 'FLIGHT_CACHE_PATH', str(tmp_path / 'cache.sqlite'))
+    backend = SQLiteBackend(app)
+    entry = CachedResult(b'[]', 'application/json', {}, {}, '"etag"', time.time())
+    assert backend.set('key', entry, backend.generation())[0]
+    conn = backend._connect()
+    changes = conn.total_changes
+    # Recién guardada: los aciertos no escriben
+    assert backend.get('key').body == b'[]'
+    assert backend.get('key').body == b'[]'
+    assert conn.total_changes == changes
+    conn.execute('UPDATE entries SET accessed = accessed - ?', (backend.touch_interval,))
+    changes = conn.total_changes
+    backend.get('key')
+    assert conn.total_changes == changes + 1
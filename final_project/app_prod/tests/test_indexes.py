@@ -0,0 +1,37 @@
+# tests/test_indexes.py
+
+import pytest
+from sqlalchemy import select
+from app import db
+from app.commands import INDEXED_FILTERS
+from app.partitions import flight_source, page_statement
+from app.queries import FLIGHT_FIELDS, apply_flight_filters, explain_flight_query
+
+
+@pytest.mark.parametrize('name', list(INDEXED_FILTERS))
+def test_filtered_query_uses_index(app, name):
+    # La misma consulta que 'flask check-indexes'
+    filters = INDEXED_FILTERS[name]
+    with app.app_context():
+        source = flight_source(filters)
+        stmt = apply_flight_filters(select(source.c.id), filters, source).order_by(source.c.id).limit(100)
+        uses_index, plan = explain_flight_query(db.session, stmt)
+    assert uses_index, plan
+
+
+@pytest.mark.parametrize('name', list(INDEXED_FILTERS))
+def test_page_query_uses_index(app, name):
+    # Página por cursor de GET /api/flights con todas las columnas
+    with app.app_context():
+        stmt = page_statement(FLIGHT_FIELDS, INDEXED_FILTERS[name], 1000, 101)
+        uses_index, plan = explain_flight_query(db.session, stmt)
+    assert uses_index, plan
+
+
+def test_unfiltered_scan_is_detected(app):
+    # Control: un filtro sin índice debe detectarse como recorrido completo
+    with app.app_context():
+        source = flight_source()
+        stmt = apply_flight_filters(select(source.c.id), {'min_departure_delay': 10}, source)
+        uses_index, plan = explain_flight_query(db.session, stmt)
+    assert not uses_index, plan
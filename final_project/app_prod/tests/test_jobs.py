@@ -0,0 +1,36 @@
+# tests/test_jobs.py
+
+import json
+import os
+import time
+
+from app.jobs import ExportJobs, data_version, job_key
+
+
+def test_stale_running_job_is_requeued(app, tmp_path):
+    with app.app_context():
+        jobs = ExportJobs(app, str(tmp_path), workers=1, max_pending=2, retention=3600, heartbeat=1)
+        fields = ['id', 'airline']
+        job_id = job_key('csv', fields, {}, data_version())
+        stale = {
+            'id': job_id, 'format': 'csv', 'fields': fields, 'filters': {},
+            'status': 'running', 'rows_written': 10, 'total_rows': 100, 'bytes': 0,
+            'error': None, 'created_at': time.time() - 600, 'finished_at': None,
+            'owner': {'pid': 1, 'host': 'otro-host', 'boot': ''},
+            'updated_at': time.time() - 600,
+        }
+        with open(os.path.join(tmp_path, f'{job_id}.json'), 'w') as f:
+            json.dump(stale, f)
+
+        job, created = jobs.submit('csv', fields, {})
+        assert created
+        assert job['id'] == job_id
+        assert job['created_at'] > stale['created_at']
+
+        # Un trabajo con latido reciente se sigue deduplicando
+        jobs._executor.shutdown(wait=True)
+        stale.update(status='running', updated_at=time.time())
+        with open(os.path.join(tmp_path, f'{job_id}.json'), 'w') as f:
+            json.dump(stale, f)
+        job, created = jobs.submit('csv', fields, {})
+        assert not created
@@ -0,0 +1,22 @@
+# tests/test_metrics.py
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+
+
+def test_failed_statement_does_not_skew_timings(app):
+    with app.test_request_context():
+        from flask import g
+        from app.metrics import RequestStats
+        g.perf_stats = RequestStats()
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM tabla_inexistente'))
+            conn.rollback()
+            conn.execute(text('SELECT 1'))
+            assert not conn.info.get('query_start')
+        assert g.perf_stats.sql_count == 1
+        assert g.perf_stats.sql_time >= 0
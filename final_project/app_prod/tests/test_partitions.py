@@ -0,0 +1,72 @@
+# tests/test_partitions.py
+
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import sqlite
+from app import db
+from app.partitions import _bind_processor, archive_partition, flights_table, init_partitions, insert_flights, month_table
+
+
+def _flight(year, month, day):
+    return {
+        'year': year, 'month': month, 'day': day, 'day_of_week': 1, 'airline': 'AA',
+        'flight_number': '100', 'origin_airport': 'JFK', 'destination_airport': 'LAX',
+        'scheduled_departure': 900, 'departure_time': 905, 'departure_delay': 5,
+    }
+
+
+def test_insert_after_archiving_month(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'FLIGHTS_PARTITIONED', True)
+    with app.app_context():
+        init_partitions((2015, 1))
+        insert_flights([_flight(2015, 1, 1)])
+        db.session.commit()
+        try:
+            assert archive_partition(2015, 1) == 'flights_archive_p201501'
+            # El mes se vuelve a crear vacío con sus índices
+            insert_flights([_flight(2015, 1, 2)])
+            db.session.commit()
+            assert db.session.execute(select(func.count()).select_from(month_table(2015, 1))).scalar() == 1
+            assert db.session.execute(text('SELECT count(*) FROM flights_archive_p201501')).scalar() == 1
+        finally:
+            month_table(2015, 1).drop(db.session.connection(), checkfirst=True)
+            db.session.execute(text('DROP TABLE IF EXISTS flights_archive_p201501'))
+            db.session.commit()
+
+
+def test_rebuild_keeps_archived_months(app, monkeypatch):
+    from app.models import AirlineDailyStats, DelaySketch
+    from app.rollups import apply_flights, rebuild_rollups
+    from app.sketches import rebuild_sketches
+
+    monkeypatch.setitem(app.config, 'FLIGHTS_PARTITIONED', True)
+    with app.app_context():
+        init_partitions((2015, 2))
+        rows = [_flight(2015, 1, 1), _flight(2015, 2, 1)]
+        insert_flights(rows)
+        apply_flights(rows)
+        db.session.commit()
+        try:
+            archive_partition(2015, 1)
+            rebuild_rollups()
+            rebuild_sketches()
+            stats, sketches = AirlineDailyStats.__table__, DelaySketch.__table__
+            assert db.session.execute(select(stats.c.month).order_by(stats.c.month)).scalars().all() == [1, 2]
+            assert set(db.session.execute(select(sketches.c.month)).scalars()) == {1, 2}
+        finally:
+            for month in (1, 2):
+                month_table(2015, month).drop(db.session.connection(), checkfirst=True)
+            db.session.execute(text('DROP TABLE IF EXISTS flights_archive_p201501'))
+            for table in (AirlineDailyStats.__table__, DelaySketch.__table__):
+                db.session.execute(table.delete())
+            db.session.commit()
+
+
+def test_sqlite_datetime_processor_matches_sqlalchemy():
+    dialect = sqlite.dialect()
+    column = flights_table.c.wheels_off
+    original = column.type.dialect_impl(dialect).bind_processor(dialect)
+    fast = _bind_processor(column, dialect)
+    for value in (None, datetime(2015, 1, 2, 3, 4, 5), datetime(2015, 1, 2, 3, 4, 5, 123), date(2015, 1, 3),
+                  datetime(2015, 1, 2, tzinfo=timezone(timedelta(hours=2)))):
+        assert fast(value) == original(value)
@@ -0,0 +1,25 @@
+# tests/test_replicas.py
+
+import time
+from sqlalchemy import create_engine, event
+from app.replicas import ReplicaRouter
+
+
+def test_healthy_replicas_are_chosen_without_probing(app):
+    engines = {'replica_0': create_engine('sqlite://'), 'replica_1': create_engine('sqlite://')}
+    checkouts = []
+    for key, engine in engines.items():
+        event.listen(engine, 'checkout', lambda *args, key=key: checkouts.append(key))
+    router = ReplicaRouter(app, engines, retry_interval=30)
+
+    chosen = [router.choose() for _ in range(4)]
+    assert chosen == [engines['replica_0'], engines['replica_1']] * 2
+    assert checkouts == []
+
+    # Caída: se salta hasta que vence el reintento y entonces se prueba una vez
+    router.mark_down('replica_0')
+    assert {router.choose() for _ in range(4)} == {engines['replica_1']}
+    router._down['replica_0'] = time.monotonic() - 1
+    assert engines['replica_0'] in {router.choose() for _ in range(2)}
+    assert checkouts == ['replica_0']
+    assert router.status() == {'replica_0': 'up', 'replica_1': 'up'}
@@ -0,0 +1,96 @@
+# tests/test_schemas.py
+
+import pytest
+from app.schemas import AIRPORT_SCHEMA, FLIGHT_SCHEMA, ValidationError
+
+FLIGHT = {
+    'year': 2015, 'month': 1, 'day': 2, 'day_of_week': 5, 'airline': ' aa ', 'flight_number': '98',
+    'origin_airport': 'lax', 'destination_airport': 'ATL', 'scheduled_departure': 5,
+    'departure_time': '10', 'departure_delay': 5.0, 'distance': 100,
+}
+
+
+class Known:
+    """Sustituto de KnownCodes sin base de datos."""
+    airlines = {'AA'}
+    airports = {'ATL', 'LAX'}
+
+    def reload_has(self, table, code):
+        return False
+
+
+def _errors(record, known=None):
+    with pytest.raises(ValidationError) as info:
+        FLIGHT_SCHEMA.validate(record, known)
+    return {e['field']: e['error'] for e in info.value.errors}
+
+
+def test_valid_flight_is_normalized():
+    row = FLIGHT_SCHEMA.validate(FLIGHT, Known())
+    assert row['airline'] == 'AA' and row['origin_airport'] == 'LAX'
+    assert row['departure_time'] == 10 and row['departure_delay'] == 5
+    assert row['distance'] == 100.0 and row['cancelled'] is False
+    assert row['tail_number'] is None
+
+
+def test_blank_required_string_is_rejected():
+    assert _errors(dict(FLIGHT, flight_number='   ')) == {'flight_number': 'obligatorio'}
+
+
+def test_blank_optional_string_is_null():
+    assert FLIGHT_SCHEMA.validate(dict(FLIGHT, tail_number='  '))['tail_number'] is None
+
+
+def test_type_range_and_length_errors():
+    errors = _errors(dict(FLIGHT, day='x', month=13, flight_number='1' * 11, year=None))
+    assert set(errors) == {'day', 'month', 'flight_number', 'year'}
+    assert errors['year'] == 'obligatorio'
+
+
+def test_unknown_codes_are_rejected():
+    assert _errors(dict(FLIGHT, destination_airport='JFK'), Known()) == {
+        'destination_airport': "código desconocido 'JFK'"}
+
+
+def test_validate_many_reports_duplicates():
+    records = [{'iata_code': 'atl', 'airport': 'A', 'city': 'C', 'country': 'US', 'latitude': 1, 'longitude': 2}] * 2
+    rows, failures = AIRPORT_SCHEMA.validate_many(records, unique=True)
+    assert len(rows) == 1 and failures[0]['index'] == 1
+
+
+def test_unknown_code_reloads_are_rate_limited(app, monkeypatch):
+    from app import dimensions
+    from app.schemas import KnownCodes
+
+    loads = []
+    original = dimensions._load
+    monkeypatch.setattr(dimensions, '_load', lambda: loads.append(1) or original())
+    with app.app_context():
+        dimensions.invalidate_dimensions()
+        for _ in range(5):
+            assert not KnownCodes().contains('airlines', 'ZZ')
+    assert len(loads) == 1
+
+
+def test_impossible_dates_and_weekday_mismatch_are_rejected():
+    assert _errors(dict(FLIGHT, month=2, day=30)) == {'day': 'fecha inexistente 2015-02-30'}
+    assert _errors(dict(FLIGHT, day_of_week=1)) == {'day_of_week': 'no coincide con la fecha (debe ser 5)'}
+
+
+def test_validate_many_matches_validate():
+    # Los primeros van por el camino rápido; el resto, por validate
+    records = [
+        FLIGHT, dict(FLIGHT, distance=100, wheels_off='2015-01-02T10:05:00'), FLIGHT,
+        dict(FLIGHT, departure_delay='7', distance='12.5', wheels_off=' 2015-01-02T10:05:00 '),
+        dict(FLIGHT, day='x', month=13), dict(FLIGHT, month=2, day=30), dict(FLIGHT, airline='zz'),
+        dict(FLIGHT, flight_number='  ', tail_number=' n1 '), 'no es un objeto', dict(FLIGHT, departure_delay=1.5),
+    ]
+    rows, failures = FLIGHT_SCHEMA.validate_many(records, Known())
+    expected_rows, expected_failures = [], []
+    for index, record in enumerate(records):
+        try:
+            expected_rows.append(FLIGHT_SCHEMA.validate(record, Known()))
+        except ValidationError as e:
+            expected_failures.append({'index': index, 'errors': e.errors})
+    assert rows == expected_rows and failures == expected_failures
+    assert len(rows) == 4 and [f['index'] for f in failures] == [4, 5, 6, 7, 8, 9]